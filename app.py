@@ -1,80 +1,175 @@
-from flask import Flask, render_template, jsonify, request, send_file, Response
-import threading
-import queue
-import json
+from flask import Flask, render_template, jsonify, request, Response
 import os
-from scraper import ClinicScraper
+import atexit
+import hashlib
+import threading
+from sitemap_cache import SitemapCache
+from job_store import EntityStore, JobStore, PageSnapshots, StoredResults
+from metrics import render_metrics
+from driver_pool import DriverPool
+from ratelimit import AdaptiveRateLimiter
+from scheduler import JobScheduler
+from retry import RetryPolicy
+from pipeline import ParsePool
+from page_archive import PageArchive
+from dedupe import ClinicResolver
+from records import csv_fieldnames
+from lease_queue import LeaseQueue
+from cluster import CLUSTER_STATUSES, Coordinator
+from event_hub import EventHub, format_sse
+from exporter import (EXPORT_FORMATS, COMPRESSIBLE_FORMATS, parquet_available, export_chunks,
+                      gzip_chunks, count_bytes, slice_chunks)
 
 app = Flask(__name__)
 
-# Global state
-scraper_state = {
-    'is_running': False,
-    'scraper': None,
-    'results': [],
-    'thread': None
-}
-
-# Queue for sending progress updates to SSE clients
-progress_queue = queue.Queue()
+# Pages are parsed in SCRAPER_PARSE_PROCESSES worker processes while the fetch threads keep
+# loading pages (0 parses inline). Started first so the workers fork before any thread exists;
+# they only hold the light modules imported above and load the extractor on their first page.
+PARSE_PROCESSES = int(os.environ.get('SCRAPER_PARSE_PROCESSES', (os.cpu_count() or 1) - 1))
+parse_pool = ParsePool(PARSE_PROCESSES).start() if PARSE_PROCESSES > 0 else None
+if parse_pool:
+    atexit.register(parse_pool.close)
+
+# Sub-sitemaps and the clinic URL index persist between jobs
+sitemap_cache = SitemapCache(
+    path=os.environ.get('SITEMAP_CACHE_PATH', 'cache/sitemap.db'),
+    max_age=int(os.environ.get('SITEMAP_CACHE_MAX_AGE', 600))
+)
+
+# Every record is appended here as it is scraped, so jobs survive restarts
+job_store = JobStore(os.environ.get('JOB_STORE_PATH', 'data/jobs.db'))
+
+# Last known state of every clinic page, used by delta runs
+page_snapshots = PageSnapshots(os.environ.get('JOB_STORE_PATH', 'data/jobs.db'))
+
+# Raw HTML of every accepted page, for `python page_archive.py reextract` (PAGE_ARCHIVE_DIR='' disables)
+PAGE_ARCHIVE_DIR = os.environ.get('PAGE_ARCHIVE_DIR', 'data/archive')
+page_archive = PageArchive(PAGE_ARCHIVE_DIR) if PAGE_ARCHIVE_DIR else None
+if page_archive:
+    atexit.register(page_archive.close)
+
+# Clinics listed under several URLs, resolved across runs; used by jobs with "dedupe": true.
+# Stored resolutions are loaded by the first dedupe job.
+clinic_resolver = ClinicResolver(EntityStore(os.environ.get('JOB_STORE_PATH', 'data/jobs.db')))
+
+# Upper bound on parallel browser workers per job
+MAX_WORKERS = int(os.environ.get('SCRAPER_MAX_WORKERS', 8))
+
+# Headless browsers stay warm between jobs and are recycled after N pages or too much memory
+driver_pool = DriverPool(
+    max_idle=int(os.environ.get('SCRAPER_WARM_DRIVERS', 2)),
+    max_pages=int(os.environ.get('SCRAPER_DRIVER_MAX_PAGES', 200)),
+    max_memory_mb=int(os.environ.get('SCRAPER_DRIVER_MAX_MEMORY_MB', 1024))
+)
+atexit.register(driver_pool.close)
+
+# Failed pages are retried after the main pass with jittered backoff, then dead-lettered
+retry_policy = RetryPolicy(
+    max_attempts=int(os.environ.get('SCRAPER_RETRY_ATTEMPTS', 3)),
+    base_delay=float(os.environ.get('SCRAPER_RETRY_DELAY', 2.0))
+)
+
+# Jobs run concurrently, so they all share one rate limiter to stay polite to the host
+rate_limiter = AdaptiveRateLimiter()
+
+# Each open SSE stream holds a server thread (see gunicorn.conf.py). Streams beyond SSE_MAX_CLIENTS
+# are refused so API requests always find a free thread; SSE_HEARTBEAT also bounds how long a
+# disconnected client's thread lingers.
+SSE_MAX_CLIENTS = int(os.environ.get('SSE_MAX_CLIENTS', 200))
+SSE_HEARTBEAT = float(os.environ.get('SSE_HEARTBEAT', 15))
+sse_slots = threading.BoundedSemaphore(SSE_MAX_CLIENTS)
+
+# The scraping stack is imported on the first job submission, not at startup (see prewarm_scraping)
+scraping_prewarm = threading.Event()
+
+# The job the dashboard follows: the last one started through /api/start
+dashboard = {'job_id': None}
+
+# Broadcasts the dashboard job's updates to every SSE client, coalescing progress and batching logs
+dashboard_events = EventHub(
+    buffer_size=int(os.environ.get('SSE_BUFFER_SIZE', 500)),
+    flush_interval=float(os.environ.get('SSE_FLUSH_INTERVAL', 0.5))
+)
 
 
 def scraper_callback(data):
-    """Callback to receive updates from scraper"""
-    # Put the data in queue for SSE clients
-    progress_queue.put(data)
-
-
-def run_scraper(sitemap_url, start_range, end_range, fields):
-    """Run scraper in background thread"""
-    scraper_state['is_running'] = True
-    scraper_state['scraper'] = ClinicScraper(progress_callback=scraper_callback)
-
-    try:
-        results = scraper_state['scraper'].scrape(
-            sitemap_url=sitemap_url,
-            start_range=start_range,
-            end_range=end_range,
-            fields=fields
-        )
-        scraper_state['results'] = results
-
-        # Save to CSV
-        scraper_state['scraper'].save_to_csv(results)
-
-        # Send completion event
-        progress_queue.put({
-            'type': 'complete',
-            'total_results': len(results)
-        })
-
-    except Exception as e:
-        progress_queue.put({
-            'type': 'log',
-            'level': 'error',
-            'message': f'Fatal error: {str(e)}'
-        })
-    finally:
-        scraper_state['is_running'] = False
-        scraper_state['scraper'] = None
-
-
-@app.route('/')
-def index():
-    """Serve the main dashboard"""
-    return render_template('index.html')
-
+    """Callback to receive updates from every job"""
+    # Publish the dashboard job's events to SSE clients
+    if data.get('job_id') == dashboard['job_id']:
+        dashboard_events.publish(data)
+
+
+def load_scraping_stack():
+    """Import the scraper, its fetch backends and the sitemap client"""
+    from scraper import prewarm
+    prewarm()
+
+
+def prewarm_scraping():
+    """Load the scraping stack in a background thread, once.
+
+    None of it (Selenium, lxml, httpx, requests) is imported at startup, so the dashboard and API come up quickly;
+    the first submitted job starts loading it while the request returns.
+    """
+    if not scraping_prewarm.is_set():
+        scraping_prewarm.set()
+        threading.Thread(target=load_scraping_stack, daemon=True).start()
+
+
+def create_scraper(progress_callback):
+    """New scraper for one job, sharing the process-wide caches, browsers and rate limiter"""
+    from scraper import ClinicScraper
+
+    return ClinicScraper(
+        progress_callback=progress_callback,
+        rate_limiter=rate_limiter,
+        sitemap_cache=sitemap_cache,
+        snapshots=page_snapshots,
+        driver_pool=driver_pool,
+        retry_policy=retry_policy,
+        parse_pool=parse_pool,
+        archive=page_archive,
+        resolver=clinic_resolver
+    )
 
-@app.route('/api/start', methods=['POST'])
-def start_scraping():
-    """Start the scraping process"""
-    if scraper_state['is_running']:
-        return jsonify({'error': 'Scraper is already running'}), 400
 
-    data = request.json
+# Persistent job queue: SCRAPER_MAX_JOBS jobs run at once, ranges above SCRAPER_SHARD_SIZE are sharded
+scheduler = JobScheduler(
+    job_store,
+    create_scraper,
+    max_concurrent=int(os.environ.get('SCRAPER_MAX_JOBS', 2)),
+    shard_size=int(os.environ.get('SCRAPER_SHARD_SIZE', 500)),
+    export_dir=os.environ.get('EXPORT_DIR', 'data/exports'),
+    listener=scraper_callback
+)
+scheduler.start()
+
+# Coordinator for distributed jobs scraped by `python cluster.py worker` processes on any host
+coordinator = Coordinator(
+    job_store,
+    LeaseQueue(
+        os.environ.get('JOB_STORE_PATH', 'data/jobs.db'),
+        lease_seconds=int(os.environ.get('CLUSTER_LEASE_SECONDS', 300))
+    ),
+    scraper_factory=create_scraper,
+    export_dir=os.environ.get('EXPORT_DIR', 'data/exports'),
+    max_rate=float(os.environ.get('CLUSTER_MAX_RATE', 4)) or None
+)
+
+# Shared secret cluster workers send in X-Cluster-Token (no check when unset)
+CLUSTER_TOKEN = os.environ.get('CLUSTER_TOKEN')
+
+
+def parse_job_request(data):
+    """Validate a job submission; returns (params, priority, workers, resume)"""
     start_range = data.get('start', 1)
     end_range = data.get('end', 10)
     fields = data.get('fields', ['name', 'address', 'phone', 'website'])
+    workers = data.get('workers', os.environ.get('SCRAPER_WORKERS', 1))
+    priority = data.get('priority', 0)
+    resume = data.get('resume', True)
+    delta = bool(data.get('delta', False))
+    dedupe = bool(data.get('dedupe', False))
 
     # Validate range
     try:
@@ -84,117 +179,446 @@ def start_scraping():
         start_range = 1
         end_range = 10
 
-    # Clear previous results
-    scraper_state['results'] = []
+    # Validate worker count
+    try:
+        workers = min(MAX_WORKERS, max(1, int(workers)))
+    except (ValueError, TypeError):
+        workers = 1
+
+    try:
+        priority = int(priority)
+    except (ValueError, TypeError):
+        priority = 0
+
+    # Identical params continue an interrupted job instead of starting over
+    params = {
+        'sitemap_url': 'https://www.hotdoc.com.au/sitemap.xml.gz',
+        'start': start_range,
+        'end': end_range,
+        'fields': sorted(fields),
+        'delta': delta
+    }
+    if dedupe:
+        # Only set when enabled, so jobs from before dedupe existed still resume
+        params['dedupe'] = True
+    return params, priority, workers, resume
+
+
+# Largest page /api/results and /api/jobs/<id>/results return
+MAX_PAGE_SIZE = 1000
+
+
+def parse_bool(value):
+    """Query string flag: True, False, or None when absent"""
+    if value is None or value == '':
+        return None
+    return value.lower() in ('1', 'true', 'yes')
+
+
+def record_filter_args():
+    """Record filters from the query string: state, postcode, has_website and q"""
+    args = request.args
+    return {
+        'state': args.get('state'),
+        'postcode': args.get('postcode'),
+        'has_website': parse_bool(args.get('has_website')),
+        'name': args.get('q')
+    }
+
+
+def records_etag(job_id):
+    """ETag of a job's records as selected by this request's query string"""
+    version = job_store.records_version(job_id)
+    return hashlib.md5(f'{job_id}:{version}:{request.query_string.decode()}'.encode()).hexdigest()
+
+
+def results_response(job_id, default_limit):
+    """One filtered, sorted page of a job's results, with an ETag for cheap polling.
+
+    Query args: offset, limit or cursor, state, postcode, has_website, q
+    (name contains), sort (index, name, state, postcode) and order (asc, desc).
+    """
+    if not job_id:
+        return jsonify({'results': [], 'total': 0, 'next_cursor': None})
+
+    # Unchanged records and query give the same ETag, so polling clients get a 304
+    etag = records_etag(job_id)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        args = request.args
+        try:
+            results, total, next_cursor = job_store.query_records(
+                job_id,
+                sort=args.get('sort', 'index'),
+                descending=args.get('order', 'asc').lower() == 'desc',
+                offset=max(0, args.get('offset', 0, type=int)),
+                limit=min(MAX_PAGE_SIZE, max(1, args.get('limit', default_limit, type=int))),
+                cursor=args.get('cursor'),
+                **record_filter_args()
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        response = jsonify({'results': results, 'total': total, 'next_cursor': next_cursor})
+    response.set_etag(etag)
+    # Let browsers cache the page but revalidate it every time
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def export_response(job_id, default_format='csv', filename=None):
+    """Stream a job's records, optionally filtered, as CSV, JSONL or Parquet.
+
+    Chunks are generated from the job store as they are sent, so the
+    export never holds the whole dataset in memory or on disk. The body is
+    gzipped when the client accepts it. A single byte Range is served by
+    generating the export twice: once to measure it, once to send the range.
+    """
+    job = job_store.get_job(job_id) if job_id else None
+    if not job or not job_store.count(job_id):
+        return jsonify({'error': 'No results to export'}), 404
+    fmt = request.args.get('format', default_format).lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'Unknown export format: {fmt}'}), 400
+    if fmt == 'parquet' and not parquet_available():
+        return jsonify({'error': 'Parquet export needs pyarrow, which is not installed'}), 501
+
+    params = job['params']
+    fieldnames = csv_fieldnames(params['fields'] + ['change'] if params.get('delta') else params['fields'])
+    filters = record_filter_args()
+
+    def chunks():
+        return export_chunks(job_store.iter_records(job_id, **filters), fmt, fieldnames)
+
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    etag = records_etag(job_id)
+    headers = {
+        'Content-Disposition': f'attachment; filename={filename or f"clinics-{job_id}"}.{extension}',
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': 'no-cache'
+    }
+    if fmt in COMPRESSIBLE_FORMATS:
+        # The body depends on Accept-Encoding, so caches must key on it
+        headers['Vary'] = 'Accept-Encoding'
+
+    # Ranges resume an interrupted download, so only honour them while the export is unchanged.
+    # They always address the uncompressed export.
+    byte_range = request.range
+    ranged = byte_range and len(byte_range.ranges) == 1 and (
+        'If-Range' not in request.headers or request.if_range.etag == etag)
+    gzipped = not ranged and fmt in COMPRESSIBLE_FORMATS and 'gzip' in request.accept_encodings
+    if gzipped:
+        # The gzipped body is a different representation, so it needs its own ETag
+        etag = f'{etag}-gzip'
+    if request.if_none_match.contains(etag):
+        response = Response(status=304, headers={'Vary': headers['Vary']} if 'Vary' in headers else None)
+        response.set_etag(etag)
+        return response
+
+    if ranged:
+        length = count_bytes(chunks())
+        bounds = byte_range.range_for_length(length)
+        if bounds is None:
+            response = Response(status=416, headers={'Content-Range': f'bytes */{length}'})
+            response.set_etag(etag)
+            return response
+        start, stop = bounds
+        headers['Content-Range'] = f'bytes {start}-{stop - 1}/{length}'
+        headers['Content-Length'] = str(stop - start)
+        response = Response(slice_chunks(chunks(), start, stop), status=206, mimetype=mimetype, headers=headers)
+    elif gzipped:
+        headers['Content-Encoding'] = 'gzip'
+        response = Response(gzip_chunks(chunks()), mimetype=mimetype, headers=headers)
+    else:
+        response = Response(chunks(), mimetype=mimetype, headers=headers)
+    response.set_etag(etag)
+    return response
 
-    # Clear the queue
-    while not progress_queue.empty():
-        progress_queue.get()
 
-    # Start scraper in background thread
-    sitemap_url = 'https://www.hotdoc.com.au/sitemap.xml.gz'
-    thread = threading.Thread(
-        target=run_scraper,
-        args=(sitemap_url, start_range, end_range, fields),
-        daemon=True
+def last_event_id():
+    """Id of the last SSE frame a reconnecting client saw, if any"""
+    value = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def sse_response(event_stream):
+    """Stream SSE frames, or 503 when SSE_MAX_CLIENTS streams are open already"""
+    if not sse_slots.acquire(blocking=False):
+        event_stream.close()
+        return jsonify({'error': 'Too many open event streams'}), 503, {'Retry-After': '5'}
+    response = Response(
+        event_stream,
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
     )
-    scraper_state['thread'] = thread
-    thread.start()
+    response.call_on_close(sse_slots.release)
+    return response
+
+
+def cancel(job_id):
+    """Cancel a job through whichever of the scheduler and the coordinator runs it"""
+    job = job_store.get_job(job_id)
+    if job and job['status'] in CLUSTER_STATUSES:
+        return coordinator.cancel(job_id)
+    return scheduler.cancel(job_id)
+
 
-    return jsonify({'status': 'started'})
+@app.route('/')
+def index():
+    """Serve the main dashboard"""
+    return render_template('index.html')
+
+
+@app.route('/api/start', methods=['POST'])
+def start_scraping():
+    """Queue a scraping job and follow it on the dashboard"""
+    params, priority, workers, resume = parse_job_request(request.json or {})
+    prewarm_scraping()
+
+    # Drop the previous job's buffered events
+    dashboard_events.clear()
+
+    job_id, resumed = scheduler.submit(params, priority=priority, workers=workers, resume=resume)
+    dashboard['job_id'] = job_id
+
+    return jsonify({
+        'status': 'started',
+        'job_id': job_id,
+        'resumed': resumed,
+        'shards': len(job_store.get_shards(job_id))
+    })
 
 
 @app.route('/api/stop', methods=['POST'])
 def stop_scraping():
-    """Stop the scraping process"""
-    if not scraper_state['is_running']:
+    """Cancel the dashboard's job"""
+    status = scheduler.status(dashboard['job_id']) if dashboard['job_id'] else None
+    if not status or not status['is_running']:
         return jsonify({'error': 'Scraper is not running'}), 400
 
-    if scraper_state['scraper']:
-        scraper_state['scraper'].stop()
+    cancel(dashboard['job_id'])
 
     return jsonify({'status': 'stopping'})
 
 
 @app.route('/api/status')
 def get_status():
-    """Get current scraper status"""
+    """Get the dashboard job's status"""
+    status = scheduler.status(dashboard['job_id']) if dashboard['job_id'] else None
     return jsonify({
-        'is_running': scraper_state['is_running'],
-        'results_count': len(scraper_state['results'])
+        'is_running': bool(status and status['is_running']),
+        'results_count': status['results_count'] if status else 0,
+        'job_id': dashboard['job_id'],
+        'backend_stats': status['backend_stats'] if status else {}
     })
 
 
+@app.route('/api/jobs', methods=['GET', 'POST'])
+def jobs():
+    """List recent jobs, or queue a new one without switching the dashboard to it"""
+    if request.method == 'POST':
+        params, priority, workers, resume = parse_job_request(request.json or {})
+        prewarm_scraping()
+        job_id, resumed = scheduler.submit(params, priority=priority, workers=workers, resume=resume)
+        return jsonify({'job_id': job_id, 'resumed': resumed, 'status': scheduler.status(job_id)['status']})
+
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify({'jobs': job_store.list_jobs(limit)})
+
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    """Status, shards and backend counters of one job"""
+    status = scheduler.status(job_id)
+    if not status:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(status)
+
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    if not cancel(job_id):
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify({'status': 'cancelling'})
+
+
+@app.route('/api/jobs/<job_id>/failed')
+def job_dead_letters(job_id):
+    """Pages of a job that still failed after their retries"""
+    if not job_store.get_job(job_id):
+        return jsonify({'error': 'Unknown job'}), 404
+    letters = job_store.get_dead_letters(job_id)
+    return jsonify({'failed': letters, 'total': len(letters)})
+
+
+@app.route('/api/jobs/<job_id>/retry-failed', methods=['POST'])
+def retry_failed_job(job_id):
+    """Queue a job again to rescrape its dead-lettered pages"""
+    if not job_store.get_job(job_id):
+        return jsonify({'error': 'Unknown job'}), 404
+    try:
+        retrying = scheduler.retry_failed(job_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify({'job_id': job_id, 'retrying': retrying})
+
+
+@app.route('/api/jobs/<job_id>/results')
+def job_results(job_id):
+    """A page of one job's results; see results_response for the query args"""
+    if not job_store.get_job(job_id):
+        return jsonify({'error': 'Unknown job'}), 404
+    return results_response(job_id, default_limit=100)
+
+
+@app.route('/api/jobs/<job_id>/download')
+def download_job_csv(job_id):
+    """Download one job's results as CSV, generated from the job store"""
+    return export_response(job_id)
+
+
+@app.route('/api/jobs/<job_id>/export')
+def export_job(job_id):
+    """Export one job's results; see export_response"""
+    return export_response(job_id)
+
+
+@app.route('/api/jobs/<job_id>/stream')
+def job_stream(job_id):
+    """Server-Sent Events of a single job"""
+    if not job_store.get_job(job_id):
+        return jsonify({'error': 'Unknown job'}), 404
+    following = scheduler.follow(job_id, last_event_id())
+
+    def event_stream():
+        yield format_sse({'type': 'connected', 'job_id': job_id})
+        if following is None:
+            # Finished: nothing more will be published, so report the stored final state
+            job = job_store.get_job(job_id)
+            yield format_sse({'type': 'complete', 'job_id': job_id, 'status': job['status'],
+                              'total_results': job_store.count(job_id)})
+            return
+        channel, cursor = following
+        yield from channel.stream(cursor, heartbeat=SSE_HEARTBEAT,
+                                  until=lambda event: event.get('type') == 'complete')
+
+    return sse_response(event_stream())
+
+
+def cluster_authorized():
+    return not CLUSTER_TOKEN or request.headers.get('X-Cluster-Token') == CLUSTER_TOKEN
+
+
+@app.route('/api/cluster/jobs', methods=['POST'])
+def submit_cluster_job():
+    """Queue a range for cluster workers"""
+    if not cluster_authorized():
+        return jsonify({'error': 'Invalid cluster token'}), 403
+    params, priority, _, _ = parse_job_request(request.json or {})
+    try:
+        job_id = coordinator.submit(params, priority=priority)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'job_id': job_id})
+
+
+@app.route('/api/cluster/jobs/<job_id>')
+def cluster_job_status(job_id):
+    """Status of a distributed job with its queue counts"""
+    status = coordinator.status(job_id)
+    if not status:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(status)
+
+
+@app.route('/api/cluster/lease', methods=['POST'])
+def lease_batch():
+    """Lease a batch of clinic URLs to a worker"""
+    if not cluster_authorized():
+        return jsonify({'error': 'Invalid cluster token'}), 403
+    data = request.json or {}
+    try:
+        batch_size = min(100, max(1, int(data.get('batch_size', 10))))
+    except (ValueError, TypeError):
+        return jsonify({'error': 'batch_size must be an integer'}), 400
+    return jsonify({'lease': coordinator.lease(data.get('worker', request.remote_addr), batch_size)})
+
+
+@app.route('/api/cluster/leases/<lease_id>/extend', methods=['POST'])
+def extend_lease(lease_id):
+    if not cluster_authorized():
+        return jsonify({'error': 'Invalid cluster token'}), 403
+    return jsonify({'extended': coordinator.extend(lease_id)})
+
+
+@app.route('/api/cluster/leases/<lease_id>/complete', methods=['POST'])
+def complete_lease(lease_id):
+    """Store a worker's results for a lease"""
+    if not cluster_authorized():
+        return jsonify({'error': 'Invalid cluster token'}), 403
+    data = request.json or {}
+    if not job_store.get_job(data.get('job_id')):
+        return jsonify({'error': 'Unknown job'}), 404
+    try:
+        stored = coordinator.report(lease_id, data['job_id'], data.get('results', []))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'stored': stored})
+
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint with per-stage timings and page counters"""
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+
 @app.route('/api/results')
 def get_results():
-    """Get current results"""
-    # Check if all results are requested
-    all_results = request.args.get('all', 'false').lower() == 'true'
-
-    if all_results:
-        # Return all results for pagination
-        return jsonify({
-            'results': scraper_state['results'],
-            'total': len(scraper_state['results'])
-        })
-    else:
-        # Return first 10 for preview (legacy)
+    """Get a page of the dashboard job's results (first 10 by default)"""
+    # Legacy: return every result in one response
+    if request.args.get('all', 'false').lower() == 'true':
+        results = StoredResults(job_store, dashboard['job_id']) if dashboard['job_id'] else []
         return jsonify({
-            'results': scraper_state['results'][:10],
-            'total': len(scraper_state['results'])
+            'results': list(results),
+            'total': len(results)
         })
 
+    return results_response(dashboard['job_id'], default_limit=10)
+
 
 @app.route('/api/download')
 def download_csv():
-    """Download the results CSV"""
-    csv_path = 'clinics.csv'
+    """Download the results CSV of the dashboard's job"""
+    return export_response(dashboard['job_id'], filename='clinics')
 
-    if not os.path.exists(csv_path):
-        return jsonify({'error': 'No CSV file available'}), 404
 
-    return send_file(
-        csv_path,
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name='clinics.csv'
-    )
+@app.route('/api/export')
+def export_results():
+    """Export the dashboard job's results as CSV, JSONL or Parquet, optionally filtered"""
+    return export_response(dashboard['job_id'])
 
 
 @app.route('/api/stream')
 def stream():
     """Server-Sent Events endpoint for real-time updates"""
+    resume_id = last_event_id()
+
     def event_stream():
         # Send initial connection message
-        yield f"data: {json.dumps({'type': 'connected'})}\n\n"
-
-        # Keep sending updates from the queue
-        while True:
-            try:
-                # Wait for new data (with timeout to keep connection alive)
-                data = progress_queue.get(timeout=30)
-                yield f"data: {json.dumps(data)}\n\n"
-
-                # If scraping is complete, we can continue listening for new jobs
-                if data.get('type') == 'complete':
-                    # Don't break, keep connection open for next scraping job
-                    pass
-
-            except queue.Empty:
-                # Send heartbeat to keep connection alive
-                yield f": heartbeat\n\n"
-            except GeneratorExit:
-                # Client disconnected
-                break
-
-    return Response(
-        event_stream(),
-        mimetype='text/event-stream',
-        headers={
-            'Cache-Control': 'no-cache',
-            'X-Accel-Buffering': 'no'
-        }
-    )
+        yield format_sse({'type': 'connected'})
+
+        # Keep sending updates, with heartbeats to keep the connection alive;
+        # the stream stays open across jobs
+        yield from dashboard_events.stream(resume_id, heartbeat=SSE_HEARTBEAT)
+
+    return sse_response(event_stream())
 
 
 if __name__ == '__main__':
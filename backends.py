@@ -0,0 +1,107 @@
+"""Fetch backends that turn a clinic URL into page HTML"""
+import importlib
+
+
+# slug_fallback of each registered backend, readable without importing a lazily registered one
+# (page_archive re-extracts archived pages with it)
+SLUG_FALLBACK = {'http': False, 'selenium': True}
+
+
+class FetchBackend:
+    """Base class for fetch backends.
+
+    A backend returns the HTML for a URL. ``slug_fallback`` tells the
+    extractor whether a generic page title may be replaced by a name taken
+    from the URL, and ``accepts`` decides whether the parsed data is good
+    enough or the next backend in the chain should be tried.
+    """
+    name = None
+    slug_fallback = True
+
+    def __init__(self, scraper):
+        self.scraper = scraper
+
+    def fetch(self, url, fields=None):
+        """Return the page HTML; fields are the fields the caller will extract"""
+        raise NotImplementedError
+
+    def accepts(self, html, data, missing):
+        return not missing
+
+    def close(self):
+        pass
+
+
+class HttpBackend(FetchBackend):
+    """Plain requests.Session fetch of the server-rendered HTML"""
+    name = 'http'
+    slug_fallback = SLUG_FALLBACK[name]
+
+    def __init__(self, scraper, timeout=15):
+        super().__init__(scraper)
+        self.timeout = timeout
+
+    def fetch(self, url, fields=None):
+        response = self.scraper.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.text
+
+    def accepts(self, html, data, missing):
+        from extractor import has_contact_details
+
+        missing = [field for field in missing if field in self.scraper.required_fields]
+        if missing:
+            return False
+        # Website is optional, but only trust its absence if the contact block was rendered
+        if data.get('website') == 'N/A' and not has_contact_details(html):
+            return False
+        return True
+
+
+# Backends by name: a class, or a 'module:Class' path imported the first time the backend
+# is used, so the browser stack is only loaded once a scraper needs it
+BACKENDS = {
+    HttpBackend.name: HttpBackend,
+    'selenium': 'selenium_backend:SeleniumBackend',
+}
+
+DEFAULT_BACKENDS = ('http', 'selenium')
+
+
+def register_backend(name, backend, slug_fallback=FetchBackend.slug_fallback):
+    """Register a backend class, or a 'module:Class' path to import on first use.
+
+    slug_fallback is only used for a path; a class brings its own.
+    """
+    BACKENDS[name] = backend
+    SLUG_FALLBACK[name] = slug_fallback if isinstance(backend, str) else backend.slug_fallback
+
+
+def backend_slug_fallback(name):
+    """slug_fallback of the backend registered as name, or the default for unknown names"""
+    return SLUG_FALLBACK.get(name, FetchBackend.slug_fallback)
+
+
+def get_backend(name):
+    """The backend class registered under name, importing it if needed"""
+    backend = BACKENDS.get(name)
+    if backend is None:
+        raise ValueError(f'Unknown fetch backend: {name}')
+    if isinstance(backend, str):
+        module_name, _, class_name = backend.partition(':')
+        backend = BACKENDS[name] = getattr(importlib.import_module(module_name), class_name)
+    return backend
+
+
+def load_backends(names=None):
+    """Import the given (or default) backends ahead of their first use"""
+    return [get_backend(name) for name in names or DEFAULT_BACKENDS]
+
+
+def create_backends(scraper, names=None):
+    """Instantiate the backend chain for a scraper"""
+    names = names or DEFAULT_BACKENDS
+    unknown = [name for name in names if name not in BACKENDS]
+    if unknown:
+        raise ValueError(f"Unknown fetch backend(s): {', '.join(unknown)}")
+    return [get_backend(name)(scraper) for name in names]
@@ -0,0 +1,90 @@
+"""Micro-benchmark: blocked entity resolution vs comparing every pair.
+
+Builds clinic records from the clinics.csv seed, where every seed clinic
+is listed several times under different slugs, and resolves them with
+dedupe.ClinicResolver. The pairwise baseline compares each record's name
+with every earlier record, which is what cleaning the output up afterwards
+costs; it only runs up to --pairwise-max records.
+
+    python benchmarks/bench_dedupe.py [--sizes 1000,10000,100000]
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fixtures import build_clinics  # noqa: E402
+
+from dedupe import ClinicResolver, name_key, name_similarity, NAME_MATCH  # noqa: E402
+
+FIELDS = ('name', 'address', 'phone', 'website')
+
+
+
+def clinic_word(clinic_id):
+    """A made-up, pronounceable word that differs per clinic"""
+    digest = hashlib.md5(str(clinic_id).encode()).digest()
+    return ''.join('bcdfgklmnprstvz'[b % 15] + 'aeiou'[b // 15 % 5] for b in digest[:4]).title()
+
+
+def sample_records(count, copies=4):
+    """Records where each of count / copies clinics has `copies` listings"""
+    records = []
+    for i, clinic in enumerate(build_clinics(count)):
+        clinic_id = i // copies
+        # Spread clinics over 2500 postcodes like the real sitemap; listings keep their clinic's
+        postcode = str(2000 + clinic_id % 2500)
+        record = {'url': re.sub(r'-(\d{4})/', f'-{postcode}/', clinic['url'], count=1)}
+        for field in FIELDS:
+            record[field] = clinic.get(field) or 'N/A'
+        # Each clinic gets its own phone, website and name; its listings share them
+        word = clinic_word(clinic_id)
+        record['phone'] = f'+6139{clinic_id:07d}'
+        record['website'] = f'https://www.{word.lower()}.com.au'
+        record['name'] = f"{clinic['name'].split(' ')[0]} {word} Clinic"
+        records.append(record)
+    return records
+
+
+def resolve_blocked(records):
+    resolver = ClinicResolver()
+    for record in records:
+        resolver.resolve(record['url'], record)
+    return len(resolver)
+
+
+def resolve_pairwise(records):
+    keys = [name_key(record['name']) for record in records]
+    entities = 0
+    for i, key in enumerate(keys):
+        if not any(name_similarity(key, other) >= NAME_MATCH for other in keys[:i]):
+            entities += 1
+    return entities
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Entity resolution scaling')
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--pairwise-max', type=int, default=4000)
+    args = parser.parse_args()
+
+    print(f"{'records':>8}  {'blocked':>10}  {'pairwise':>10}  entities")
+    for size in (int(value) for value in args.sizes.split(',')):
+        records = sample_records(size)
+        started = time.perf_counter()
+        entities = resolve_blocked(records)
+        blocked = time.perf_counter() - started
+        pairwise = '-'
+        if size <= args.pairwise_max:
+            started = time.perf_counter()
+            resolve_pairwise(records)
+            pairwise = f'{time.perf_counter() - started:9.2f}s'
+        print(f'{size:>8}  {blocked:9.2f}s  {pairwise:>10}  {entities}')
+
+
+if __name__ == '__main__':
+    main()
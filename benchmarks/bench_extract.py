@@ -0,0 +1,117 @@
+"""Micro-benchmark: per-page parse cost of the field extractor.
+
+Compares the previous BeautifulSoup extractor (several full-tree find /
+find_all scans per field, regexes rebuilt per page) with the compiled
+single-pass lxml extractor in extractor.py.
+
+    python benchmarks/bench_extract.py [--rounds 20]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+from extractor import parse_clinic_page  # noqa: E402
+from fixtures import load_seed_clinics, render_clinic_page  # noqa: E402
+
+FIELDS = ['name', 'address', 'phone', 'website']
+
+
+def legacy_extract(html, url, fields):
+    """The BeautifulSoup extraction that parse_clinic_page replaced"""
+    soup = BeautifulSoup(html, 'lxml')
+    data = {'url': url}
+    if 'name' in fields:
+        name = None
+        h1 = soup.find('h1')
+        if h1:
+            name = h1.get_text(strip=True)
+        data['name'] = name or 'N/A'
+    if 'address' in fields:
+        address = None
+        address_elem = (
+            soup.find(attrs={'itemprop': 'address'}) or
+            soup.find('address') or
+            soup.find(class_=re.compile(r'address', re.I)) or
+            soup.find(attrs={'data-test-id': re.compile(r'address', re.I)})
+        )
+        if address_elem:
+            address = ' '.join(address_elem.get_text(strip=True).split())
+        data['address'] = address or 'N/A'
+    if 'phone' in fields:
+        phone = None
+        phone_elem = (
+            soup.find(attrs={'itemprop': 'telephone'}) or
+            soup.find('a', href=re.compile(r'tel:')) or
+            soup.find(class_=re.compile(r'phone', re.I)) or
+            soup.find(attrs={'data-test-id': re.compile(r'phone', re.I)})
+        )
+        if phone_elem:
+            if phone_elem.name == 'a' and phone_elem.get('href', '').startswith('tel:'):
+                phone = phone_elem.get('href').replace('tel:', '').strip()
+            else:
+                phone = phone_elem.get_text(strip=True)
+            phone = re.sub(r'[^\d\s\+\(\)-]', '', phone).strip()
+        data['phone'] = phone or 'N/A'
+    if 'website' in fields:
+        website = None
+        excluded = ('hotdoc.com', 'facebook.com', 'instagram.com', 'linkedin.com', 'twitter.com')
+        for link in soup.find_all('a', class_='ClinicContactDetails-contact-link'):
+            href = link.get('href', '')
+            if href and href.startswith('http') and 'google.com/maps' not in href and \
+               not any(host in href for host in excluded):
+                website = href
+                break
+        if not website:
+            for link in soup.find_all('a', href=True):
+                href = link.get('href', '')
+                if href and href.startswith('http') and 'google.com' not in href and \
+                   not any(host in href for host in excluded):
+                    text = link.get_text(strip=True).lower()
+                    if any(k in text for k in ['visit', 'website', 'clinic', '.com', '.au']):
+                        website = href
+                        break
+        data['website'] = website or 'N/A'
+    return data
+
+
+def time_per_page(extract, pages, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for url, html in pages:
+            extract(html, url, FIELDS)
+    return (time.perf_counter() - started) / (rounds * len(pages))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    pages = [(clinic['url'], render_clinic_page(clinic)) for clinic in load_seed_clinics()]
+
+    mismatches = [
+        url for url, html in pages
+        if legacy_extract(html, url, FIELDS) != parse_clinic_page(html, url, FIELDS)
+    ]
+
+    before = time_per_page(legacy_extract, pages, args.rounds)
+    after = time_per_page(parse_clinic_page, pages, args.rounds)
+
+    print(f'pages: {len(pages)}  avg size: {sum(len(h) for _, h in pages) // len(pages)} bytes')
+    print(f'before (BeautifulSoup, multi-pass): {before * 1000:.2f} ms/page')
+    print(f'after  (lxml, single pass):         {after * 1000:.2f} ms/page')
+    print(f'speedup: {before / after:.1f}x')
+    if mismatches:
+        print(f'WARNING: {len(mismatches)} pages extracted differently, e.g. {mismatches[0]}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
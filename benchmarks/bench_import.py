@@ -0,0 +1,94 @@
+"""Startup benchmark: how long `import app` takes, and what it loads.
+
+Imports the app in fresh interpreters with `python -X importtime`, with
+its data in a temporary directory and no parse processes or warm
+browsers, and reports the median total and the slowest top-level
+imports. Fails when a module that should only load with the first job
+(selenium, lxml, httpx, the scraper itself) was imported, or when the median
+exceeds --budget-ms, so it can guard startup against regressions.
+
+    python benchmarks/bench_import.py [--runs 5] [--budget-ms 600]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded with the first job (see app.prewarm_scraping), never at startup
+LAZY_MODULES = ('selenium', 'httpx', 'requests', 'pyarrow', 'lxml', 'bs4', 'rapidfuzz', 'extractor',
+                'scraper', 'selenium_backend')
+
+CHECK = f"import sys, app; print(' '.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+
+IMPORTTIME = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def import_app(data_dir):
+    """(cumulative microseconds per top-level module, lazy modules that were loaded)"""
+    env = dict(
+        os.environ,
+        JOB_STORE_PATH=os.path.join(data_dir, 'jobs.db'),
+        SITEMAP_CACHE_PATH=os.path.join(data_dir, 'sitemap.db'),
+        PAGE_ARCHIVE_DIR=os.path.join(data_dir, 'archive'),
+        EXPORT_DIR=os.path.join(data_dir, 'exports'),
+        SCRAPER_PARSE_PROCESSES='0',
+        SCRAPER_WARM_DRIVERS='0'
+    )
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHECK], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    modules, children = {}, {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME.match(line)
+        if not match:
+            continue
+        depth, name, cumulative = len(match.group(3)), match.group(4), int(match.group(2))
+        # A module is listed after its imports, which are indented one level (two spaces) deeper
+        if depth == 3:
+            children[name] = cumulative
+        elif depth == 1:
+            if name == 'app':
+                modules = dict(children, app=cumulative)
+            children = {}
+    return modules, result.stdout.split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time `import app` and check what it loads')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, help='fail if the median import takes longer')
+    args = parser.parse_args()
+
+    totals, runs, loaded = [], [], set()
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory() as data_dir:
+            modules, lazy = import_app(data_dir)
+        totals.append(modules['app'] / 1000)
+        runs.append(modules)
+        loaded.update(lazy)
+
+    median = statistics.median(totals)
+    print(f'import app:        median {median:.0f} ms (min {min(totals):.0f}, max {max(totals):.0f}, '
+          f'{args.runs} runs)')
+    slowest = sorted(((statistics.median(run.get(name, 0) for run in runs) / 1000, name)
+                      for name in runs[0] if name != 'app'), reverse=True)
+    for milliseconds, name in slowest[:args.top]:
+        print(f'  {name:<24} {milliseconds:7.1f} ms')
+
+    failed = False
+    if loaded:
+        print(f"loaded at startup: {', '.join(sorted(loaded))} (should wait for the first job)")
+        failed = True
+    if args.budget_ms and median > args.budget_ms:
+        print(f'over budget:       {median:.0f} ms > {args.budget_ms:.0f} ms')
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
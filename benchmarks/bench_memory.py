@@ -0,0 +1,100 @@
+"""Memory benchmark: bytes per clinic held by a run without a job store.
+
+Compares the previous container (a dict per record, keyed by sitemap
+index) with records.RecordTable, and times writing each to CSV with
+ClinicScraper.save_to_csv. Records are rebuilt from JSON one by one, like
+results coming back from parse processes, so equal strings are not shared
+by accident.
+
+    python benchmarks/bench_memory.py [--clinics 100000]
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fixtures import build_clinics  # noqa: E402
+
+from records import RecordTable  # noqa: E402
+from scraper import ClinicScraper, csv_fieldnames  # noqa: E402
+
+FIELDS = ['name', 'address', 'phone', 'website']
+
+
+def sample_records(count):
+    """JSON-encoded records shaped like parse_clinic_page output; missing fields are 'N/A'"""
+    encoded = []
+    for i, clinic in enumerate(build_clinics(count)):
+        record = {'url': clinic['url']}
+        for field in FIELDS:
+            # Every third clinic lacks a website and every seventh a phone, as on the live site
+            missing = (field == 'website' and i % 3 == 0) or (field == 'phone' and i % 7 == 0)
+            record[field] = 'N/A' if missing else (clinic.get(field) or 'N/A')
+        encoded.append(json.dumps(record))
+    return encoded
+
+
+def collect_dicts(encoded):
+    collected = {}
+    for index, line in enumerate(encoded):
+        collected[index] = json.loads(line)
+    return collected
+
+
+def collect_table(encoded):
+    table = RecordTable(csv_fieldnames(FIELDS))
+    for index, line in enumerate(encoded):
+        table.append(index, json.loads(line))
+    return table
+
+
+def measure(build, encoded):
+    """(container, bytes it holds) as traced by tracemalloc"""
+    gc.collect()
+    tracemalloc.start()
+    container = build(encoded)
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return container, size
+
+
+def time_csv(scraper, data, filename):
+    started = time.perf_counter()
+    scraper.save_to_csv(data, filename=filename)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bytes per clinic held in memory, before and after')
+    parser.add_argument('--clinics', type=int, default=100000)
+    args = parser.parse_args()
+
+    encoded = sample_records(args.clinics)
+    collected, dict_bytes = measure(collect_dicts, encoded)
+    # The previous collect_results sorted the dict into a list of records
+    legacy = [collected[index] for index in sorted(collected)]
+    table, table_bytes = measure(collect_table, encoded)
+
+    scraper = ClinicScraper()
+    with tempfile.TemporaryDirectory() as directory:
+        # Without fieldnames, a plain list is scanned once for its keys before it is written
+        legacy_seconds = time_csv(scraper, legacy, os.path.join(directory, 'legacy.csv'))
+        table_seconds = time_csv(scraper, table, os.path.join(directory, 'table.csv'))
+
+    print(f'clinics:              {args.clinics}')
+    print(f'dict per record:      {dict_bytes / args.clinics:7.0f} bytes/clinic '
+          f'({dict_bytes / 1e6:.1f} MB), CSV in {legacy_seconds:.2f}s')
+    print(f'RecordTable:          {table_bytes / args.clinics:7.0f} bytes/clinic '
+          f'({table_bytes / 1e6:.1f} MB), CSV in {table_seconds:.2f}s')
+    print(f'saved:                {1 - table_bytes / dict_bytes:.0%}')
+
+
+if __name__ == '__main__':
+    main()
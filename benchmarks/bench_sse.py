@@ -0,0 +1,149 @@
+"""Load test: API latency while many SSE streams are open.
+
+Starts the app under gunicorn (gunicorn.conf.py, or the worker class given
+with --worker-class) with its data in a temporary directory, opens
+--streams dashboard streams (/api/stream) and keeps them open, then times
+--requests API calls spread over /api/status, /api/results and /api/jobs.
+
+    python benchmarks/bench_sse.py --streams 150 --requests 300
+    python benchmarks/bench_sse.py --streams 5 --worker-class sync   # the old setup, for comparison
+"""
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENDPOINTS = ('/api/status', '/api/results', '/api/jobs')
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, data_dir, worker_class=None):
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        JOB_STORE_PATH=os.path.join(data_dir, 'jobs.db'),
+        SITEMAP_CACHE_PATH=os.path.join(data_dir, 'sitemap.db'),
+        PAGE_ARCHIVE_DIR=os.path.join(data_dir, 'archive'),
+        EXPORT_DIR=os.path.join(data_dir, 'exports'),
+        SCRAPER_WARM_DRIVERS='0',
+        SCRAPER_PARSE_PROCESSES='0'
+    )
+    command = [sys.executable, '-m', 'gunicorn', 'app:app', '--config', 'gunicorn.conf.py',
+               '--bind', f'127.0.0.1:{port}']
+    if worker_class:
+        # With more than one thread gunicorn silently turns sync into gthread
+        command += ['--worker-class', worker_class] + (['--threads', '1'] if worker_class == 'sync' else [])
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                              start_new_session=True)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f'http://127.0.0.1:{port}/api/status', timeout=1)
+            return server
+        except requests.RequestException:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError('gunicorn did not start')
+
+
+def open_stream(port, timeout):
+    """Open /api/stream on a raw socket; returns it once the first frame arrived, else None"""
+    sock = socket.create_connection(('127.0.0.1', port), timeout=timeout)
+    sock.sendall(b'GET /api/stream HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n')
+    try:
+        received = b''
+        while b'connected' not in received:
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            received += chunk
+    except socket.timeout:
+        pass
+    if b'connected' in received:
+        return sock
+    sock.close()
+    return None
+
+
+def timed_get(port, path, timeout):
+    started = time.perf_counter()
+    try:
+        requests.get(f'http://127.0.0.1:{port}{path}', timeout=timeout).raise_for_status()
+    except requests.RequestException:
+        return None
+    return time.perf_counter() - started
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as data_dir:
+        port = free_port()
+        server = start_server(port, data_dir, args.worker_class)
+        streams, served = [], []
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(32) as executor:
+                opened = list(executor.map(lambda _: open_stream(port, args.timeout), range(args.streams)))
+            streams = [sock for sock in opened if sock]
+            print(f'streams open:      {len(streams)}/{args.streams} ({time.perf_counter() - started:.2f}s)')
+
+            paths = [ENDPOINTS[i % len(ENDPOINTS)] for i in range(args.requests)]
+            started = time.perf_counter()
+            with ThreadPoolExecutor(args.concurrency) as executor:
+                latencies = list(executor.map(lambda path: timed_get(port, path, args.timeout), paths))
+            elapsed = time.perf_counter() - started
+            served = [latency * 1000 for latency in latencies if latency is not None]
+            print(f'API requests:      {len(served)}/{args.requests} served, '
+                  f'{args.requests - len(served)} timed out after {args.timeout:.0f}s')
+            print(f'requests/sec:      {len(served) / elapsed:.1f}')
+            print(f'latency:           p50 {percentile(served, 0.5):.1f} ms, p95 {percentile(served, 0.95):.1f} ms, '
+                  f'max {max(served, default=0):.1f} ms')
+        finally:
+            for sock in streams:
+                sock.close()
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                pass
+            # A sync worker stuck in a stream can outlive the master's graceful shutdown
+            try:
+                os.killpg(server.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            server.wait()
+    return 0 if len(served) == args.requests else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--streams', type=int, default=150)
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--concurrency', type=int, default=10, help='API requests in flight at once')
+    parser.add_argument('--timeout', type=float, default=5.0)
+    parser.add_argument('--worker-class', help='override the gunicorn worker class, e.g. sync')
+    sys.exit(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
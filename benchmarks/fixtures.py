@@ -0,0 +1,121 @@
+"""Clinic page fixtures for the offline benchmarks"""
+import csv
+import hashlib
+import html
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED_CSV = os.path.join(ROOT, 'clinics.csv')
+
+
+def load_seed_clinics(path=SEED_CSV):
+    """Rows of the committed clinics.csv, used as realistic page content"""
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def render_clinic_page(clinic, doctors=12, nav_links=60):
+    """Render a HotDoc-like clinic page for a clinics.csv row.
+
+    The markup mirrors what the extractor looks for on the live site (h1,
+    address block, tel: link, ClinicContactDetails links) surrounded by the
+    navigation, doctor cards and scripts that make up most of a real page.
+    """
+    e = html.escape
+    website = clinic.get('website') or 'N/A'
+    phone = clinic.get('phone') or 'N/A'
+    nav = ''.join(
+        f'<li class="Nav-item"><a class="Nav-link" href="/medical-centres/suburb-{i}">Suburb {i}</a></li>'
+        for i in range(nav_links)
+    )
+    cards = ''.join(
+        f'<div class="DoctorCard"><div class="DoctorCard-avatar"><img src="/img/{i}.jpg" alt=""></div>'
+        f'<div class="DoctorCard-body"><h3 class="DoctorCard-name">Dr Example {i}</h3>'
+        f'<p class="DoctorCard-role">General Practitioner</p>'
+        f'<ul class="DoctorCard-tags"><li>Women\'s health</li><li>Skin checks</li></ul>'
+        f'<a class="btn" href="/request/appointment?doctor={i}">Book</a></div></div>'
+        for i in range(doctors)
+    )
+    contact_links = (
+        f'<a class="ClinicContactDetails-contact-link" href="https://www.google.com/maps?q={e(clinic["address"])}">Directions</a>'
+        f'<a class="ClinicContactDetails-contact-link" href="tel:{e(phone)}">{e(phone)}</a>'
+    )
+    if website != 'N/A':
+        contact_links += f'<a class="ClinicContactDetails-contact-link" href="{e(website)}">Visit website</a>'
+    return (
+        '<!DOCTYPE html><html lang="en"><head><meta charset="utf-8">'
+        f'<title>{e(clinic["name"])} - Book Online | HotDoc</title>'
+        '<link rel="stylesheet" href="/assets/app.css">'
+        '<script src="/assets/analytics.js"></script></head><body>'
+        f'<header class="Header"><nav><ul class="Nav">{nav}</ul></nav></header>'
+        '<main class="ClinicPage">'
+        f'<section class="ClinicHeader"><h1 class="ClinicHeader-title">{e(clinic["name"])}</h1>'
+        f'<div class="ClinicHeader-address"><span>{e(clinic["address"])}</span></div></section>'
+        f'<section class="ClinicContactDetails">{contact_links}</section>'
+        f'<section class="Doctors">{cards}</section>'
+        '</main>'
+        '<footer class="Footer"><a href="https://www.facebook.com/hotdoc">Facebook</a>'
+        '<a href="https://twitter.com/hotdoc">Twitter</a></footer>'
+        '<script>window.__APP_STATE__ = {"ready": true};</script>'
+        '</body></html>'
+    )
+
+
+# Pages saved by `python benchmarks/fixtures.py record`, preferred over rendered ones
+RECORDED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recorded')
+
+
+def page_filename(url):
+    """File name of a recorded page"""
+    return hashlib.sha1(url.encode('utf-8')).hexdigest() + '.html'
+
+
+def load_page(clinic, recorded_dir=RECORDED_DIR):
+    """HTML for a clinic: the recorded page if there is one, otherwise a rendered one"""
+    source_url = clinic.get('source_url', clinic['url'])
+    path = os.path.join(recorded_dir, page_filename(source_url))
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+    return render_clinic_page(clinic)
+
+
+def build_clinics(count, seed=None):
+    """Expand the seed rows to count clinics with unique URLs"""
+    seed = seed or load_seed_clinics()
+    clinics = []
+    for i in range(count):
+        row = dict(seed[i % len(seed)])
+        row['source_url'] = row['url']
+        if i >= len(seed):
+            # .../<suburb>/<slug>/doctors -> .../<suburb>/<slug>-<i>/doctors
+            parts = row['url'].rstrip('/').split('/')
+            parts[-2] = f'{parts[-2]}-{i}'
+            row['url'] = '/'.join(parts)
+            row['name'] = f"{row['name']} {i}"
+        clinics.append(row)
+    return clinics
+
+
+def record_pages(urls, recorded_dir=RECORDED_DIR, delay=2.0):
+    """Save the live HTML of urls for offline benchmarking (needs network access)"""
+    import requests
+
+    os.makedirs(recorded_dir, exist_ok=True)
+    session = requests.Session()
+    session.headers['User-Agent'] = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+    for i, url in enumerate(urls, 1):
+        response = session.get(url, timeout=30)
+        response.raise_for_status()
+        with open(os.path.join(recorded_dir, page_filename(url)), 'w', encoding='utf-8') as f:
+            f.write(response.text)
+        print(f'[{i}/{len(urls)}] recorded {url}')
+        time.sleep(delay)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ['record']:
+        sys.exit('usage: python benchmarks/fixtures.py record')
+    record_pages([clinic['url'] for clinic in load_seed_clinics()])
@@ -0,0 +1,201 @@
+"""Offline throughput benchmark for ClinicScraper against the stand-in HotDoc server.
+
+Runs get_sitemap_urls (streaming and cached), extract_clinic_data per page
+and an end-to-end scrape, and reports pages/sec, p50/p95 per-page latency,
+peak RSS and browser vs parse time. No request leaves the machine.
+
+    python benchmarks/run_benchmarks.py --clinics 300
+    python benchmarks/run_benchmarks.py --save baseline.json
+    python benchmarks/run_benchmarks.py --compare baseline.json --tolerance 0.2
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import ParsePool  # noqa: E402
+from ratelimit import HostRateLimiter  # noqa: E402
+from scraper import ClinicScraper  # noqa: E402
+from sitemap_cache import SitemapCache  # noqa: E402
+from server import StandInHotDoc  # noqa: E402
+
+FIELDS = ['name', 'address', 'phone', 'website']
+
+# Metrics where a lower value is better; everything else compared is higher-is-better
+LOWER_IS_BETTER = ('sitemap_seconds', 'sitemap_cached_seconds', 'extract_p50_ms', 'extract_p95_ms')
+COMPARED = ('sitemap_seconds', 'sitemap_cached_seconds', 'extract_pages_per_sec',
+            'extract_p50_ms', 'extract_p95_ms', 'scrape_pages_per_sec')
+
+# Absolute differences below these are timer noise, not regressions
+NOISE_FLOOR = {'sitemap_seconds': 0.1, 'sitemap_cached_seconds': 0.1, 'extract_p50_ms': 1.0, 'extract_p95_ms': 2.0}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def new_scraper(args, **kwargs):
+    return ClinicScraper(
+        backends=args.backends.split(','),
+        rate_limiter=HostRateLimiter(min_interval=args.rate_limit),
+        **kwargs
+    )
+
+
+def time_phase(label, func):
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    print(f'  {label}: {elapsed:.3f}s')
+    return result, elapsed
+
+
+def run(args):
+    report = {'clinics': args.clinics, 'workers': args.workers, 'backends': args.backends}
+
+    with StandInHotDoc(clinics=args.clinics, latency=args.latency_ms / 1000) as server:
+        print(f'Stand-in server: {server.sitemap_url} ({args.clinics} clinics)')
+
+        # 1. Sitemap enumeration, streaming and through the on-disk cache
+        urls, report['sitemap_seconds'] = time_phase(
+            'get_sitemap_urls (streaming)', lambda: new_scraper(args).get_sitemap_urls(server.sitemap_url)
+        )
+        assert len(urls) == args.clinics, f'expected {args.clinics} URLs, got {len(urls)}'
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = SitemapCache(os.path.join(tmp, 'sitemap.db'), max_age=0)
+            _, report['sitemap_cold_cache_seconds'] = time_phase(
+                'get_sitemap_urls (cold cache)',
+                lambda: new_scraper(args, sitemap_cache=cache).get_sitemap_urls(server.sitemap_url)
+            )
+            _, report['sitemap_cached_seconds'] = time_phase(
+                'get_sitemap_urls (warm cache, 304s)',
+                lambda: new_scraper(args, sitemap_cache=cache).get_sitemap_urls(server.sitemap_url)
+            )
+
+        # 2. Per-page extraction latency
+        scraper = new_scraper(args)
+        latencies = []
+        failures = 0
+        try:
+            # Warm up connections and lazy imports before measuring
+            for url in urls[:5]:
+                scraper.extract_clinic_data(url, FIELDS)
+            for url in urls[:args.extract_pages]:
+                started = time.perf_counter()
+                if scraper.extract_clinic_data(url, FIELDS) is None:
+                    failures += 1
+                latencies.append(time.perf_counter() - started)
+        finally:
+            scraper.close_driver()
+        report['extract_pages'] = len(latencies)
+        report['extract_failures'] = failures
+        report['extract_pages_per_sec'] = len(latencies) / sum(latencies) if latencies else 0.0
+        report['extract_p50_ms'] = percentile(latencies, 0.50) * 1000
+        report['extract_p95_ms'] = percentile(latencies, 0.95) * 1000
+        print(f"  extract_clinic_data: {report['extract_pages_per_sec']:.1f} pages/s, "
+              f"p50 {report['extract_p50_ms']:.1f} ms, p95 {report['extract_p95_ms']:.1f} ms")
+
+        # 3. End-to-end scrape, pipelined through parse processes with --parse-processes
+        parse_pool = ParsePool(args.parse_processes).start() if args.parse_processes else None
+        scraper = new_scraper(args, parse_pool=parse_pool)
+        label = f', {args.parse_processes} parse process(es)' if parse_pool else ''
+        try:
+            results, elapsed = time_phase(
+                f'scrape ({args.workers} worker(s){label})',
+                lambda: scraper.scrape(server.sitemap_url, 1, args.clinics, fields=FIELDS, workers=args.workers)
+            )
+        finally:
+            if parse_pool:
+                parse_pool.close()
+        report['scrape_seconds'] = elapsed
+        report['scrape_results'] = len(results)
+        report['scrape_pages_per_sec'] = len(results) / elapsed if elapsed else 0.0
+
+        stats = scraper.get_backend_stats()
+        report['backend_stats'] = stats
+        report['browser_seconds'] = stats.get('selenium', {}).get('fetch_seconds', 0.0)
+        report['http_fetch_seconds'] = stats.get('http', {}).get('fetch_seconds', 0.0)
+        report['parse_seconds'] = sum(s['parse_seconds'] for s in stats.values())
+        report['server_requests'] = server.requests
+
+    report['peak_rss_mb'] = peak_rss_mb()
+    return report
+
+
+def print_report(report):
+    print()
+    print(f"pages/sec (end-to-end):   {report['scrape_pages_per_sec']:.1f}")
+    print(f"pages/sec (extract only): {report['extract_pages_per_sec']:.1f}")
+    print(f"per-page latency:         p50 {report['extract_p50_ms']:.1f} ms, p95 {report['extract_p95_ms']:.1f} ms")
+    print(f"browser time:             {report['browser_seconds']:.2f}s")
+    print(f"http fetch time:          {report['http_fetch_seconds']:.2f}s")
+    print(f"parse time:               {report['parse_seconds']:.2f}s")
+    print(f"peak RSS (this process):  {report['peak_rss_mb']:.1f} MB")
+
+
+def compare(report, baseline, tolerance):
+    """Return the metrics that regressed by more than tolerance"""
+    regressions = []
+    for key in COMPARED:
+        old, new = baseline.get(key), report.get(key)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = change > tolerance if key in LOWER_IS_BETTER else change < -tolerance
+        if abs(new - old) < NOISE_FLOOR.get(key, 0):
+            worse = False
+        marker = 'REGRESSION' if worse else 'ok'
+        print(f'  {key}: {old:.3f} -> {new:.3f} ({change:+.0%}) {marker}')
+        if worse:
+            regressions.append(key)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clinics', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--backends', default='http', help='comma separated, e.g. http,selenium')
+    parser.add_argument('--extract-pages', type=int, default=100)
+    parser.add_argument('--latency-ms', type=float, default=0, help='simulated server latency per page')
+    parser.add_argument('--parse-processes', type=int, default=0,
+                        help='pipeline the end-to-end scrape with this many parse processes')
+    parser.add_argument('--rate-limit', type=float, default=0, help='seconds between requests per host')
+    parser.add_argument('--save', help='write the report as JSON')
+    parser.add_argument('--compare', help='baseline JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.35)
+    args = parser.parse_args()
+
+    report = run(args)
+    print_report(report)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Report saved to {args.save}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f'Comparing with {args.compare} (tolerance {args.tolerance:.0%}):')
+        if compare(report, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
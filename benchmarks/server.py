@@ -0,0 +1,139 @@
+"""Local stand-in for hotdoc.com.au serving gzipped sitemaps and clinic pages"""
+import gzip
+import hashlib
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+from xml.sax.saxutils import escape
+
+from fixtures import build_clinics, load_page
+
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+class StandInHotDoc:
+    """Serves a sitemap index, sub-sitemaps and clinic pages from memory.
+
+    Clinic URLs keep their HotDoc paths, only the host changes. Sub-sitemaps
+    also list doctor pages (which the scraper must filter out) and support
+    ETag / Last-Modified revalidation like the real site.
+
+        with StandInHotDoc(clinics=500) as server:
+            scraper.scrape(server.sitemap_url, 1, 500)
+    """
+
+    def __init__(self, clinics=200, per_sitemap=100, latency=0.0, host='127.0.0.1', port=0):
+        self.clinics = build_clinics(clinics)
+        self.per_sitemap = per_sitemap
+        self.latency = latency
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.base_url = f'http://{host}:{self.httpd.server_address[1]}'
+        self.thread = None
+        self.requests = 0
+        self.documents = {}
+        self._build()
+
+    @property
+    def sitemap_url(self):
+        return f'{self.base_url}/sitemap.xml.gz'
+
+    def local_url(self, url):
+        """Map a hotdoc.com.au URL onto this server"""
+        return self.base_url + urlparse(url).path
+
+    def _build(self):
+        last_modified = formatdate(time.time(), usegmt=True)
+
+        def add(path, body, content_type, compress=False):
+            if compress:
+                body = gzip.compress(body, mtime=0)
+            self.documents[path] = (body, content_type, hashlib.sha1(body).hexdigest(), last_modified)
+
+        sub_sitemaps = []
+        for start in range(0, len(self.clinics), self.per_sitemap):
+            entries = []
+            for clinic in self.clinics[start:start + self.per_sitemap]:
+                url = self.local_url(clinic['url'])
+                add(urlparse(url).path, load_page(clinic).encode('utf-8'), 'text/html; charset=utf-8')
+                entries.append(f'<url><loc>{escape(url)}</loc><lastmod>2024-01-01</lastmod></url>')
+                # Individual doctor pages are listed too and must be filtered out
+                entries.append(f'<url><loc>{escape(url)}/dr-example-1</loc></url>')
+            path = f'/sitemaps/sitemap-{len(sub_sitemaps) + 1}.xml.gz'
+            xml = f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="{SITEMAP_NS}">{"".join(entries)}</urlset>'
+            add(path, xml.encode('utf-8'), 'application/x-gzip', compress=True)
+            sub_sitemaps.append(f'<sitemap><loc>{self.base_url}{path}</loc></sitemap>')
+
+        index = f'<?xml version="1.0" encoding="UTF-8"?><sitemapindex xmlns="{SITEMAP_NS}">{"".join(sub_sitemaps)}</sitemapindex>'
+        add('/sitemap.xml.gz', index.encode('utf-8'), 'application/x-gzip', compress=True)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body are written separately; avoid Nagle/delayed-ACK stalls
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                server.requests += 1
+                document = server.documents.get(urlparse(self.path).path)
+                if document is None:
+                    self.send_error(404)
+                    return
+                body, content_type, etag, last_modified = document
+                if content_type.startswith('text/html') and server.latency:
+                    time.sleep(server.latency)
+                if self.headers.get('If-None-Match') == etag or \
+                   self.headers.get('If-Modified-Since') == last_modified:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', last_modified)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run the stand-in HotDoc server')
+    parser.add_argument('--clinics', type=int, default=200)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    args = parser.parse_args()
+
+    server = StandInHotDoc(clinics=args.clinics, latency=args.latency_ms / 1000, port=args.port)
+    print(f'Serving {args.clinics} clinics, sitemap at {server.sitemap_url}')
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,393 @@
+"""Coordinator/worker mode: scrape one job on any number of worker processes and hosts.
+
+The coordinator (normally the Flask app, see /api/cluster/*) enumerates the
+sitemap range into a LeaseQueue. Workers lease batches of URLs, scrape them
+with their own ClinicScraper and report the records back; the coordinator
+stores them in the job store, deduplicated by URL.
+
+    python cluster.py submit --start 1 --end 2000            # local queue in data/jobs.db
+    python cluster.py worker --threads 2                     # same host, same queue
+    python cluster.py worker --coordinator http://host:5005  # any host, over HTTP
+"""
+import argparse
+import itertools
+import os
+import socket
+import threading
+import time
+import uuid
+
+from exporter import export_chunks, write_export
+from records import csv_fieldnames
+
+# Job states owned by the Coordinator rather than the JobScheduler
+CLUSTER_STATUSES = ('enumerating', 'distributed')
+
+
+def default_scraper(callback):
+    """Plain ClinicScraper; the scraping stack is imported when the first one is made"""
+    from scraper import ClinicScraper
+    return ClinicScraper(progress_callback=callback)
+
+
+def validate_results(results):
+    """Check a worker's report: a list of dicts with an int index, a str url and dict or None data"""
+    if not isinstance(results, list):
+        raise ValueError('results must be a list')
+    for result in results:
+        if not (isinstance(result, dict) and isinstance(result.get('url'), str)
+                and isinstance(result.get('index'), int) and not isinstance(result['index'], bool)
+                and isinstance(result.get('data'), (dict, type(None)))):
+            raise ValueError('each result needs a str url, an int index and dict or null data')
+
+
+class Coordinator:
+    """Hands out leases and collects results of distributed jobs.
+
+    max_rate caps the clinic pages per second leased to the whole cluster,
+    so adding workers never increases the load on the host beyond it.
+    """
+
+    def __init__(self, job_store, lease_queue, scraper_factory=None, export_dir='data/exports',
+                 max_rate=None, log=None):
+        self.job_store = job_store
+        self.lease_queue = lease_queue
+        self.scraper_factory = scraper_factory or default_scraper
+        self.export_dir = export_dir
+        self.max_rate = max_rate
+        self.log = log or (lambda message, level='info': None)
+        self.lock = threading.Lock()
+        self.tokens = float(max_rate or 0)
+        self.refilled_at = time.monotonic()
+
+    def submit(self, params, priority=0, wait=False):
+        """Create a distributed job and enumerate its URLs into the queue (in the background)"""
+        if params.get('delta'):
+            raise ValueError('Delta mode is not supported for distributed jobs')
+        job_id = self.job_store.create_job(params, priority=priority, status='enumerating')
+        if wait:
+            self.enumerate(job_id, params)
+        else:
+            threading.Thread(target=self.enumerate, args=(job_id, params), daemon=True).start()
+        return job_id
+
+    def enumerate(self, job_id, params):
+        """Queue the job's clinic URLs in sitemap order"""
+        scraper = self.scraper_factory(None)
+        start_idx, end_idx = params['start'] - 1, params['end']
+        try:
+            if scraper.sitemap_cache:
+                entries = scraper.get_cached_entries(params['sitemap_url'], start_idx + 1, end_idx)
+            else:
+                entries = itertools.islice(scraper.iter_sitemap(params['sitemap_url']), start_idx, end_idx)
+            queued = self.lease_queue.enqueue(
+                job_id,
+                ((index, url, lastmod) for index, (url, lastmod) in enumerate(entries, start_idx))
+            )
+            if not self.advance(job_id, 'distributed'):
+                # Cancelled while enumerating
+                self.lease_queue.drop(job_id)
+                return
+            self.log(f'Distributed job {job_id}: queued {queued} clinic URLs')
+            self.check_complete(job_id)
+        except Exception as e:
+            self.advance(job_id, 'failed')
+            self.log(f'Distributed job {job_id}: error fetching sitemap: {str(e)}', 'error')
+
+    def advance(self, job_id, status):
+        """Move a job on from 'enumerating' unless it was cancelled meanwhile"""
+        with self.lock:
+            if self.job_store.get_job(job_id)['status'] != 'enumerating':
+                return False
+            self.job_store.set_status(job_id, status)
+            return True
+
+    def take_tokens(self, wanted):
+        """Grant up to wanted pages from the cluster-wide budget; returns (granted, retry_after)"""
+        if not self.max_rate:
+            return wanted, None
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.max_rate, self.tokens + (now - self.refilled_at) * self.max_rate)
+            self.refilled_at = now
+            granted = min(wanted, int(self.tokens))
+            if granted < 1:
+                return 0, (1 - self.tokens) / self.max_rate
+            self.tokens -= granted
+            return granted, None
+
+    def refund_tokens(self, count):
+        if self.max_rate and count > 0:
+            with self.lock:
+                self.tokens += count
+
+    def lease(self, worker, batch_size=10):
+        """Lease a batch for a worker.
+
+        Returns the lease with the job's fields and lease_seconds, {'retry_after': s}
+        when the cluster rate budget is used up, or None when nothing is queued.
+        """
+        granted, retry_after = self.take_tokens(batch_size)
+        if not granted:
+            return {'retry_after': retry_after}
+        lease = self.lease_queue.lease(worker, granted)
+        self.refund_tokens(granted - len(lease['items']) if lease else granted)
+        if not lease:
+            return None
+        job = self.job_store.get_job(lease['job_id'])
+        lease['fields'] = job['params']['fields']
+        lease['lease_seconds'] = self.lease_queue.lease_seconds
+        return lease
+
+    def extend(self, lease_id):
+        return self.lease_queue.extend(lease_id)
+
+    def report(self, lease_id, job_id, results):
+        """Store a worker's results: dicts with index, url and data (None if the page failed).
+
+        Only the first result per URL is kept, so a batch that was scraped
+        twice after its lease expired still yields one record per clinic.
+        Raises ValueError for malformed results.
+        """
+        validate_results(results)
+        newly_done = set(self.lease_queue.finish(
+            job_id,
+            lease_id,
+            [r['url'] for r in results if r.get('data')],
+            [r['url'] for r in results if not r.get('data')]
+        ))
+        records = [(r['index'], r['url'], r['data']) for r in results if r.get('data') and r['url'] in newly_done]
+        if records:
+            self.job_store.add_records(job_id, records)
+        self.check_complete(job_id)
+        return len(records)
+
+    def cancel(self, job_id):
+        """Cancel a distributed job: its queued and leased URLs are dropped, late reports ignored"""
+        with self.lock:
+            job = self.job_store.get_job(job_id)
+            if not job or job['status'] not in CLUSTER_STATUSES:
+                return False
+            self.job_store.set_status(job_id, 'cancelled')
+        dropped = self.lease_queue.drop(job_id)
+        self.export(job)
+        self.log(f'Distributed job {job_id} cancelled: {dropped} clinic URLs dropped', 'warning')
+        return True
+
+    def check_complete(self, job_id):
+        """Finish a job once none of its URLs is pending or leased"""
+        counts = self.lease_queue.counts(job_id)
+        if counts['pending'] or counts['leased']:
+            return False
+        with self.lock:
+            job = self.job_store.get_job(job_id)
+            if job['status'] != 'distributed':
+                return False
+            self.job_store.set_status(job_id, 'completed')
+        self.export(job)
+        self.log(f"Distributed job {job_id} complete: {counts['done']} scraped, {counts['failed']} failed",
+                 'success')
+        return True
+
+    def export(self, job):
+        """Write a finished job's CSV export in the background, not in the worker's report"""
+        # Not a daemon, so a local worker exiting when idle still finishes the file
+        threading.Thread(target=self.export_csv, args=(job,)).start()
+
+    def export_csv(self, job):
+        """Stream a job's records from the store into its CSV export"""
+        job_id = job['id']
+        if not self.job_store.count(job_id):
+            return
+        chunks = export_chunks(self.job_store.iter_records(job_id), 'csv', csv_fieldnames(job['params']['fields']))
+        try:
+            path = write_export(chunks, self.export_path(job_id))
+            self.log(f'Distributed job {job_id}: data saved to {path}', 'success')
+        except OSError as e:
+            self.log(f'Distributed job {job_id}: error saving CSV: {str(e)}', 'error')
+
+    def export_path(self, job_id):
+        return os.path.join(self.export_dir, f'{job_id}.csv')
+
+    def status(self, job_id):
+        job = self.job_store.get_job(job_id)
+        if not job:
+            return None
+        return dict(job, queue=self.lease_queue.counts(job_id), results_count=self.job_store.count(job_id))
+
+
+class RemoteCoordinator:
+    """Talks to a coordinator's /api/cluster endpoints; same interface as Coordinator for workers"""
+
+    def __init__(self, base_url, token=None, timeout=30):
+        import requests
+
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        if token:
+            self.session.headers['X-Cluster-Token'] = token
+        self.timeout = timeout
+
+    def post(self, path, payload):
+        response = self.session.post(f'{self.base_url}/api/cluster{path}', json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def lease(self, worker, batch_size=10):
+        return self.post('/lease', {'worker': worker, 'batch_size': batch_size}).get('lease')
+
+    def extend(self, lease_id):
+        return self.post(f'/leases/{lease_id}/extend', {}).get('extended', False)
+
+    def report(self, lease_id, job_id, results):
+        return self.post(f'/leases/{lease_id}/complete', {'job_id': job_id, 'results': results}).get('stored', 0)
+
+
+class ClusterWorker:
+    """Leases batches from a coordinator, scrapes them and reports the records back.
+
+    Each thread has its own ClinicScraper (and browser). Leases are extended
+    while a batch takes longer than half the lease time.
+    """
+
+    def __init__(self, coordinator, worker_id=None, batch_size=10, threads=1, scraper_factory=None,
+                 exit_when_idle=False, poll_interval=5.0, log=print):
+        self.coordinator = coordinator
+        self.worker_id = worker_id or f'{socket.gethostname()}-{uuid.uuid4().hex[:6]}'
+        self.batch_size = batch_size
+        self.threads = threads
+        self.scraper_factory = scraper_factory or default_scraper
+        self.exit_when_idle = exit_when_idle
+        self.poll_interval = poll_interval
+        self.log = log
+        self.stop_requested = False
+        self.scraped = 0
+
+    def stop(self):
+        self.stop_requested = True
+
+    def run(self):
+        """Run every thread until stopped, or until the queue is empty with exit_when_idle"""
+        threads = [threading.Thread(target=self.run_loop, daemon=True) for _ in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.scraped
+
+    def scraper_log(self, data):
+        if data['type'] == 'log' and data['level'] in ('warning', 'error'):
+            self.log(f"[{data['level'].upper()}] {data['message']}")
+
+    def run_loop(self):
+        scraper = self.scraper_factory(self.scraper_log)
+        try:
+            while not self.stop_requested:
+                try:
+                    lease = self.coordinator.lease(self.worker_id, self.batch_size)
+                except Exception as e:
+                    self.log(f'[WARNING] Lease failed: {str(e)}')
+                    time.sleep(self.poll_interval)
+                    continue
+                if not lease or not lease.get('items'):
+                    if lease is None and self.exit_when_idle:
+                        break
+                    time.sleep((lease or {}).get('retry_after') or self.poll_interval)
+                    continue
+                self.scrape_lease(scraper, lease)
+        finally:
+            for backend in scraper.backends:
+                backend.close()
+            scraper.close_driver()
+
+    def scrape_lease(self, scraper, lease):
+        results = []
+        extended_at = time.time()
+        for item in lease['items']:
+            if self.stop_requested:
+                break
+            data = scraper.extract_clinic_data(item['url'], lease['fields'])
+            results.append({'index': item['index'], 'url': item['url'], 'data': data})
+            if time.time() - extended_at > lease['lease_seconds'] / 2:
+                self.coordinator.extend(lease['lease_id'])
+                extended_at = time.time()
+        # Unscraped items of a stopped worker come back when the lease expires
+        stored = self.coordinator.report(lease['lease_id'], lease['job_id'], results)
+        self.scraped += stored
+        self.log(f"Lease {lease['lease_id'][:8]}: {stored}/{len(lease['items'])} clinics scraped")
+
+
+def main():
+    from job_store import JobStore
+    from lease_queue import LeaseQueue
+    from ratelimit import AdaptiveRateLimiter
+    from scraper import ClinicScraper
+    from sitemap_cache import SitemapCache
+
+    parser = argparse.ArgumentParser(description='Distributed HotDoc scraping')
+    parser.add_argument('--db', default=os.environ.get('JOB_STORE_PATH', 'data/jobs.db'),
+                        help='Local job store / queue database')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    submit = commands.add_parser('submit', help='Queue a range for cluster workers')
+    submit.add_argument('--sitemap-url', default='https://www.hotdoc.com.au/sitemap.xml.gz')
+    submit.add_argument('--start', type=int, default=1)
+    submit.add_argument('--end', type=int, default=10)
+    submit.add_argument('--fields', default='name,address,phone,website')
+    submit.add_argument('--priority', type=int, default=0)
+
+    worker = commands.add_parser('worker', help='Lease and scrape batches')
+    worker.add_argument('--coordinator', help='Coordinator base URL; the local --db queue if omitted')
+    worker.add_argument('--token', default=os.environ.get('CLUSTER_TOKEN'))
+    worker.add_argument('--threads', type=int, default=1)
+    worker.add_argument('--batch-size', type=int, default=10)
+    worker.add_argument('--backends', default='http,selenium')
+    worker.add_argument('--exit-when-idle', action='store_true')
+
+    args = parser.parse_args()
+
+    if args.command == 'submit':
+        job_store = JobStore(args.db)
+        coordinator = Coordinator(
+            job_store, LeaseQueue(args.db),
+            scraper_factory=lambda callback: ClinicScraper(progress_callback=callback,
+                                                          sitemap_cache=SitemapCache()),
+            log=lambda message, level='info': print(message)
+        )
+        params = {
+            'sitemap_url': args.sitemap_url,
+            'start': max(1, args.start),
+            'end': max(args.start, args.end),
+            'fields': sorted(args.fields.split(',')),
+            'delta': False
+        }
+        job_id = coordinator.submit(params, priority=args.priority, wait=True)
+        print(f'Job {job_id}: {coordinator.status(job_id)["queue"]}')
+        return
+
+    backends = args.backends.split(',')
+    # One limiter for all threads of this worker process
+    rate_limiter = AdaptiveRateLimiter()
+    if args.coordinator:
+        coordinator = RemoteCoordinator(args.coordinator, token=args.token)
+    else:
+        coordinator = Coordinator(JobStore(args.db), LeaseQueue(args.db),
+                                  log=lambda message, level='info': print(message))
+    worker = ClusterWorker(
+        coordinator,
+        batch_size=args.batch_size,
+        threads=args.threads,
+        scraper_factory=lambda callback: ClinicScraper(progress_callback=callback, backends=backends,
+                                                      rate_limiter=rate_limiter),
+        exit_when_idle=args.exit_when_idle
+    )
+    print(f'Worker {worker.worker_id} started with {args.threads} thread(s)')
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        worker.stop()
+    print(f'Worker {worker.worker_id} stored {worker.scraped} clinics')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""Entity resolution: recognise the same clinic listed under several URLs.
+
+HotDoc often lists one practice under several suburb slugs. Each scraped
+record is matched against earlier ones through hash indexes on its
+normalized phone number, website domain and name+postcode, so only the few
+records in the same block are compared, with a fuzzy name match (RapidFuzz
+when it is installed). Records that resolve to the same clinic share an entity id;
+with an EntityStore the resolution carries over to later runs.
+"""
+import difflib
+import re
+import threading
+import unicodedata
+import uuid
+from collections import namedtuple
+from urllib.parse import urlparse
+
+
+
+# entity_id is shared by all URLs of a clinic; canonical_url is the first one seen;
+# data is the clinic's record merged from all of them
+Resolution = namedtuple('Resolution', ['entity_id', 'canonical_url', 'duplicate', 'data'])
+
+# Name similarity (0-100) for two records in the same postcode to be the same clinic
+NAME_MATCH = 90
+
+# Lower bar when the phone number or website already links the records
+LINKED_NAME_MATCH = 80
+
+# Words that say nothing about which clinic it is
+NAME_STOPWORDS = frozenset((
+    'the', 'and', 'of', 'at', 'on', 'medical', 'centre', 'center', 'centres', 'clinic', 'clinics',
+    'practice', 'health', 'healthcare', 'gp', 'gps', 'doctors', 'doctor', 'family', 'general',
+    'group', 'surgery', 'pty', 'ltd',
+))
+
+# Hosts shared by unrelated clinics; their first path segment is kept in the key
+SHARED_HOSTS = ('facebook.com', 'instagram.com', 'linktr.ee', 'hotdoc.com.au', 'google.com',
+                'healthengine.com.au')
+
+# Nationwide numbers (13/1300/1800) are often shared by a whole chain
+SHARED_PHONE_PREFIXES = ('13', '18')
+
+MISSING = ('', 'N/A', None)
+
+# rapidfuzz.fuzz, or False when it is not installed; imported on the first comparison
+fuzz = None
+
+
+def normalize_phone(phone):
+    """Digits of an Australian phone number in national form, or None"""
+    if phone in MISSING:
+        return None
+    digits = re.sub(r'\D', '', phone)
+    if digits.startswith('61') and len(digits) == 11:
+        digits = '0' + digits[2:]
+    if len(digits) < 8 or digits.startswith(SHARED_PHONE_PREFIXES):
+        return None
+    return digits
+
+
+def website_key(website):
+    """Host of a website without 'www.', plus the first path segment on shared hosts"""
+    if website in MISSING:
+        return None
+    parsed = urlparse(website if '//' in website else f'//{website}')
+    host = (parsed.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    if not host or '.' not in host:
+        return None
+    if any(host == shared or host.endswith('.' + shared) for shared in SHARED_HOSTS):
+        segment = parsed.path.strip('/').split('/')[0].lower()
+        return f'{host}/{segment}' if segment else None
+    return host
+
+
+def name_key(name):
+    """Lowercase ASCII name without punctuation and generic words"""
+    if name in MISSING:
+        return None
+    name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode().lower()
+    tokens = re.findall(r'[a-z0-9]+', name.replace('&', ' and '))
+    distinctive = [token for token in tokens if token not in NAME_STOPWORDS]
+    return ' '.join(distinctive or tokens) or None
+
+
+def name_similarity(a, b):
+    """0-100 similarity of two name keys, ignoring word order"""
+    global fuzz
+    if not a or not b:
+        return 0
+    if fuzz is None:
+        try:
+            from rapidfuzz import fuzz
+        except ImportError:
+            fuzz = False
+    if fuzz:
+        return fuzz.token_sort_ratio(a, b)
+    return 100 * difflib.SequenceMatcher(None, ' '.join(sorted(a.split())), ' '.join(sorted(b.split()))).ratio()
+
+
+def merge_records(base, extra):
+    """base with its missing fields filled in from extra"""
+    merged = dict(base)
+    for field, value in extra.items():
+        if merged.get(field) in MISSING and value not in MISSING:
+            merged[field] = value
+    return merged
+
+
+def fill_missing(record, extra):
+    """record with its missing values taken from extra; no fields are added"""
+    return {
+        field: extra.get(field, value) if value in MISSING else value
+        for field, value in record.items()
+    }
+
+
+class ClinicResolver:
+    """Assigns every clinic record an entity id, merging duplicates.
+
+    Indexes map phone, website and postcode+name word to entity ids (the
+    blocks) and name+postcode to exactly one entity, so resolving a record costs a few
+    dict lookups plus fuzzy name comparisons within its blocks, and a whole
+    run is near-linear instead of comparing every pair. Thread-safe; with
+    a store, every resolved URL is persisted and loaded again on first use.
+    """
+
+    def __init__(self, store=None):
+        self.store = store
+        self.lock = threading.Lock()
+        self.entities = {}
+        self.by_url = {}
+        self.by_name = {}
+        self.blocks = {}
+        self.loaded = store is None
+
+    def load(self):
+        """Index the stored resolutions once; called with the lock held"""
+        if not self.loaded:
+            self.loaded = True
+            for url, entity_id, data in self.store.load():
+                self.add(url, data, entity_id)
+
+    def keys(self, url, data):
+        """(name key, postcode, block keys) of a record"""
+        from extractor import location_from_url
+
+        _, postcode = location_from_url(url)
+        name = name_key(data.get('name'))
+        blocks = []
+        phone = normalize_phone(data.get('phone'))
+        if phone:
+            blocks.append(('phone', phone))
+        website = website_key(data.get('website'))
+        if website:
+            blocks.append(('website', website))
+        if postcode and name:
+            # Names that can reach NAME_MATCH share a word, so a postcode is blocked by name word
+            blocks.extend(('name', (postcode, token)) for token in set(name.split()))
+        return name, postcode, blocks
+
+    def match(self, name, postcode, blocks):
+        """Entity id of the clinic a record belongs to, or None"""
+        if name and postcode and (name, postcode) in self.by_name:
+            return self.by_name[(name, postcode)]
+        linked = {}
+        for kind, value in blocks:
+            for entity_id in self.blocks.get((kind, value), ()):
+                linked.setdefault(entity_id, set()).add(kind)
+        best, best_score = None, 0
+        for entity_id, kinds in linked.items():
+            entity = self.entities[entity_id]
+            same_place = postcode is not None and postcode in entity['postcodes']
+            similarity = max((name_similarity(name, other) for other in entity['names']), default=0)
+            if 'phone' in kinds and 'website' in kinds and (not name or not entity['names']):
+                score = 100
+            elif same_place and 'phone' in kinds:
+                score = max(similarity, LINKED_NAME_MATCH)
+            elif kinds & {'phone', 'website'} and similarity >= LINKED_NAME_MATCH:
+                score = similarity
+            elif same_place and similarity >= NAME_MATCH:
+                score = similarity
+            else:
+                continue
+            if score > best_score:
+                best, best_score = entity_id, score
+        return best
+
+    def add(self, url, data, entity_id=None):
+        """Index a record under entity_id, or the entity it matches, or a new one"""
+        name, postcode, blocks = self.keys(url, data)
+        if entity_id is None:
+            entity_id = self.match(name, postcode, blocks) or uuid.uuid4().hex[:12]
+        entity = self.entities.get(entity_id)
+        if entity is None:
+            entity = self.entities[entity_id] = {
+                'url': url, 'data': dict(data), 'urls': [], 'names': set(), 'postcodes': set()
+            }
+        else:
+            entity['data'] = merge_records(entity['data'], data)
+        entity['urls'].append(url)
+        if name:
+            entity['names'].add(name)
+            if postcode:
+                self.by_name.setdefault((name, postcode), entity_id)
+        if postcode:
+            entity['postcodes'].add(postcode)
+        for key in blocks:
+            self.blocks.setdefault(key, set()).add(entity_id)
+        self.by_url[url] = entity_id
+        return entity_id
+
+    def resolve(self, url, data):
+        """Resolve a freshly scraped record; returns a Resolution"""
+        with self.lock:
+            self.load()
+            entity_id = self.by_url.get(url)
+            if entity_id is None:
+                entity_id = self.add(url, data)
+            else:
+                entity = self.entities[entity_id]
+                entity['data'] = merge_records(entity['data'], data)
+            if self.store:
+                self.store.save(url, entity_id, data)
+            entity = self.entities[entity_id]
+            return Resolution(entity_id, entity['url'], entity['url'] != url, dict(entity['data']))
+
+    def lookup(self, url):
+        """Resolution of a URL resolved before, or None"""
+        with self.lock:
+            self.load()
+            entity_id = self.by_url.get(url)
+            if entity_id is None:
+                return None
+            entity = self.entities[entity_id]
+            return Resolution(entity_id, entity['url'], entity['url'] != url, dict(entity['data']))
+
+    def __len__(self):
+        with self.lock:
+            self.load()
+            return len(self.entities)
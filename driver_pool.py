@@ -0,0 +1,167 @@
+"""Process-wide pool of warm headless Chrome drivers"""
+import threading
+import time
+
+from metrics import observe_stage
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def create_driver():
+    """Start a headless Chrome configured by scraper_config, with resource blocking"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+    try:
+        from scraper_config import get_chrome_options, block_resources
+        chrome_options = get_chrome_options()
+    except ImportError:
+        # Fallback to default options if config not available
+        block_resources = None
+        chrome_options = Options()
+        chrome_options.add_argument('--headless=new')
+        chrome_options.add_argument('--no-sandbox')
+        chrome_options.add_argument('--disable-dev-shm-usage')
+        chrome_options.add_argument('--disable-gpu')
+        chrome_options.add_argument('--window-size=1920,1080')
+        chrome_options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
+
+    started = time.perf_counter()
+    driver = webdriver.Chrome(options=chrome_options)
+    if block_resources:
+        try:
+            block_resources(driver)
+        except Exception:
+            # CDP is unavailable on some drivers; pages still load, just slower
+            pass
+    observe_stage('driver_start', 'selenium', time.perf_counter() - started)
+    return driver
+
+
+def browser_memory_mb(driver):
+    """Resident memory of chromedriver and its Chrome processes, or None if unknown"""
+    if psutil is None:
+        return None
+    try:
+        process = psutil.Process(driver.service.process.pid)
+        processes = [process] + process.children(recursive=True)
+    except (AttributeError, psutil.Error):
+        return None
+    total = 0
+    for proc in processes:
+        try:
+            total += proc.memory_info().rss
+        except psutil.Error:
+            continue
+    return total / (1024 * 1024)
+
+
+class DriverPool:
+    """Keeps headless browsers warm between jobs and recycles worn-out ones.
+
+    acquire() hands out an idle driver or starts a new one; release() puts
+    it back for the next job. A driver is quit instead of reused once it has
+    loaded max_pages pages or its processes use more than max_memory_mb.
+    At most max_idle drivers are kept when nobody is using them.
+    """
+
+    def __init__(self, max_idle=2, max_pages=200, max_memory_mb=1024, memory_check_every=20,
+                 factory=create_driver):
+        self.max_idle = max_idle
+        self.max_pages = max_pages
+        self.max_memory_mb = max_memory_mb
+        self.memory_check_every = memory_check_every
+        self.factory = factory
+        self.lock = threading.Lock()
+        self.idle = []
+        self.pages = {}
+        self.stats = {'started': 0, 'reused': 0, 'recycled': 0}
+
+    def acquire(self):
+        """Return a live driver, preferring a warm one"""
+        while True:
+            with self.lock:
+                driver = self.idle.pop() if self.idle else None
+            if driver is None:
+                break
+            if self.is_alive(driver):
+                with self.lock:
+                    self.stats['reused'] += 1
+                return driver
+            self.discard(driver)
+
+        driver = self.factory()
+        with self.lock:
+            self.pages[id(driver)] = 0
+            self.stats['started'] += 1
+        return driver
+
+    def release(self, driver):
+        """Return a driver to the pool, or quit it if it is worn out or the pool is full"""
+        if driver is None:
+            return
+        if self.is_worn(driver, force_memory_check=True):
+            self.retire(driver)
+            return
+        try:
+            # Drop the last page so an idle browser holds as little memory as possible
+            driver.get('about:blank')
+        except Exception:
+            self.discard(driver)
+            return
+        with self.lock:
+            if len(self.idle) < self.max_idle:
+                self.idle.append(driver)
+                return
+        self.discard(driver)
+
+    def record_page(self, driver):
+        """Count a page load against the driver's recycling budget"""
+        with self.lock:
+            self.pages[id(driver)] = self.pages.get(id(driver), 0) + 1
+
+    def is_worn(self, driver, force_memory_check=False):
+        """True once the driver has reached max_pages or max_memory_mb"""
+        with self.lock:
+            pages = self.pages.get(id(driver), 0)
+        if self.max_pages and pages >= self.max_pages:
+            return True
+        if not self.max_memory_mb:
+            return False
+        if not force_memory_check and (not pages or pages % self.memory_check_every):
+            return False
+        memory = browser_memory_mb(driver)
+        return memory is not None and memory > self.max_memory_mb
+
+    def retire(self, driver):
+        """Quit a worn-out driver"""
+        with self.lock:
+            self.stats['recycled'] += 1
+        self.discard(driver)
+
+    @staticmethod
+    def is_alive(driver):
+        try:
+            driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def discard(self, driver):
+        """Quit a driver for good"""
+        with self.lock:
+            self.pages.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def close(self):
+        """Quit every idle driver"""
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for driver in idle:
+            self.discard(driver)
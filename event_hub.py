@@ -0,0 +1,124 @@
+"""Broadcast hub for Server-Sent Events with bounded replay and event coalescing"""
+import collections
+import json
+import threading
+import time
+
+
+# Only the latest event of these types matters to a client, so rapid ones are merged
+COALESCED_TYPES = ('progress', 'backend_stats', 'pipeline')
+
+
+def format_sse(event, event_id=None):
+    """Encode an event as one SSE frame"""
+    frame = f'id: {event_id}\n' if event_id is not None else ''
+    return f'{frame}data: {json.dumps(event)}\n\n'
+
+
+class EventHub:
+    """Fans events out to any number of SSE subscribers with bounded memory.
+
+    Published events become numbered frames in a ring buffer of buffer_size
+    frames shared by all subscribers; each subscriber only keeps the id of
+    the last frame it sent, so a reconnecting client resumes after its
+    Last-Event-ID for as long as that frame is still buffered. Progress
+    events published within flush_interval are coalesced into the latest
+    one, and log events are batched into a single 'logs' frame of at most
+    max_batch entries. Any other event first flushes what is pending, so
+    clients see events in the order they were published.
+    """
+
+    def __init__(self, buffer_size=500, flush_interval=0.5, max_batch=100):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.frames = collections.deque(maxlen=buffer_size)
+        self.condition = threading.Condition()
+        self.last_id = 0
+        self.pending_logs = []
+        self.pending = {}
+        self.flushed_at = time.monotonic()
+
+    def publish(self, event):
+        with self.condition:
+            event_type = event.get('type')
+            if event_type == 'log':
+                self.pending_logs.append(event)
+                if len(self.pending_logs) >= self.max_batch:
+                    self._flush()
+            elif event_type in COALESCED_TYPES:
+                self.pending[event_type] = event
+            else:
+                self._flush()
+                self._append(event)
+            if time.monotonic() - self.flushed_at >= self.flush_interval:
+                self._flush()
+
+    def _append(self, event):
+        self.last_id += 1
+        self.frames.append((self.last_id, event))
+        self.condition.notify_all()
+
+    def _flush(self):
+        """Turn pending logs and coalesced events into frames; caller holds the lock"""
+        self.flushed_at = time.monotonic()
+        if self.pending_logs:
+            logs, self.pending_logs = self.pending_logs, []
+            self._append({'type': 'logs', 'entries': logs})
+        for event_type in COALESCED_TYPES:
+            if event_type in self.pending:
+                self._append(self.pending.pop(event_type))
+
+    def clear(self):
+        """Forget buffered and pending events; frame ids keep increasing"""
+        with self.condition:
+            self.frames.clear()
+            self.pending_logs = []
+            self.pending = {}
+
+    def cursor(self, last_event_id=None):
+        """Position to read from: after last_event_id, or only new frames when None"""
+        with self.condition:
+            if last_event_id is None or last_event_id > self.last_id:
+                return self.last_id
+            return last_event_id
+
+    def read(self, cursor, timeout=30):
+        """Frames after cursor as (id, event) pairs, waiting up to timeout for one.
+
+        A subscriber that fell further behind than the buffer skips the
+        frames that were dropped. Returns [] when the timeout passes.
+        """
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                if self.pending_logs or self.pending:
+                    # Nothing else may publish for a while; don't hold the last update back
+                    if time.monotonic() - self.flushed_at >= self.flush_interval:
+                        self._flush()
+                if self.last_id > cursor:
+                    frames = [frame for frame in self.frames if frame[0] > cursor]
+                    if frames:
+                        return frames
+                    # The frames were cleared before this subscriber got to them
+                    cursor = self.last_id
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self.condition.wait(min(remaining, self.flush_interval))
+
+    def stream(self, last_event_id=None, heartbeat=30, until=None):
+        """Generator of SSE frames for one subscriber.
+
+        until(event) returning True ends the stream after that event.
+        """
+        cursor = self.cursor(last_event_id)
+        while True:
+            frames = self.read(cursor, timeout=heartbeat)
+            if not frames:
+                yield ': heartbeat\n\n'
+                continue
+            for event_id, event in frames:
+                cursor = event_id
+                yield format_sse(event, event_id)
+                if until and until(event):
+                    return
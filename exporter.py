@@ -0,0 +1,164 @@
+"""Streaming exports of scraped records as CSV, JSONL or Parquet"""
+import csv
+import importlib.util
+import io
+import json
+import os
+import zlib
+
+
+# format -> (mimetype, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+# Parquet is compressed already, gzipping it again only costs CPU
+COMPRESSIBLE_FORMATS = ('csv', 'jsonl')
+
+# Rows per chunk handed to the response; Parquet writes one row group per chunk
+CHUNK_ROWS = 500
+PARQUET_CHUNK_ROWS = 10000
+
+
+def parquet_available():
+    # Only looked up here; pyarrow itself is imported on the first Parquet export
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def _drain(buffer):
+    """Return and clear the text written to a StringIO"""
+    data = buffer.getvalue().encode('utf-8')
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+
+def iter_csv(records, fieldnames, chunk_rows=CHUNK_ROWS):
+    """Yield a CSV export as byte chunks of chunk_rows rows"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction='ignore')
+    writer.writeheader()
+    for rows, record in enumerate(records, 1):
+        writer.writerow(record)
+        if rows % chunk_rows == 0:
+            yield _drain(buffer)
+    if buffer.tell():
+        yield _drain(buffer)
+
+
+def iter_jsonl(records, chunk_rows=CHUNK_ROWS):
+    """Yield one JSON object per line, as byte chunks of chunk_rows records"""
+    buffer = io.StringIO()
+    for rows, record in enumerate(records, 1):
+        buffer.write(json.dumps(record, ensure_ascii=False))
+        buffer.write('\n')
+        if rows % chunk_rows == 0:
+            yield _drain(buffer)
+    if buffer.tell():
+        yield _drain(buffer)
+
+
+class _ChunkSink:
+    """Write-only file object that keeps what was written until it is drained"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_parquet(records, fieldnames, chunk_rows=PARQUET_CHUNK_ROWS):
+    """Yield a Parquet file as byte chunks, one row group of string columns at a time"""
+    if not parquet_available():
+        raise ValueError('Parquet export needs pyarrow, which is not installed')
+    import pyarrow
+    import pyarrow.parquet
+
+    schema = pyarrow.schema([(name, pyarrow.string()) for name in fieldnames])
+    sink = _ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(pyarrow.PythonFile(sink, mode='w'), schema)
+    columns = {name: [] for name in fieldnames}
+    rows = 0
+    for record in records:
+        for name in fieldnames:
+            value = record.get(name)
+            columns[name].append(None if value is None else str(value))
+        rows += 1
+        if rows % chunk_rows == 0:
+            writer.write_table(pyarrow.Table.from_pydict(columns, schema=schema))
+            columns = {name: [] for name in fieldnames}
+            yield sink.drain()
+    if rows % chunk_rows:
+        writer.write_table(pyarrow.Table.from_pydict(columns, schema=schema))
+    # The footer with the file metadata is written on close
+    writer.close()
+    yield sink.drain()
+
+
+def export_chunks(records, fmt, fieldnames):
+    """Byte chunks of records exported in fmt (a key of EXPORT_FORMATS)"""
+    if fmt == 'csv':
+        return iter_csv(records, fieldnames)
+    if fmt == 'jsonl':
+        return iter_jsonl(records)
+    if fmt == 'parquet':
+        return iter_parquet(records, fieldnames)
+    raise ValueError(f'Unknown export format: {fmt}')
+
+
+def write_export(chunks, path):
+    """Write a stream of byte chunks to path via a .tmp file, so readers never see half an export"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(f'{path}.tmp', 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(f'{path}.tmp', path)
+    return path
+
+
+def gzip_chunks(chunks, level=6):
+    """Compress a stream of byte chunks into one gzip stream"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def count_bytes(chunks):
+    """Total size of a stream of byte chunks, without keeping them"""
+    return sum(len(chunk) for chunk in chunks)
+
+
+def slice_chunks(chunks, start, stop):
+    """Yield the bytes start..stop (exclusive) of a stream of byte chunks"""
+    position = 0
+    for chunk in chunks:
+        end = position + len(chunk)
+        if end > start:
+            yield chunk[max(0, start - position):stop - position]
+        position = end
+        if position >= stop:
+            return
@@ -0,0 +1,403 @@
+"""Field extraction from clinic page HTML"""
+import hashlib
+import json
+import re
+import lxml.html
+from lxml import etree
+
+
+# Hosts that are never the clinic's own website
+EXCLUDED_WEBSITE_HOSTS = ('hotdoc.com', 'facebook.com', 'instagram.com', 'linkedin.com', 'twitter.com')
+
+# JSON-LD types that describe a clinic
+CLINIC_LD_TYPES = ('MedicalClinic', 'MedicalBusiness', 'MedicalOrganization', 'LocalBusiness', 'Physician')
+
+PHONE_KEYS = ('telephone', 'phone', 'phoneNumber', 'phone_number')
+
+# Clinic URLs look like /medical-centres/<suburb>-<STATE>-<postcode>/<slug>/doctors
+LOCATION_RE = re.compile(r'/medical-centres/[^/]+-([A-Za-z]{2,3})-(\d{4})/')
+
+
+def content_hash(html):
+    """Hash of the raw page used to detect unchanged pages"""
+    return hashlib.sha1(html.encode('utf-8')).hexdigest()
+
+
+def is_external_website(href, excluded_google='google.com/maps'):
+    """Check if a link points to an external (non HotDoc, non social) site"""
+    if not href or not href.startswith('http'):
+        return False
+    if excluded_google in href:
+        return False
+    return not any(host in href for host in EXCLUDED_WEBSITE_HOSTS)
+
+
+def clean_phone(phone):
+    """Strip everything but digits and dialling characters"""
+    return re.sub(r'[^\d\s\+\(\)-]', '', phone).strip()
+
+
+def name_from_url(url):
+    """Derive a readable clinic name from the URL slug"""
+    url_parts = url.split('/')
+    if len(url_parts) >= 5:
+        slug = url_parts[-2] if url_parts[-1] == 'doctors' else url_parts[-1]
+        return slug.replace('_', ' ').replace('-', ' ').title()
+    return None
+
+
+def location_from_url(url):
+    """Return (state, postcode) from a clinic URL, or (None, None)"""
+    match = LOCATION_RE.search(url or '')
+    if not match:
+        return None, None
+    return match.group(1).upper(), match.group(2)
+
+
+def has_website(record):
+    """Check if a record has a usable website"""
+    website = record.get('website')
+    return bool(website and website.strip() and website != 'N/A')
+
+
+def _iter_json_ld(scripts):
+    """Yield every JSON-LD object from the given script bodies"""
+    for body in scripts:
+        try:
+            payload = json.loads(body or '')
+        except ValueError:
+            continue
+        stack = [payload]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, list):
+                stack.extend(item)
+            elif isinstance(item, dict):
+                if '@graph' in item:
+                    stack.extend(item['@graph'] if isinstance(item['@graph'], list) else [item['@graph']])
+                yield item
+
+
+def _format_ld_address(address):
+    """Flatten a schema.org PostalAddress into a single line"""
+    if isinstance(address, str):
+        return ' '.join(address.split())
+    if not isinstance(address, dict):
+        return None
+    parts = [address.get('streetAddress'), address.get('addressLocality')]
+    region = ' '.join(p for p in (address.get('addressRegion'), address.get('postalCode')) if p)
+    parts.append(region)
+    line = ', '.join(p.strip() for p in parts if p and str(p).strip())
+    return line or None
+
+
+def _find_clinic_in_state(node, depth=0):
+    """Search a Next.js state tree for a dict that looks like a clinic"""
+    if depth > 12:
+        return None
+    if isinstance(node, dict):
+        if isinstance(node.get('name'), str) and any(isinstance(node.get(k), str) for k in PHONE_KEYS):
+            return node
+        children = node.values()
+    elif isinstance(node, list):
+        children = node
+    else:
+        return None
+    for child in children:
+        found = _find_clinic_in_state(child, depth + 1)
+        if found:
+            return found
+    return None
+
+
+def extract_embedded_data(json_ld_scripts, next_data_script=None):
+    """Read clinic details from JSON-LD or __NEXT_DATA__ embedded in the raw HTML"""
+    data = {}
+
+    for item in _iter_json_ld(json_ld_scripts):
+        types = item.get('@type')
+        types = types if isinstance(types, list) else [types]
+        if not any(t in CLINIC_LD_TYPES for t in types):
+            continue
+        if item.get('name'):
+            data.setdefault('name', ' '.join(str(item['name']).split()))
+        if item.get('telephone'):
+            data.setdefault('phone', clean_phone(str(item['telephone'])))
+        address = _format_ld_address(item.get('address'))
+        if address:
+            data.setdefault('address', address)
+        for key in ('url', 'sameAs'):
+            values = item.get(key)
+            values = values if isinstance(values, list) else [values]
+            for value in values:
+                if isinstance(value, str) and is_external_website(value, 'google.com'):
+                    data.setdefault('website', value)
+                    break
+
+    if next_data_script:
+        try:
+            state = json.loads(next_data_script)
+        except ValueError:
+            state = None
+        clinic = _find_clinic_in_state(state) if state else None
+        if clinic:
+            data.setdefault('name', ' '.join(clinic['name'].split()))
+            for key in PHONE_KEYS:
+                if isinstance(clinic.get(key), str):
+                    data.setdefault('phone', clean_phone(clinic[key]))
+                    break
+            address = clinic.get('address') or clinic.get('fullAddress')
+            address = _format_ld_address(address)
+            if address:
+                data.setdefault('address', address)
+            website = clinic.get('website') or clinic.get('websiteUrl')
+            if isinstance(website, str) and is_external_website(website, 'google.com'):
+                data.setdefault('website', website)
+
+    return data
+
+
+# Visible text of an element, skipping script/style bodies and comments
+_TEXT_NODES = etree.XPath('.//text()[not(parent::script) and not(parent::style)]')
+
+_HTML_PARSER = lxml.html.HTMLParser(encoding='utf-8')
+
+WEBSITE_LINK_KEYWORDS = ('visit', 'website', 'clinic', '.com', '.au')
+
+
+def element_text(elem):
+    """Equivalent of BeautifulSoup's get_text(strip=True)"""
+    return ''.join(s.strip() for s in _TEXT_NODES(elem))
+
+
+def _address_value(elem):
+    return ' '.join(element_text(elem).split()) or None
+
+
+def _phone_value(elem):
+    href = elem.get('href') or ''
+    if elem.tag == 'a' and href.startswith('tel:'):
+        phone = href.replace('tel:', '').strip()
+    else:
+        phone = element_text(elem)
+    return clean_phone(phone) or None
+
+
+def _contact_link_value(elem):
+    href = elem.get('href', '')
+    # Filter out maps, social media, and HotDoc links
+    if is_external_website(href):
+        return href
+    return None
+
+
+def _external_link_value(elem):
+    href = elem.get('href')
+    # Check if it's a clinic website
+    if is_external_website(href, 'google.com'):
+        # Additional check: likely to be clinic website
+        text = element_text(elem).lower()
+        if any(keyword in text for keyword in WEBSITE_LINK_KEYWORDS):
+            return href
+    return None
+
+
+class Rule:
+    """One precompiled selector of a field.
+
+    An element matches when its tag equals tag (if given) and attribute
+    attr exists and matches pattern (if given). The first matching element
+    in document order for which value(elem) is non-empty wins, like
+    BeautifulSoup's find().
+    """
+    __slots__ = ('tag', 'attr', 'pattern', 'value')
+
+    def __init__(self, value, tag=None, attr=None, pattern=None):
+        self.tag = tag
+        self.attr = attr
+        self.pattern = re.compile(pattern, re.I) if isinstance(pattern, str) else pattern
+        self.value = value
+
+
+# Selectors per field, in priority order
+FIELD_SPECS = {
+    'name': [
+        Rule(element_text, tag='h1'),
+    ],
+    'address': [
+        Rule(_address_value, attr='itemprop', pattern=re.compile(r'\Aaddress\Z')),
+        Rule(_address_value, tag='address'),
+        Rule(_address_value, attr='class', pattern=r'address'),
+        Rule(_address_value, attr='data-test-id', pattern=r'address'),
+    ],
+    'phone': [
+        Rule(_phone_value, attr='itemprop', pattern=re.compile(r'\Atelephone\Z')),
+        Rule(_phone_value, tag='a', attr='href', pattern=re.compile(r'tel:')),
+        Rule(_phone_value, attr='class', pattern=r'phone'),
+        Rule(_phone_value, attr='data-test-id', pattern=r'phone'),
+    ],
+    'website': [
+        # First try: ClinicContactDetails-contact-link (most reliable)
+        Rule(_contact_link_value, tag='a', attr='class',
+             pattern=re.compile(r'(?:^|\s)ClinicContactDetails-contact-link(?:\s|$)')),
+        # Second try: any external link whose text looks like a website link
+        Rule(_external_link_value, tag='a', attr='href', pattern=re.compile(r'\Ahttp')),
+    ],
+}
+
+# CSS equivalents of FIELD_SPECS; the browser waits until these have rendered
+READY_SELECTORS = {
+    'name': 'h1',
+    'address': '[itemprop="address"], address, [class*="address" i], [data-test-id*="address" i]',
+    'phone': '[itemprop="telephone"], a[href^="tel:"], [class*="phone" i], [data-test-id*="phone" i]',
+    'website': 'a.ClinicContactDetails-contact-link',
+}
+
+CONTACT_BLOCK_SELECTOR = '[class*="ClinicContactDetails"]'
+
+# Any of these means the clinic page itself has rendered
+RENDERED_SELECTOR = 'h1, ' + CONTACT_BLOCK_SELECTOR
+
+
+def ready_selectors(fields, required_fields):
+    """One CSS selector per requested field that matches once the field can be read.
+
+    An optional field (not in required_fields) also counts as ready once the
+    contact details block is there, since its absence is then final.
+    """
+    selectors = []
+    for field in fields:
+        selector = READY_SELECTORS.get(field)
+        if not selector:
+            continue
+        if field not in required_fields:
+            selector = f'{selector}, {CONTACT_BLOCK_SELECTOR}'
+        selectors.append(selector)
+    return selectors
+
+
+_JSON_LD_SCRIPTS = etree.XPath('//script[@type="application/ld+json"]/text()')
+_NEXT_DATA_SCRIPT = etree.XPath('//script[@id="__NEXT_DATA__"]/text()')
+
+
+def parse_tree(html):
+    """Parse page HTML into an lxml tree"""
+    if isinstance(html, str):
+        html = html.encode('utf-8')
+    return lxml.html.fromstring(html, parser=_HTML_PARSER)
+
+
+class PageScan:
+    """Result of one traversal: the first value found per rule"""
+    __slots__ = ('tree', 'matches', 'has_h1')
+
+    def __init__(self, tree, fields):
+        self.tree = tree
+        self.matches = {field: [None] * len(FIELD_SPECS[field]) for field in fields if field in FIELD_SPECS}
+        self.has_h1 = False
+
+    def first_match(self, field):
+        """Value of the highest priority rule that matched"""
+        return next((value for value in self.matches[field] if value), None)
+
+    def embedded_data(self):
+        """JSON-LD / __NEXT_DATA__ fallback, only looked up when a field is missing"""
+        next_data = _NEXT_DATA_SCRIPT(self.tree)
+        return extract_embedded_data(_JSON_LD_SCRIPTS(self.tree), next_data[0] if next_data else None)
+
+
+def extract_fields(tree, fields):
+    """Run the field specs for the requested fields over the tree in a single traversal.
+
+    The walk stops as soon as every field has its highest priority match.
+    """
+    scan = PageScan(tree, fields)
+    matches = scan.matches
+    pending = [
+        (field, position, rule)
+        for field in matches
+        for position, rule in enumerate(FIELD_SPECS[field])
+    ]
+    need_h1 = 'name' in matches
+
+    for elem in tree.iter():
+        tag = elem.tag
+        if not isinstance(tag, str):
+            # Comments and processing instructions
+            continue
+        if tag == 'h1':
+            scan.has_h1 = True
+        if not pending:
+            if need_h1 and not scan.has_h1:
+                continue
+            break
+
+        attrib = elem.attrib
+        resolved = False
+        for field, position, rule in pending:
+            if rule.tag is not None and rule.tag != tag:
+                continue
+            if rule.attr is not None:
+                attr_value = attrib.get(rule.attr)
+                if attr_value is None or (rule.pattern is not None and rule.pattern.search(attr_value) is None):
+                    continue
+            value = rule.value(elem)
+            if value:
+                matches[field][position] = value
+                resolved = True
+        if resolved:
+            pending = [
+                (field, position, rule) for field, position, rule in pending
+                if matches[field][position] is None
+                # A higher priority rule already matched, lower ones are irrelevant
+                and all(value is None for value in matches[field][:position])
+            ]
+
+    return scan
+
+
+def parse_clinic_page(html, url, fields, slug_fallback=True):
+    """Extract the requested fields from clinic page HTML.
+
+    Missing fields are set to 'N/A'. When slug_fallback is False a generic
+    HotDoc title is reported as missing instead of being replaced by a name
+    derived from the URL, so callers can tell the page was not rendered.
+    """
+    scan = extract_fields(parse_tree(html), fields)
+    embedded = None
+
+    def embedded_value(field):
+        nonlocal embedded
+        if embedded is None:
+            embedded = scan.embedded_data()
+        return embedded.get(field)
+
+    data = {'url': url}
+
+    if 'name' in fields:
+        name = scan.first_match('name')
+        # If it's the generic HotDoc title, try other methods
+        if name and ('Find a Doctor' in name or 'HotDoc' in name):
+            name = None
+        if not name:
+            name = embedded_value('name')
+        if not name and slug_fallback and scan.has_h1:
+            # Try getting from URL slug as fallback
+            name = name_from_url(url)
+        data['name'] = name or 'N/A'
+
+    for field in ('address', 'phone', 'website'):
+        if field in fields:
+            data[field] = scan.first_match(field) or embedded_value(field) or 'N/A'
+
+    return data
+
+
+def has_contact_details(html):
+    """Check if the server-rendered HTML includes the contact details block"""
+    return 'ClinicContactDetails' in html
+
+
+def missing_fields(data, fields):
+    """Return the requested fields that came back empty"""
+    return [field for field in fields if data.get(field, 'N/A') == 'N/A']
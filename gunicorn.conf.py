@@ -0,0 +1,17 @@
+"""Gunicorn settings, read automatically from the working directory: `gunicorn app:app`.
+
+The job scheduler, event hubs and browsers live in the app process, so it
+runs as a single worker. The gthread worker gives every connection its own
+thread: open SSE streams wait on their event hub without holding up API
+requests, and the scrapes keep running in the scheduler's threads.
+"""
+import os
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5005)}"
+workers = 1
+worker_class = 'gthread'
+# Keep this above SSE_MAX_CLIENTS (200) so streams can never take every thread
+threads = int(os.environ.get('GUNICORN_THREADS', 256))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+keepalive = 5
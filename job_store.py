@@ -0,0 +1,530 @@
+"""Persistent store for scrape jobs, their records and finished URLs"""
+import base64
+import json
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    workers INTEGER NOT NULL DEFAULT 1,
+    parent_id TEXT
+);
+CREATE TABLE IF NOT EXISTS records (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    data TEXT NOT NULL,
+    name TEXT COLLATE NOCASE,
+    state TEXT,
+    postcode TEXT,
+    has_website INTEGER,
+    PRIMARY KEY (job_id, url)
+);
+CREATE TABLE IF NOT EXISTS dead_letters (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    lastmod TEXT,
+    kind TEXT NOT NULL,
+    error TEXT,
+    attempts INTEGER NOT NULL,
+    failed_at REAL NOT NULL,
+    PRIMARY KEY (job_id, url)
+);
+CREATE TABLE IF NOT EXISTS entities (
+    url TEXT PRIMARY KEY,
+    entity_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    resolved_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    lastmod TEXT,
+    content_hash TEXT,
+    data TEXT NOT NULL,
+    seen_at REAL NOT NULL
+);
+'''
+
+# Columns added after the first release, for databases created before them
+MIGRATIONS = (
+    ('jobs', 'priority', 'INTEGER NOT NULL DEFAULT 0'),
+    ('jobs', 'workers', 'INTEGER NOT NULL DEFAULT 1'),
+    ('jobs', 'parent_id', 'TEXT'),
+    ('records', 'name', 'TEXT COLLATE NOCASE'),
+    ('records', 'state', 'TEXT'),
+    ('records', 'postcode', 'TEXT'),
+    ('records', 'has_website', 'INTEGER'),
+)
+
+INDEXES = '''
+CREATE INDEX IF NOT EXISTS records_job_idx ON records (job_id, idx);
+CREATE INDEX IF NOT EXISTS records_name_idx ON records (job_id, name, idx);
+CREATE INDEX IF NOT EXISTS records_location_idx ON records (job_id, state, postcode, idx);
+CREATE INDEX IF NOT EXISTS records_website_idx ON records (job_id, has_website, idx);
+CREATE INDEX IF NOT EXISTS entities_entity_idx ON entities (entity_id);
+CREATE INDEX IF NOT EXISTS jobs_queue_idx ON jobs (status, priority, created_at);
+CREATE INDEX IF NOT EXISTS jobs_parent_idx ON jobs (parent_id);
+'''
+
+JOB_COLUMNS = 'id, params, status, created_at, updated_at, priority, workers, parent_id'
+
+# Every job whose records make up a job's results: the job itself and its shards
+JOB_FAMILY = '(SELECT id FROM jobs WHERE id = ? OR parent_id = ?)'
+
+# Jobs whose records count as done for a job: its family plus its parent, which
+# holds the merged records of shards that finished in an earlier run
+JOB_LINEAGE = '(SELECT id FROM jobs WHERE id = ? OR parent_id = ? OR id = (SELECT parent_id FROM jobs WHERE id = ?))'
+
+# Orders query_records can sort by; idx (sitemap order) breaks ties so pages are stable.
+# URLs without a location have no state/postcode: they sort as '' so cursors can step past them
+SORT_COLUMNS = {'index': 'idx', 'name': 'name', 'state': "COALESCE(state, '')",
+                'postcode': "COALESCE(postcode, '')"}
+
+# Jobs in these states can be picked up again by a restarted scrape
+RESUMABLE_STATUSES = ('running', 'stopped', 'failed')
+
+# Jobs in these states are queued or in progress; 'sharded' is a parent waiting for its shards,
+# 'enumerating' and 'distributed' are jobs scraped by cluster workers, 'reextracting' one
+# built from the page archive
+ACTIVE_STATUSES = ('pending', 'running', 'sharded', 'enumerating', 'distributed', 'reextracting')
+
+
+class SQLiteStore:
+    """Base for stores kept in one SQLite file, opened per operation"""
+
+    def __init__(self, path='data/jobs.db'):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.connect() as conn:
+            conn.executescript(SCHEMA)
+            added = set()
+            for table, column, declaration in MIGRATIONS:
+                columns = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+                if column not in columns:
+                    conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {declaration}')
+                    added.add(table)
+            if 'records' in added:
+                backfill_record_columns(conn)
+            conn.executescript(INDEXES)
+
+    @contextmanager
+    def connect(self):
+        """Open a short-lived connection, committing on success"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def record_columns(url, data):
+    """Indexed columns of a record: (name, state, postcode, has_website)"""
+    # The extractor (and lxml) is only loaded once records are written
+    from extractor import has_website, location_from_url
+
+    state, postcode = location_from_url(url)
+    return data.get('name') or '', state, postcode, int(has_website(data))
+
+
+def backfill_record_columns(conn):
+    """Fill the indexed columns of records stored before they existed"""
+    rows = conn.execute('SELECT rowid, url, data FROM records').fetchall()
+    conn.executemany(
+        'UPDATE records SET name = ?, state = ?, postcode = ?, has_website = ? WHERE rowid = ?',
+        ((*record_columns(url, json.loads(data)), rowid) for rowid, url, data in rows)
+    )
+
+
+def record_filters(job_id, state=None, postcode=None, has_website=None, name=None):
+    """SQL condition and args selecting a job's records that match the filters"""
+    where = [f'job_id IN {JOB_FAMILY}']
+    args = [job_id, job_id]
+    if state:
+        where.append('state = ?')
+        args.append(state.upper())
+    if postcode:
+        where.append('postcode = ?')
+        args.append(str(postcode))
+    if has_website is not None:
+        where.append('has_website = ?')
+        args.append(int(bool(has_website)))
+    if name:
+        where.append('name LIKE ?')
+        args.append(f'%{name}%')
+    return ' AND '.join(where), args
+
+
+def encode_cursor(value, idx):
+    """Opaque pagination cursor pointing after a record"""
+    return base64.urlsafe_b64encode(json.dumps([value, idx]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """(value, idx) of a cursor; ValueError if it is malformed"""
+    try:
+        value, idx = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return value, int(idx)
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError('Invalid cursor')
+
+
+def _job_from_row(row):
+    return {
+        'id': row[0],
+        'params': json.loads(row[1]),
+        'status': row[2],
+        'created_at': row[3],
+        'updated_at': row[4],
+        'priority': row[5],
+        'workers': row[6],
+        'parent_id': row[7]
+    }
+
+
+class JobStore(SQLiteStore):
+    """Appends each scraped record to SQLite as soon as it is produced.
+
+    A record's URL doubles as the checkpoint: a restarted job skips every
+    URL that already has a record. Records are read back in sitemap order
+    with iter_records, so exports never need the whole run in memory.
+
+    The jobs table is also the persistent queue: pending jobs are handed
+    out by priority, then age. A large job is split into shard jobs that
+    point at it through parent_id; the parent's records are the union of
+    its own and its shards' records until merge_shards moves them over.
+    """
+
+    def create_job(self, params, job_id=None, priority=0, workers=1, parent_id=None, status='pending'):
+        """Register a new job and return its id"""
+        job_id = job_id or uuid.uuid4().hex[:12]
+        now = time.time()
+        with self.connect() as conn:
+            conn.execute(
+                'INSERT INTO jobs (id, params, status, created_at, updated_at, priority, workers, parent_id) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (job_id, json.dumps(params, sort_keys=True), status, now, now, priority, workers, parent_id)
+            )
+        return job_id
+
+    def get_job(self, job_id):
+        """Return a job as a dict, or None"""
+        with self.connect() as conn:
+            row = conn.execute(
+                f'SELECT {JOB_COLUMNS} FROM jobs WHERE id = ?', (job_id,)
+            ).fetchone()
+        return _job_from_row(row) if row else None
+
+    def list_jobs(self, limit=50):
+        """Most recent top-level jobs first"""
+        with self.connect() as conn:
+            rows = conn.execute(
+                f'SELECT {JOB_COLUMNS} FROM jobs WHERE parent_id IS NULL ORDER BY created_at DESC LIMIT ?',
+                (limit,)
+            ).fetchall()
+        return [_job_from_row(row) for row in rows]
+
+    def get_shards(self, job_id):
+        """Shard jobs of a parent job, in range order"""
+        with self.connect() as conn:
+            rows = conn.execute(
+                f'SELECT {JOB_COLUMNS} FROM jobs WHERE parent_id = ?', (job_id,)
+            ).fetchall()
+        return sorted((_job_from_row(row) for row in rows), key=lambda job: job['params']['start'])
+
+    def find_resumable(self, params, statuses=RESUMABLE_STATUSES):
+        """Return the id of the latest top-level job with identical params in one of statuses"""
+        with self.connect() as conn:
+            row = conn.execute(
+                'SELECT id FROM jobs WHERE params = ? AND parent_id IS NULL AND status IN (%s) '
+                'ORDER BY created_at DESC LIMIT 1' % ','.join('?' * len(statuses)),
+                (json.dumps(params, sort_keys=True), *statuses)
+            ).fetchone()
+        return row[0] if row else None
+
+    def next_pending(self, limit=1):
+        """Queued jobs to run next: highest priority first, then oldest"""
+        with self.connect() as conn:
+            rows = conn.execute(
+                f'SELECT {JOB_COLUMNS} FROM jobs WHERE status = ? '
+                'ORDER BY priority DESC, created_at LIMIT ?',
+                ('pending', limit)
+            ).fetchall()
+        return [_job_from_row(row) for row in rows]
+
+    def requeue_interrupted(self):
+        """Put jobs that were running when the process died back in the queue"""
+        with self.connect() as conn:
+            return conn.execute(
+                'UPDATE jobs SET status = ?, updated_at = ? WHERE status = ?',
+                ('pending', time.time(), 'running')
+            ).rowcount
+
+    def merge_shards(self, job_id):
+        """Move every shard record into the parent job, keeping sitemap order"""
+        with self.connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO records (job_id, idx, url, data, name, state, postcode, has_website) '
+                'SELECT ?, idx, url, data, name, state, postcode, has_website FROM records '
+                'WHERE job_id IN (SELECT id FROM jobs WHERE parent_id = ?)',
+                (job_id, job_id)
+            )
+            conn.execute(
+                'DELETE FROM records WHERE job_id IN (SELECT id FROM jobs WHERE parent_id = ?)',
+                (job_id,)
+            )
+
+    def set_status(self, job_id, status):
+        with self.connect() as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?',
+                (status, time.time(), job_id)
+            )
+
+    def add_record(self, job_id, index, url, data):
+        """Persist one extracted record; this also marks its URL as done"""
+        with self.connect() as conn:
+            # A page that failed in an earlier run is no longer dead
+            conn.execute(
+                f'DELETE FROM dead_letters WHERE url = ? AND job_id IN {JOB_LINEAGE}',
+                (url, job_id, job_id, job_id)
+            )
+            conn.execute(
+                'INSERT OR REPLACE INTO records (job_id, idx, url, data, name, state, postcode, has_website) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (job_id, index, url, json.dumps(data), *record_columns(url, data))
+            )
+
+    def add_records(self, job_id, records):
+        """Persist a batch of (index, url, data) records in one transaction"""
+        with self.connect() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO records (job_id, idx, url, data, name, state, postcode, has_website) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                ((job_id, index, url, json.dumps(data), *record_columns(url, data))
+                 for index, url, data in records)
+            )
+
+    def add_dead_letter(self, job_id, index, url, lastmod, failure, attempts):
+        """Persist a page that still failed after its retries"""
+        with self.connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO dead_letters (job_id, idx, url, lastmod, kind, error, attempts, failed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (job_id, index, url, lastmod, failure.kind, failure.message, attempts, time.time())
+            )
+
+    def get_dead_letters(self, job_id):
+        """Pages of a job and its shards that failed for good, in sitemap order"""
+        with self.connect() as conn:
+            rows = conn.execute(
+                'SELECT job_id, idx, url, lastmod, kind, error, attempts, failed_at FROM dead_letters '
+                f'WHERE job_id IN {JOB_FAMILY} ORDER BY idx',
+                (job_id, job_id)
+            ).fetchall()
+        return [
+            {'job_id': row[0], 'index': row[1], 'url': row[2], 'lastmod': row[3], 'kind': row[4],
+             'error': row[5], 'attempts': row[6], 'failed_at': row[7]}
+            for row in rows
+        ]
+
+    def done_urls(self, job_id):
+        """Set of URLs that already have a record"""
+        with self.connect() as conn:
+            return {row[0] for row in conn.execute(
+                f'SELECT url FROM records WHERE job_id IN {JOB_LINEAGE}', (job_id, job_id, job_id)
+            )}
+
+    def count(self, job_id):
+        with self.connect() as conn:
+            return conn.execute(
+                f'SELECT COUNT(*) FROM records WHERE job_id IN {JOB_FAMILY}', (job_id, job_id)
+            ).fetchone()[0]
+
+    def get_records(self, job_id, offset=0, limit=None):
+        """Return a page of records in sitemap order"""
+        with self.connect() as conn:
+            rows = conn.execute(
+                f'SELECT data FROM records WHERE job_id IN {JOB_FAMILY} ORDER BY idx LIMIT ? OFFSET ?',
+                (job_id, job_id, -1 if limit is None else limit, offset)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def query_records(self, job_id, state=None, postcode=None, has_website=None, name=None,
+                      sort='index', descending=False, offset=0, limit=100, cursor=None):
+        """Return (records, total, next_cursor) for one filtered, sorted page.
+
+        total counts every matching record. A cursor (the next_cursor of the
+        previous page) starts the page right after that record instead of
+        at offset, so deep pages cost the same as the first one.
+        """
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f'Unknown sort: {sort}')
+        filters, args = record_filters(job_id, state, postcode, has_website, name)
+
+        column = SORT_COLUMNS[sort]
+        order, after = ('DESC', '<') if descending else ('ASC', '>')
+        page_filters, page_args = filters, list(args)
+        if cursor:
+            value, idx = decode_cursor(cursor)
+            if column == 'idx':
+                page_filters += f' AND idx {after} ?'
+                page_args.append(idx)
+            else:
+                if value is None:
+                    value = ''
+                page_filters += f' AND ({column} {after} ? OR ({column} = ? AND idx {after} ?))'
+                page_args.extend((value, value, idx))
+            offset = 0
+
+        with self.connect() as conn:
+            total = conn.execute(f'SELECT COUNT(*) FROM records WHERE {filters}', args).fetchone()[0]
+            rows = conn.execute(
+                f'SELECT {column}, idx, data FROM records WHERE {page_filters} '
+                f'ORDER BY {column} {order}, idx {order} LIMIT ? OFFSET ?',
+                (*page_args, limit, offset)
+            ).fetchall()
+        next_cursor = encode_cursor(rows[-1][0], rows[-1][1]) if len(rows) == limit else None
+        return [json.loads(row[2]) for row in rows], total, next_cursor
+
+    def records_version(self, job_id):
+        """Token that changes whenever a job's records change, for ETags"""
+        with self.connect() as conn:
+            count, last_rowid = conn.execute(
+                f'SELECT COUNT(*), MAX(rowid) FROM records WHERE job_id IN {JOB_FAMILY}', (job_id, job_id)
+            ).fetchone()
+        return f'{count}-{last_rowid or 0}'
+
+    def iter_records(self, job_id, batch_size=500, **filters):
+        """Yield every record of a job in sitemap order, batch by batch.
+
+        filters are the state, postcode, has_website and name filters of
+        query_records.
+        """
+        where, args = record_filters(job_id, **filters)
+        last_idx = -1
+        while True:
+            with self.connect() as conn:
+                rows = conn.execute(
+                    f'SELECT idx, data FROM records WHERE {where} AND idx > ? ORDER BY idx LIMIT ?',
+                    (*args, last_idx, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for idx, data in rows:
+                yield json.loads(data)
+            last_idx = rows[-1][0]
+
+
+class StoredResults:
+    """List-like view over a job's records that reads from the store on demand"""
+
+    def __init__(self, store, job_id):
+        self.store = store
+        self.job_id = job_id
+
+    def __len__(self):
+        return self.store.count(self.job_id)
+
+    def __iter__(self):
+        return self.store.iter_records(self.job_id)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __getitem__(self, key):
+        if isinstance(key, slice) and key.step in (None, 1):
+            start = key.start or 0
+            if start < 0 or (key.stop is not None and key.stop < 0):
+                return list(self)[key]
+            limit = None if key.stop is None else max(0, key.stop - start)
+            return self.store.get_records(self.job_id, start, limit)
+        if isinstance(key, int) and key >= 0:
+            records = self.store.get_records(self.job_id, key, 1)
+            if not records:
+                raise IndexError('record index out of range')
+            return records[0]
+        return list(self)[key]
+
+
+class PageSnapshots(SQLiteStore):
+    """Last known sitemap lastmod, content hash and record of every clinic page.
+
+    Delta scrapes compare against these snapshots to skip unchanged pages
+    and to report new, changed and removed clinics.
+    """
+
+    def get(self, url):
+        """Return (lastmod, content_hash, data) for a URL, or None"""
+        with self.connect() as conn:
+            row = conn.execute(
+                'SELECT lastmod, content_hash, data FROM pages WHERE url = ?', (url,)
+            ).fetchone()
+        if not row:
+            return None
+        return row[0], row[1], json.loads(row[2])
+
+    def save(self, url, lastmod, content_hash, data):
+        with self.connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO pages (url, lastmod, content_hash, data, seen_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (url, lastmod, content_hash, json.dumps(data), time.time())
+            )
+
+    def touch(self, url, lastmod):
+        """Record that a page was seen unchanged"""
+        with self.connect() as conn:
+            conn.execute(
+                'UPDATE pages SET lastmod = ?, seen_at = ? WHERE url = ?',
+                (lastmod, time.time(), url)
+            )
+
+    def pop_removed(self, current_urls):
+        """Delete and return (url, data) of snapshots whose URL left the sitemap"""
+        current_urls = set(current_urls)
+        removed = []
+        with self.connect() as conn:
+            for url, data in conn.execute('SELECT url, data FROM pages'):
+                if url not in current_urls:
+                    removed.append((url, json.loads(data)))
+            conn.executemany('DELETE FROM pages WHERE url = ?', ((url,) for url, _ in removed))
+        return removed
+
+
+class EntityStore(SQLiteStore):
+    """Which clinic entity every resolved URL belongs to, with the record it had.
+
+    Loaded by dedupe.ClinicResolver on start, so duplicates found in one
+    run are recognised in the next without fetching them again.
+    """
+
+    def load(self):
+        """(url, entity_id, data) of every resolved URL, oldest first"""
+        with self.connect() as conn:
+            rows = conn.execute('SELECT url, entity_id, data FROM entities ORDER BY resolved_at').fetchall()
+        return [(url, entity_id, json.loads(data)) for url, entity_id, data in rows]
+
+    def save(self, url, entity_id, data):
+        with self.connect() as conn:
+            conn.execute(
+                'INSERT INTO entities (url, entity_id, data, resolved_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (url) DO UPDATE SET data = excluded.data',
+                (url, entity_id, json.dumps(data), time.time())
+            )
@@ -0,0 +1,151 @@
+"""Lease-based URL queue shared by distributed scrape workers"""
+import time
+import uuid
+
+from job_store import SQLiteStore
+
+
+QUEUE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS queue_items (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    lastmod TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    lease_id TEXT,
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (job_id, url)
+);
+CREATE INDEX IF NOT EXISTS queue_items_status_idx ON queue_items (status, job_id, idx);
+CREATE INDEX IF NOT EXISTS queue_items_lease_idx ON queue_items (lease_id);
+'''
+
+
+class LeaseQueue(SQLiteStore):
+    """Clinic URLs waiting to be scraped, handed out to workers in leased batches.
+
+    A lease expires after lease_seconds unless it is extended; its URLs then
+    go back to the queue for another worker. A URL is given up as failed
+    after max_attempts leases. Each URL is queued once per job, so a batch
+    scraped twice after an expired lease still yields one record per URL.
+    """
+
+    def __init__(self, path='data/jobs.db', lease_seconds=300, max_attempts=3):
+        super().__init__(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        with self.connect() as conn:
+            conn.executescript(QUEUE_SCHEMA)
+
+    def enqueue(self, job_id, entries):
+        """Queue (index, url, lastmod) entries for a job; returns how many were new"""
+        with self.connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                'INSERT OR IGNORE INTO queue_items (job_id, idx, url, lastmod) VALUES (?, ?, ?, ?)',
+                ((job_id, index, url, lastmod) for index, url, lastmod in entries)
+            )
+            return conn.total_changes - before
+
+    def _expire_leases(self, conn, now):
+        """Put URLs of expired leases back in the queue, or fail them after max_attempts.
+
+        They keep their lease_id until they are leased again, so a late
+        report of the expired lease can still finish them.
+        """
+        conn.execute(
+            'UPDATE queue_items SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, '
+            'worker = NULL, lease_expires = NULL '
+            'WHERE status = ? AND lease_expires < ?',
+            (self.max_attempts, 'failed', 'pending', 'leased', now)
+        )
+
+    def lease(self, worker, batch_size=10):
+        """Lease up to batch_size pending URLs of the highest priority job.
+
+        Only jobs in the 'distributed' state are leased from. Returns
+        {'lease_id', 'job_id', 'expires', 'items'} or None when nothing is
+        pending. Items are dicts with index, url and lastmod.
+        """
+        now = time.time()
+        with self.connect() as conn:
+            # Take the write lock up front so two workers never lease the same rows
+            conn.execute('BEGIN IMMEDIATE')
+            self._expire_leases(conn, now)
+            row = conn.execute(
+                'SELECT q.job_id FROM queue_items q JOIN jobs j ON j.id = q.job_id '
+                'WHERE q.status = ? AND j.status = ? ORDER BY j.priority DESC, j.created_at LIMIT 1',
+                ('pending', 'distributed')
+            ).fetchone()
+            if not row:
+                return None
+            job_id = row[0]
+            rows = conn.execute(
+                'SELECT idx, url, lastmod FROM queue_items WHERE job_id = ? AND status = ? '
+                'ORDER BY idx LIMIT ?',
+                (job_id, 'pending', batch_size)
+            ).fetchall()
+            lease_id = uuid.uuid4().hex
+            expires = now + self.lease_seconds
+            conn.executemany(
+                'UPDATE queue_items SET status = ?, lease_id = ?, worker = ?, lease_expires = ?, '
+                'attempts = attempts + 1 WHERE job_id = ? AND url = ?',
+                (('leased', lease_id, worker, expires, job_id, url) for _, url, _ in rows)
+            )
+        return {
+            'lease_id': lease_id,
+            'job_id': job_id,
+            'expires': expires,
+            'items': [{'index': idx, 'url': url, 'lastmod': lastmod} for idx, url, lastmod in rows]
+        }
+
+    def extend(self, lease_id):
+        """Renew a lease; False if it already expired and was handed to someone else"""
+        with self.connect() as conn:
+            return conn.execute(
+                'UPDATE queue_items SET lease_expires = ? WHERE lease_id = ? AND status = ?',
+                (time.time() + self.lease_seconds, lease_id, 'leased')
+            ).rowcount > 0
+
+    def finish(self, job_id, lease_id, done_urls, failed_urls):
+        """Mark scraped URLs done and return those that were not done already.
+
+        Only URLs of this lease are finished: held by it, or back in the
+        queue after it expired but not leased again. Failed URLs still held
+        by the lease are retried until max_attempts. A late report for URLs
+        another worker already finished or re-leased changes nothing.
+        """
+        newly_done = []
+        with self.connect() as conn:
+            for url in done_urls:
+                if conn.execute(
+                    'UPDATE queue_items SET status = ?, lease_id = NULL, lease_expires = NULL '
+                    'WHERE job_id = ? AND url = ? AND lease_id = ? AND status != ?',
+                    ('done', job_id, url, lease_id, 'done')
+                ).rowcount:
+                    newly_done.append(url)
+            conn.executemany(
+                'UPDATE queue_items SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, '
+                'lease_id = NULL, worker = NULL, lease_expires = NULL '
+                'WHERE job_id = ? AND url = ? AND lease_id = ? AND status = ?',
+                ((self.max_attempts, 'failed', 'pending', job_id, url, lease_id, 'leased') for url in failed_urls)
+            )
+        return newly_done
+
+    def drop(self, job_id):
+        """Remove a job's pending and leased URLs, e.g. when it is cancelled; returns how many"""
+        with self.connect() as conn:
+            return conn.execute(
+                'DELETE FROM queue_items WHERE job_id = ? AND status IN (?, ?)', (job_id, 'pending', 'leased')
+            ).rowcount
+
+    def counts(self, job_id):
+        """Number of a job's URLs per status, with expired leases counted as pending"""
+        with self.connect() as conn:
+            self._expire_leases(conn, time.time())
+            counts = dict(conn.execute(
+                'SELECT status, COUNT(*) FROM queue_items WHERE job_id = ? GROUP BY status', (job_id,)
+            ).fetchall())
+        return {status: counts.get(status, 0) for status in ('pending', 'leased', 'done', 'failed')}
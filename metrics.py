@@ -0,0 +1,175 @@
+"""Prometheus metrics for the scrape hot path and a live throughput meter"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+
+# Page loads take seconds, parsing takes milliseconds
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Stages of one page: rate_limit, fetch (whole backend fetch), driver_get and wait
+# (the Selenium parts of fetch) and parse, plus driver_start for browser cold starts
+STAGES = ('rate_limit', 'fetch', 'driver_get', 'wait', 'parse', 'driver_start')
+
+# Final outcome of fetch_and_extract for one URL
+OUTCOMES = ('success', 'unchanged', 'timeout', 'failure')
+
+# Stages of the pipelined scrape: fetch threads, parse processes, writer thread
+PIPELINE_STAGES = ('fetch', 'parse', 'write')
+
+
+class _NoopMetric:
+    """Stands in for every metric when prometheus_client is not installed"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def remove(self, *labelvalues):
+        pass
+
+
+if PROMETHEUS_AVAILABLE:
+    STAGE_SECONDS = Histogram(
+        'hotdoc_scraper_stage_seconds',
+        'Time spent in each stage of scraping a clinic page',
+        ['stage', 'backend'],
+        buckets=STAGE_BUCKETS
+    )
+    PAGES = Counter(
+        'hotdoc_scraper_pages_total',
+        'Clinic pages processed, by outcome',
+        ['outcome']
+    )
+    RETRIES = Counter(
+        'hotdoc_scraper_retries_total',
+        'Times a page was handed to the next backend or tried again',
+        ['backend']
+    )
+    PAGES_PER_SECOND = Gauge(
+        'hotdoc_scraper_pages_per_second',
+        'Recent scrape throughput of each running job (or shard)',
+        ['job_id']
+    )
+    ETA_SECONDS = Gauge(
+        'hotdoc_scraper_eta_seconds',
+        'Estimated seconds until each running job (or shard) finishes',
+        ['job_id']
+    )
+    PIPELINE_QUEUE_DEPTH = Gauge(
+        'hotdoc_scraper_pipeline_queue_depth',
+        'Pages waiting for or in each pipeline stage',
+        ['stage']
+    )
+    PIPELINE_ITEMS = Counter(
+        'hotdoc_scraper_pipeline_items_total',
+        'Pages that went through each pipeline stage',
+        ['stage']
+    )
+else:
+    STAGE_SECONDS = PAGES = RETRIES = PAGES_PER_SECOND = ETA_SECONDS = _NoopMetric()
+    PIPELINE_QUEUE_DEPTH = PIPELINE_ITEMS = _NoopMetric()
+
+
+def observe_stage(stage, backend, seconds):
+    STAGE_SECONDS.labels(stage=stage, backend=backend or '').observe(seconds)
+
+
+@contextmanager
+def stage_timer(stage, backend=None):
+    """Time the body of a with block as one stage, also when it raises"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, backend, time.perf_counter() - started)
+
+
+def count_page(outcome):
+    PAGES.labels(outcome=outcome).inc()
+
+
+def count_retry(backend):
+    RETRIES.labels(backend=backend).inc()
+
+
+def count_stage_item(stage):
+    PIPELINE_ITEMS.labels(stage=stage).inc()
+
+
+def set_queue_depth(stage, depth):
+    PIPELINE_QUEUE_DEPTH.labels(stage=stage).set(depth)
+
+
+def render_metrics():
+    """Return (body, content_type) for a /metrics response"""
+    if not PROMETHEUS_AVAILABLE:
+        return b'# prometheus_client is not installed\n', 'text/plain; charset=utf-8'
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class ThroughputMeter:
+    """Pages/sec over a sliding window of recent progress updates, and the ETA it implies.
+
+    A window instead of the whole run keeps the rate live: it follows
+    slowdowns as they happen and is not skewed by URLs skipped on resume.
+    The gauges are labelled with the run's job id, so concurrent jobs each
+    report their own rate.
+    """
+
+    def __init__(self, window=30.0):
+        self.window = window
+        self.samples = deque()
+        self.lock = threading.Lock()
+        self.job_id = ''
+
+    def reset(self, job_id=None):
+        """Start measuring a new run of job_id ('' for runs without a job)"""
+        with self.lock:
+            self.samples.clear()
+        self.job_id = job_id or ''
+        PAGES_PER_SECOND.labels(job_id=self.job_id).set(0)
+        ETA_SECONDS.labels(job_id=self.job_id).set(0)
+
+    def close(self):
+        """Drop the finished run's gauges"""
+        for gauge in (PAGES_PER_SECOND, ETA_SECONDS):
+            try:
+                gauge.remove(self.job_id)
+            except KeyError:
+                pass
+
+    def update(self, current, total):
+        """Record progress and return (pages_per_second, eta_seconds), either may be None"""
+        now = time.monotonic()
+        samples = self.samples
+        with self.lock:
+            samples.append((now, current))
+            while len(samples) > 2 and now - samples[0][0] > self.window:
+                samples.popleft()
+            first_time, first_count = samples[0]
+
+        elapsed = now - first_time
+        if elapsed <= 0 or current <= first_count:
+            return None, None
+
+        rate = (current - first_count) / elapsed
+        eta = max(0, total - current) / rate
+        PAGES_PER_SECOND.labels(job_id=self.job_id).set(rate)
+        ETA_SECONDS.labels(job_id=self.job_id).set(eta)
+        return rate, eta
@@ -0,0 +1,260 @@
+"""Append-only archive of raw clinic pages, and offline re-extraction from it.
+
+Every page a scrape accepts is stored as one gzip member appended to a
+segment file (data/archive/pages-00001.gz, ...). Members are independent,
+so a segment is itself a valid gzip file, and a SQLite index maps each
+URL to the segment, offset and size of its latest version. Older
+versions stay in the segments; only the index moves on.
+
+`reextract` runs the extractor over the archived pages on all cores,
+without network or browser, and stores the result as a new job:
+
+    python page_archive.py reextract --fields name,address,phone,website
+    python page_archive.py reextract --processes 8 --output data/exports/reextract.csv
+    python page_archive.py stats
+"""
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+from backends import backend_slug_fallback
+
+
+INDEX_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    segment TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    backend TEXT,
+    fetched_at REAL NOT NULL
+);
+'''
+
+# A new segment is started once the current one reaches this size
+SEGMENT_BYTES = 64 * 1024 * 1024
+
+# Archived pages handed to a re-extraction process at a time
+REEXTRACT_BATCH = 200
+
+
+def read_member(path, start, size):
+    """Decompress one archived page; returns (header, html)"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = gzip.decompress(f.read(size)).decode('utf-8')
+    header, html = data.split('\n', 1)
+    return json.loads(header), html
+
+
+def extract_batch(directory, rows, fields):
+    """Parse a batch of (url, segment, start, size, backend) rows in a worker process"""
+    from extractor import parse_clinic_page
+
+    records = []
+    for url, segment, start, size, backend in rows:
+        try:
+            _, html = read_member(os.path.join(directory, segment), start, size)
+            data = parse_clinic_page(html, url, fields,
+                                     slug_fallback=backend_slug_fallback(backend))
+        except Exception as e:
+            records.append((url, None, str(e)))
+        else:
+            records.append((url, data, None))
+    return records
+
+
+class PageArchive:
+    """Compressed, append-only store of raw page HTML keyed by URL.
+
+    Safe to share between the threads of one process. A page whose content
+    hash equals the archived version is not written again.
+    """
+
+    def __init__(self, directory='data/archive', segment_bytes=SEGMENT_BYTES, level=6):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.level = level
+        self.lock = threading.Lock()
+        self.handle = None
+        self.segment = None
+        os.makedirs(directory, exist_ok=True)
+        self.index_path = os.path.join(directory, 'index.db')
+        with self.connect() as conn:
+            conn.executescript(INDEX_SCHEMA)
+
+    @contextmanager
+    def connect(self):
+        """Open a short-lived connection to the index, committing on success"""
+        conn = sqlite3.connect(self.index_path, timeout=30)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def segments(self):
+        return sorted(name for name in os.listdir(self.directory)
+                      if name.startswith('pages-') and name.endswith('.gz'))
+
+    def open_segment(self):
+        """The segment to append to, starting a new one when the current one is full"""
+        if self.handle and self.handle.tell() < self.segment_bytes:
+            return self.handle
+        if self.handle:
+            self.handle.close()
+            self.handle = None
+        segments = self.segments()
+        if segments and os.path.getsize(os.path.join(self.directory, segments[-1])) < self.segment_bytes:
+            self.segment = segments[-1]
+        else:
+            self.segment = f'pages-{len(segments) + 1:05d}.gz'
+        self.handle = open(os.path.join(self.directory, self.segment), 'ab')
+        return self.handle
+
+    def add(self, url, html, backend=None):
+        """Archive a page's HTML; returns False if that exact page is archived already"""
+        from extractor import content_hash
+
+        page_hash = content_hash(html)
+        header = json.dumps({'url': url, 'backend': backend, 'content_hash': page_hash,
+                             'fetched_at': time.time()})
+        member = gzip.compress(f'{header}\n{html}'.encode('utf-8'), compresslevel=self.level, mtime=0)
+        with self.lock:
+            with self.connect() as conn:
+                row = conn.execute('SELECT content_hash FROM pages WHERE url = ?', (url,)).fetchone()
+                if row and row[0] == page_hash:
+                    return False
+                handle = self.open_segment()
+                start = handle.tell()
+                handle.write(member)
+                handle.flush()
+                conn.execute(
+                    'INSERT OR REPLACE INTO pages (url, segment, start, size, content_hash, backend, fetched_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (url, self.segment, start, len(member), page_hash, backend, time.time())
+                )
+        return True
+
+    def get(self, url):
+        """Latest archived HTML of a URL, or None"""
+        with self.connect() as conn:
+            row = conn.execute('SELECT segment, start, size FROM pages WHERE url = ?', (url,)).fetchone()
+        if not row:
+            return None
+        return read_member(os.path.join(self.directory, row[0]), row[1], row[2])[1]
+
+    def entries(self, limit=None):
+        """(url, segment, start, size, backend) of every archived URL, by URL"""
+        with self.connect() as conn:
+            return conn.execute(
+                'SELECT url, segment, start, size, backend FROM pages ORDER BY url LIMIT ?',
+                (-1 if limit is None else limit,)
+            ).fetchall()
+
+    def stats(self):
+        with self.connect() as conn:
+            pages = conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+        segments = self.segments()
+        size = sum(os.path.getsize(os.path.join(self.directory, name)) for name in segments)
+        return {'pages': pages, 'segments': len(segments), 'bytes': size}
+
+    def close(self):
+        with self.lock:
+            if self.handle:
+                self.handle.close()
+                self.handle = None
+
+    def reextract(self, fields, processes=None, limit=None, batch_size=REEXTRACT_BATCH):
+        """Yield (url, data, error) for every archived page, parsed in parallel processes.
+
+        Results come in URL order; data is None and error set when a page
+        could not be read or parsed.
+        """
+        rows = self.entries(limit)
+        batches = [rows[i:i + batch_size] for i in range(0, len(rows), batch_size)]
+        with ProcessPoolExecutor(processes or os.cpu_count() or 1) as executor:
+            for records in executor.map(extract_batch, [self.directory] * len(batches), batches,
+                                        [fields] * len(batches)):
+                yield from records
+
+
+def reextract_job(archive, job_store, fields, processes=None, limit=None, log=print):
+    """Re-extract the whole archive into a new job of the job store; returns its id"""
+    params = {'source': 'archive', 'fields': sorted(fields), 'start': 1,
+              'end': archive.stats()['pages'] if limit is None else limit}
+    job_id = job_store.create_job(params, status='reextracting')
+    started = time.monotonic()
+    records, failed = [], 0
+    try:
+        for index, (url, data, error) in enumerate(archive.reextract(fields, processes, limit)):
+            if data is None:
+                failed += 1
+                log(f'Could not re-extract {url}: {error}')
+                continue
+            records.append((index, url, data))
+            if len(records) >= 500:
+                job_store.add_records(job_id, records)
+                records = []
+        if records:
+            job_store.add_records(job_id, records)
+    except BaseException:
+        job_store.set_status(job_id, 'failed')
+        raise
+    job_store.set_status(job_id, 'completed')
+    count = job_store.count(job_id)
+    elapsed = time.monotonic() - started
+    log(f'Job {job_id}: re-extracted {count} clinics ({failed} failed) in {elapsed:.1f}s '
+        f'({count / max(elapsed, 1e-6):.0f} pages/sec)')
+    return job_id
+
+
+def main():
+    from exporter import EXPORT_FORMATS, export_chunks
+    from job_store import JobStore
+    from records import csv_fieldnames
+
+    parser = argparse.ArgumentParser(description='Raw page archive and offline re-extraction')
+    parser.add_argument('--archive', default=os.environ.get('PAGE_ARCHIVE_DIR') or 'data/archive')
+    parser.add_argument('--db', default=os.environ.get('JOB_STORE_PATH', 'data/jobs.db'))
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    reextract = commands.add_parser('reextract', help='Run the extractor over every archived page')
+    reextract.add_argument('--fields', default='name,address,phone,website')
+    reextract.add_argument('--processes', type=int, default=None, help='default: one per CPU')
+    reextract.add_argument('--limit', type=int, default=None)
+    reextract.add_argument('--output', help='also write the records to a .csv, .jsonl or .parquet file')
+
+    commands.add_parser('stats', help='Archived pages, segments and size')
+
+    args = parser.parse_args()
+    archive = PageArchive(args.archive)
+
+    if args.command == 'stats':
+        stats = archive.stats()
+        print(f"{stats['pages']} pages in {stats['segments']} segment(s), {stats['bytes'] / 1e6:.1f} MB")
+        return
+
+    fields = args.fields.split(',')
+    job_store = JobStore(args.db)
+    job_id = reextract_job(archive, job_store, fields, args.processes, args.limit)
+    if args.output:
+        fmt = os.path.splitext(args.output)[1].lstrip('.')
+        if fmt not in EXPORT_FORMATS:
+            parser.error(f'Unknown output format: {fmt}')
+        with open(args.output, 'wb') as f:
+            for chunk in export_chunks(job_store.iter_records(job_id), fmt, csv_fieldnames(fields)):
+                f.write(chunk)
+        print(f'Wrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,311 @@
+"""Pipelined scraping: fetch threads, a parse process pool and a writer, joined by bounded queues"""
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from metrics import PIPELINE_STAGES, count_stage_item, set_queue_depth
+
+
+# Seconds between 'pipeline' events with each stage's queue depth and throughput
+STATS_INTERVAL = 2.0
+
+
+def timed_parse(html, url, fields, slug_fallback):
+    """parse_clinic_page in a pool process; returns (data, seconds spent parsing)"""
+    from extractor import parse_clinic_page
+
+    started = time.perf_counter()
+    data = parse_clinic_page(html, url, fields, slug_fallback=slug_fallback)
+    return data, time.perf_counter() - started
+
+
+class ParsePool:
+    """Process pool that parses clinic pages outside the scraping process's GIL.
+
+    Workers are forked on start(), which should run before the process
+    starts any thread, and only ever run the extractor, which they import
+    on their first page. A pool broken by a killed worker is replaced on
+    the next submit.
+    """
+
+    def __init__(self, processes=None):
+        self.processes = processes or max(1, (os.cpu_count() or 2) - 1)
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def start(self):
+        with self.lock:
+            if self.executor is None:
+                # Fork so workers don't re-import the app's entry module and start its threads
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('fork') if 'fork' in methods else None
+                self.executor = ProcessPoolExecutor(self.processes, mp_context=context)
+                # With fork, every worker is created on the first submit
+                self.executor.submit(int).result()
+        return self
+
+    def submit(self, html, url, fields, slug_fallback):
+        """Future of (data, parse_seconds) for one page"""
+        try:
+            return self.start().executor.submit(timed_parse, html, url, fields, slug_fallback)
+        except BrokenProcessPool:
+            self.close()
+            return self.start().executor.submit(timed_parse, html, url, fields, slug_fallback)
+
+    def close(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ScrapePipeline:
+    """Scrapes (index, url, lastmod) items in three stages.
+
+    fetch: `workers` threads, each with its own browser and session, only
+        fetch raw HTML and hand it to the parse stage.
+    parse: pages are parsed in the ParsePool, at most parse_capacity at a
+        time; a fetcher blocks when the pool is full, so a slow parse stage
+        slows fetching down instead of piling up pages in memory.
+    write: one thread (the caller's) checks each parsed page, sends it back
+        to the fetch stage for the next backend when it is not good enough,
+        and otherwise records it, logs it and reports progress.
+
+    Every stage reports its queue depth and throughput in periodic
+    'pipeline' events and as Prometheus metrics.
+    """
+
+    def __init__(self, scraper, parse_pool, fields, workers=1, parse_capacity=None, report_progress=True):
+        self.scraper = scraper
+        self.parse_pool = parse_pool
+        self.fields = fields
+        self.workers = max(1, workers)
+        self.report_progress = report_progress
+        self.fetch_queue = queue.Queue(maxsize=self.workers * 2)
+        # Pages going back for the next backend; bounded by the parse capacity
+        self.fallback_queue = queue.Queue()
+        self.write_queue = queue.Queue()
+        self.slots = threading.Semaphore(parse_capacity or parse_pool.processes * 2)
+        self.lock = threading.Lock()
+        self.feed_done = threading.Event()
+        self.pending = 0
+        self.in_parse = 0
+        self.completed = 0
+        self.counts = dict.fromkeys(PIPELINE_STAGES, 0)
+        self.started = None
+
+    def run(self, items, total, done=frozenset()):
+        scraper = self.scraper
+        self.started = time.monotonic()
+        feeder = threading.Thread(target=self.feed, args=(items, done), daemon=True)
+        fetchers = [
+            threading.Thread(target=self.fetch_loop, args=(scraper.create_worker(),), daemon=True)
+            for _ in range(self.workers)
+        ]
+        feeder.start()
+        for thread in fetchers:
+            thread.start()
+
+        reported = time.monotonic()
+        while True:
+            try:
+                kind, entry, payload = self.write_queue.get(timeout=0.1)
+            except queue.Empty:
+                if self.finished(fetchers):
+                    break
+            else:
+                self.write(kind, entry, payload, total)
+            if time.monotonic() - reported >= STATS_INTERVAL:
+                reported = time.monotonic()
+                self.report_stats()
+
+        for thread in fetchers:
+            thread.join()
+        self.report_stats()
+
+    def finished(self, fetchers):
+        # Checked first: a fetcher puts its last entry before it exits
+        fetching = any(thread.is_alive() for thread in fetchers)
+        with self.lock:
+            if self.in_parse or not self.write_queue.empty():
+                return False
+            if self.feed_done.is_set() and not self.pending:
+                return True
+        return self.scraper.stop_requested and not fetching
+
+    def feed(self, items, done):
+        try:
+            for index, url, lastmod in items:
+                if self.scraper.stop_requested:
+                    break
+                if url in done:
+                    with self.lock:
+                        self.completed += 1
+                    continue
+                with self.lock:
+                    self.pending += 1
+                entry = {'index': index, 'url': url, 'lastmod': lastmod, 'position': 0,
+                         'snapshot': None, 'known_hash': None, 'page_hash': None, 'html': None}
+                while True:
+                    try:
+                        self.fetch_queue.put(entry, timeout=0.1)
+                        break
+                    except queue.Full:
+                        if self.scraper.stop_requested:
+                            return
+        finally:
+            self.feed_done.set()
+
+    def next_entry(self):
+        try:
+            return self.fallback_queue.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self.fetch_queue.get(timeout=0.1)
+        except queue.Empty:
+            return None
+
+    def fetch_loop(self, worker):
+        scraper = self.scraper
+        try:
+            while not scraper.stop_requested:
+                entry = self.next_entry()
+                if entry is None:
+                    with self.lock:
+                        if self.feed_done.is_set() and not self.pending:
+                            break
+                    continue
+                try:
+                    self.fetch(worker, entry)
+                except Exception as e:
+                    self.write_queue.put(('failed', entry, worker.handle_failure(entry['url'], e)))
+        finally:
+            for backend in worker.backends:
+                backend.close()
+            worker.close_driver()
+
+    def fetch(self, worker, entry):
+        """Fetch an entry's page, starting at its backend position, and submit it for parsing"""
+        scraper = self.scraper
+        url = entry['url']
+        if entry['position'] == 0 and entry['page_hash'] is None:
+            snapshot, result = scraper.check_snapshot(url, entry['lastmod'], self.fields)
+            if result:
+                self.write_queue.put(('done', entry, result))
+                return
+            entry['snapshot'] = snapshot
+            entry['known_hash'] = snapshot[1] if scraper.delta and snapshot else None
+
+        backends = worker.backends
+        for position in range(entry['position'], len(backends)):
+            backend = backends[position]
+            try:
+                html = worker.fetch_html(backend, url, self.fields)
+            except Exception as e:
+                if position == len(backends) - 1:
+                    self.write_queue.put(('failed', entry, worker.handle_failure(url, e)))
+                    return
+                worker.fall_back(backend, url, e)
+                continue
+            self.count('fetch')
+
+            if entry['page_hash'] is None:
+                from extractor import content_hash
+                entry['page_hash'] = content_hash(html)
+                if entry['page_hash'] == entry['known_hash']:
+                    worker.count_unchanged(backend)
+                    self.write_queue.put(('unchanged', entry, None))
+                    return
+
+            entry['position'] = position
+            entry['html'] = html
+            # Backpressure: wait until the parse stage has room
+            self.slots.acquire()
+            with self.lock:
+                self.in_parse += 1
+            try:
+                future = self.parse_pool.submit(html, url, self.fields, backend.slug_fallback)
+            except Exception as e:
+                self.write_queue.put(('parsed_error', entry, e))
+                return
+            future.add_done_callback(lambda f, entry=entry: self.write_queue.put(('parsed', entry, f)))
+            return
+
+    def write(self, kind, entry, payload, total):
+        """Finish an entry on the writer thread; parsed pages may go back to the fetch stage"""
+        scraper = self.scraper
+        index, url, lastmod = entry['index'], entry['url'], entry['lastmod']
+
+        if kind in ('parsed', 'parsed_error'):
+            self.slots.release()
+            with self.lock:
+                self.in_parse -= 1
+            self.count('parse')
+            html, entry['html'] = entry['html'], None
+            try:
+                if kind == 'parsed_error':
+                    raise payload
+                data, seconds = payload.result()
+                backend = scraper.backends[entry['position']]
+                scraper.record_parse(backend, seconds)
+                is_last = entry['position'] == len(scraper.backends) - 1
+                if not scraper.accept_parsed(backend, is_last, html, data, self.fields):
+                    entry['position'] += 1
+                    self.fallback_queue.put(entry)
+                    return
+                scraper.archive_page(backend, url, html)
+            except Exception as e:
+                failure = scraper.handle_failure(url, e)
+                result = None, scraper.count_status(scraper.defer_failure(index, url, lastmod, failure))
+            else:
+                result = scraper.finish_url(index, url, lastmod, self.fields, entry['snapshot'], data,
+                                            entry['page_hash'])
+        elif kind == 'unchanged':
+            result = scraper.finish_url(index, url, lastmod, self.fields, entry['snapshot'], None,
+                                        entry['page_hash'])
+        elif kind == 'failed':
+            result = None, scraper.count_status(scraper.defer_failure(index, url, lastmod, payload))
+        else:
+            result = payload
+
+        self.count('write')
+        with self.lock:
+            self.pending -= 1
+            self.completed += 1
+            count = self.completed
+        data, status = result
+        if self.report_progress:
+            scraper.update_progress(count, total, f'Scraped {count}/{total} clinics')
+        scraper.log_result(url, data, status, f' ({index + 1})')
+
+    def count(self, stage):
+        with self.lock:
+            self.counts[stage] += 1
+        count_stage_item(stage)
+
+    def stats(self):
+        """Queue depth, items done and items/sec of every stage"""
+        elapsed = max(1e-6, time.monotonic() - self.started)
+        with self.lock:
+            depths = {
+                'fetch': self.fetch_queue.qsize() + self.fallback_queue.qsize(),
+                'parse': self.in_parse,
+                'write': self.write_queue.qsize()
+            }
+            counts = dict(self.counts)
+        return {
+            stage: {'queued': depths[stage], 'done': counts[stage], 'per_second': round(counts[stage] / elapsed, 2)}
+            for stage in PIPELINE_STAGES
+        }
+
+    def report_stats(self):
+        stats = self.stats()
+        for stage, values in stats.items():
+            set_queue_depth(stage, values['queued'])
+        if self.scraper.progress_callback:
+            self.scraper.progress_callback({'type': 'pipeline', 'stages': stats})
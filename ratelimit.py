@@ -0,0 +1,112 @@
+"""Rate limiting shared by every fetch made against a host"""
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+
+class HostRateLimiter:
+    """Spaces requests to the same host at least min_interval seconds apart.
+
+    One instance is shared by all workers of a scrape, so adding workers
+    never increases the request rate seen by the server.
+    """
+
+    def __init__(self, min_interval=1.0):
+        self.min_interval = min_interval
+        self.lock = threading.Lock()
+        self.next_slot = {}
+
+    def wait(self, url):
+        """Block until the host of url may be requested again"""
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.min_interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def success(self, url):
+        """Feedback hook: the host answered normally (fixed interval ignores it)"""
+
+    def backoff(self, url, retry_after=None):
+        """Feedback hook: the host is throttling or struggling"""
+        if retry_after:
+            self.defer(url, retry_after)
+
+    def defer(self, url, seconds):
+        """Push the host's next slot at least seconds into the future"""
+        host = urlparse(url).netloc
+        with self.lock:
+            self.next_slot[host] = max(self.next_slot.get(host, 0), time.monotonic() + seconds)
+
+
+class AdaptiveRateLimiter(HostRateLimiter):
+    """AIMD rate controller per host, shared by every fetch of a scrape.
+
+    Each healthy response raises the host's request rate by ``increase``
+    requests/sec up to ``max_rate``; a 429, a 5xx or a timeout multiplies it
+    by ``decrease`` down to ``min_rate`` and honours Retry-After. Requests
+    are spaced 1/rate seconds apart exactly like HostRateLimiter.
+    """
+
+    def __init__(self, start_rate=1.0, min_rate=0.2, max_rate=4.0, increase=0.1, decrease=0.5):
+        super().__init__(min_interval=1.0 / start_rate)
+        self.start_rate = start_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.rates = {}
+
+    def wait(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            interval = 1.0 / self.rates.get(host, self.start_rate)
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def rate(self, url):
+        """Current requests/sec allowed for the host of url"""
+        with self.lock:
+            return self.rates.get(urlparse(url).netloc, self.start_rate)
+
+    def success(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            rate = self.rates.get(host, self.start_rate)
+            self.rates[host] = min(self.max_rate, rate + self.increase)
+
+    def backoff(self, url, retry_after=None):
+        host = urlparse(url).netloc
+        with self.lock:
+            rate = self.rates.get(host, self.start_rate)
+            self.rates[host] = max(self.min_rate, rate * self.decrease)
+        super().backoff(url, retry_after)
+
+
+def is_throttled_status(status_code):
+    """429 and 5xx mean the server wants us to slow down"""
+    return status_code == 429 or 500 <= status_code < 600
+
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header (delta-seconds or HTTP-date), or None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
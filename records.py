@@ -0,0 +1,96 @@
+"""Compact in-memory storage for the records of a run without a job store"""
+import sys
+import threading
+from array import array
+
+
+# Placeholder values repeated in most records; stored as one shared object each
+CONSTANTS = {value: value for value in ('N/A', '')}
+
+# Values up to this length are interned, so repeated short strings are kept once
+INTERN_MAX_LENGTH = 16
+
+
+def compact_value(value):
+    """The shared copy of a constant or short string; other values unchanged"""
+    if isinstance(value, str):
+        shared = CONSTANTS.get(value)
+        if shared is not None:
+            return shared
+        if len(value) <= INTERN_MAX_LENGTH:
+            return sys.intern(value)
+    return value
+
+
+def csv_fieldnames(fields):
+    """CSV column order: fields sorted alphabetically with 'url' last"""
+    fieldnames = sorted(field for field in fields if field != 'url')
+    fieldnames.append('url')
+    return fieldnames
+
+
+class RecordTable:
+    """Records with a fixed schema, stored column by column.
+
+    Each record costs one pointer per field plus 8 bytes for its sitemap
+    index, instead of a dict per record; placeholders such as 'N/A' are
+    shared. Records may be appended in any order and are read back in
+    index order, as dicts (iteration, indexing) or as tuples in fieldnames
+    order (rows). Keys outside fieldnames are dropped; missing ones read as
+    None. Like StoredResults, it stands in for a list of records. Appends
+    are thread-safe, so parallel workers can record into one table.
+    """
+
+    def __init__(self, fieldnames):
+        self.fieldnames = list(fieldnames)
+        self.columns = [[] for _ in self.fieldnames]
+        self.indexes = array('q')
+        self.order = None
+        self.in_order = True
+        self.lock = threading.Lock()
+
+    def append(self, index, record):
+        values = [compact_value(record.get(name)) for name in self.fieldnames]
+        # One row is written to the index array and every column under the lock,
+        # otherwise concurrent appends leave the columns out of line
+        with self.lock:
+            if self.indexes and index < self.indexes[-1]:
+                self.in_order = False
+            self.indexes.append(index)
+            for column, value in zip(self.columns, values):
+                column.append(value)
+            self.order = None
+
+    def positions(self):
+        """Storage positions of the records in index order"""
+        if self.in_order:
+            return range(len(self.indexes))
+        if self.order is None:
+            self.order = array('q', sorted(range(len(self.indexes)), key=self.indexes.__getitem__))
+        return self.order
+
+    def row(self, position):
+        return tuple(column[position] for column in self.columns)
+
+    def rows(self):
+        """Records as tuples in fieldnames order, in index order"""
+        if self.in_order:
+            return zip(*self.columns)
+        order = self.positions()
+        return zip(*(map(column.__getitem__, order) for column in self.columns))
+
+    def __len__(self):
+        return len(self.indexes)
+
+    def __bool__(self):
+        return len(self.indexes) > 0
+
+    def __iter__(self):
+        for row in self.rows():
+            yield dict(zip(self.fieldnames, row))
+
+    def __getitem__(self, key):
+        positions = self.positions()
+        if isinstance(key, slice):
+            return [dict(zip(self.fieldnames, self.row(position))) for position in positions[key]]
+        return dict(zip(self.fieldnames, self.row(positions[key])))
@@ -0,0 +1,126 @@
+"""Failure classification, jittered retry backoff and the deferred retry queue"""
+import random
+import threading
+import time
+from collections import namedtuple
+
+from ratelimit import is_throttled_status, parse_retry_after
+
+
+# kind is one of FAILURE_KINDS; status and retry_after are only set for HTTP errors
+Failure = namedtuple('Failure', ['kind', 'message', 'status', 'retry_after'])
+
+FAILURE_KINDS = ('timeout', 'http', 'driver_crash', 'parse_miss', 'error')
+
+# WebDriver error messages that mean the browser or chromedriver is gone
+DRIVER_CRASH_MARKERS = (
+    'chrome not reachable', 'session deleted', 'disconnected', 'tab crashed',
+    'no such window', 'target window already closed', 'invalid session id',
+)
+
+
+class ParseMiss(Exception):
+    """A page loaded but none of the required fields could be extracted"""
+
+
+def classify_failure(error):
+    """Turn the exception a page fetch raised into a Failure"""
+    # Imported here so loading this module does not load selenium and requests
+    import requests
+    from selenium.common.exceptions import (InvalidSessionIdException, NoSuchWindowException,
+                                            TimeoutException, WebDriverException)
+    from urllib3.exceptions import MaxRetryError, ProtocolError
+
+    message = str(error).strip().splitlines()[0] if str(error).strip() else type(error).__name__
+    if isinstance(error, (TimeoutException, requests.Timeout)):
+        return Failure('timeout', message, None, None)
+    if isinstance(error, ParseMiss):
+        return Failure('parse_miss', message, None, None)
+    if isinstance(error, (InvalidSessionIdException, NoSuchWindowException, MaxRetryError,
+                          ProtocolError, ConnectionRefusedError)):
+        return Failure('driver_crash', message, None, None)
+    if isinstance(error, WebDriverException):
+        if any(marker in str(error).lower() for marker in DRIVER_CRASH_MARKERS):
+            return Failure('driver_crash', message, None, None)
+        return Failure('error', message, None, None)
+    response = getattr(error, 'response', None)
+    if response is not None:
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        return Failure('http', message, response.status_code, retry_after)
+    return Failure('error', message, None, None)
+
+
+class RetryPolicy:
+    """Which failures are retried, how often, and after how long.
+
+    A page gets at most max_attempts attempts in total. The delay before
+    retry n is drawn uniformly from 0..base_delay * 2**(n-1), capped at
+    max_delay ("full jitter"), and is never shorter than a Retry-After.
+    HTTP errors other than 408, 429 and 5xx (e.g. a 404) are not retried.
+    """
+
+    def __init__(self, max_attempts=3, base_delay=2.0, max_delay=60.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, failure, attempts):
+        if attempts >= self.max_attempts:
+            return False
+        if failure.kind == 'http':
+            return failure.status == 408 or is_throttled_status(failure.status)
+        return True
+
+    def delay(self, failure, attempts):
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempts - 1)))
+        return max(delay, failure.retry_after or 0)
+
+
+class RetryQueue:
+    """Failed pages waiting to be retried once the main pass is over.
+
+    Thread-safe; a run's workers defer into it and the retry pass takes
+    the whole queue round by round.
+    """
+
+    def __init__(self, policy=None):
+        self.policy = policy or RetryPolicy()
+        self.lock = threading.Lock()
+        self.entries = []
+        self.attempts = {}
+
+    def defer(self, index, url, lastmod, failure):
+        """Queue a failed page for retry; False once the policy gives up on it"""
+        with self.lock:
+            attempts = self.attempts[url] = self.attempts.get(url, 0) + 1
+            if not self.policy.should_retry(failure, attempts):
+                return False
+            not_before = time.monotonic() + self.policy.delay(failure, attempts)
+            self.entries.append((not_before, index, url, lastmod))
+            return True
+
+    def attempts_for(self, url):
+        with self.lock:
+            return self.attempts.get(url, 0)
+
+    def take(self):
+        """Remove and return every queued entry, earliest due first"""
+        with self.lock:
+            entries, self.entries = self.entries, []
+        return sorted(entries)
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+
+def iter_due(entries, should_stop=None, poll=0.5):
+    """Yield (index, url, lastmod) of taken entries as each one becomes due"""
+    for not_before, index, url, lastmod in entries:
+        while time.monotonic() < not_before:
+            if should_stop and should_stop():
+                return
+            time.sleep(max(0, min(poll, not_before - time.monotonic())))
+        if should_stop and should_stop():
+            return
+        yield index, url, lastmod
@@ -0,0 +1,372 @@
+"""Multi-job scheduler on top of the persistent job queue in JobStore"""
+import os
+import threading
+
+from event_hub import EventHub
+from exporter import export_chunks, write_export
+from job_store import ACTIVE_STATUSES, RESUMABLE_STATUSES
+from records import csv_fieldnames
+
+
+# Jobs spanning more clinics than this are split into shards that run in parallel
+DEFAULT_SHARD_SIZE = 500
+
+# Jobs in these states can be queued again by submitting the same parameters
+REQUEUE_STATUSES = RESUMABLE_STATUSES + ('cancelled',)
+
+# Queued or running states of the scheduler's own jobs; cluster jobs ('enumerating',
+# 'distributed') are active too, but belong to the Coordinator and are never resumed here
+SCHEDULED_STATUSES = ('pending', 'running', 'sharded')
+
+
+def shard_ranges(start, end, shard_size):
+    """Split the inclusive range start..end into consecutive shard ranges"""
+    return [(s, min(end, s + shard_size - 1)) for s in range(start, end + 1, shard_size)]
+
+
+def merge_backend_stats(stats_list):
+    """Sum per-backend counters of several scrapers"""
+    totals = {}
+    for stats in stats_list:
+        for name, counters in stats.items():
+            merged = totals.setdefault(name, dict.fromkeys(counters, 0))
+            for key, value in counters.items():
+                merged[key] = merged.get(key, 0) + value
+    return totals
+
+
+class JobScheduler:
+    """Runs queued scrape jobs, up to max_concurrent at a time.
+
+    Every submitted job gets an id, a priority and a range and is persisted
+    in the JobStore, so queued and interrupted jobs survive restarts. Each
+    job has its own progress channel, status, results view and cancel
+    handle. A job spanning more than shard_size clinics is split into shard
+    jobs that run in parallel; when the last one finishes their records are
+    merged into the parent. Delta jobs are never sharded, since removed
+    clinics are detected against the whole sitemap.
+
+    scraper_factory(progress_callback) must return a new ClinicScraper.
+    listener, if given, receives every event of every job.
+    """
+
+    def __init__(self, job_store, scraper_factory, max_concurrent=2, shard_size=DEFAULT_SHARD_SIZE,
+                 export_dir='data/exports', listener=None, poll_interval=2.0):
+        self.job_store = job_store
+        self.scraper_factory = scraper_factory
+        self.max_concurrent = max_concurrent
+        self.shard_size = shard_size
+        self.export_dir = export_dir
+        self.listener = listener
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.running = {}
+        self.channels = {}
+        self.backend_stats = {}
+        self.shard_progress = {}
+        self.thread = None
+
+    def start(self):
+        """Requeue jobs interrupted by a restart and start dispatching"""
+        if self.thread:
+            return
+        self.job_store.requeue_interrupted()
+        self.thread = threading.Thread(target=self.dispatch_loop, daemon=True)
+        self.thread.start()
+
+    def dispatch_loop(self):
+        while True:
+            try:
+                self.dispatch()
+            except Exception as e:
+                print(f'Job scheduler error: {str(e)}')
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
+
+    def dispatch(self):
+        """Start the highest priority pending jobs while slots are free"""
+        with self.lock:
+            free = self.max_concurrent - len(self.running)
+            if free <= 0:
+                return
+            for job in self.job_store.next_pending(free):
+                self.job_store.set_status(job['id'], 'running')
+                runtime = {'scraper': None, 'cancelled': False}
+                self.running[job['id']] = runtime
+                threading.Thread(target=self.run_job, args=(job, runtime), daemon=True).start()
+
+    def submit(self, params, priority=0, workers=1, resume=True):
+        """Queue a job and return (job_id, resumed).
+
+        With resume, a queued, running or interrupted job with the same
+        params is picked up again instead of creating a new one.
+        """
+        if resume:
+            job_id = self.job_store.find_resumable(params, SCHEDULED_STATUSES + REQUEUE_STATUSES)
+            if job_id:
+                self.requeue(job_id)
+                return job_id, True
+
+        start, end = params['start'], params['end']
+        # Delta and dedupe runs compare every page with the rest of the run, so they are never sharded
+        shardable = not params.get('delta') and not params.get('dedupe')
+        if self.shard_size and shardable and end - start + 1 > self.shard_size:
+            job_id = self.job_store.create_job(params, priority=priority, workers=workers, status='sharded')
+            for shard_start, shard_end in shard_ranges(start, end, self.shard_size):
+                self.job_store.create_job(
+                    dict(params, start=shard_start, end=shard_end),
+                    priority=priority, workers=workers, parent_id=job_id
+                )
+        else:
+            job_id = self.job_store.create_job(params, priority=priority, workers=workers)
+        self.channel(job_id)
+        self.wakeup.set()
+        return job_id, False
+
+    def requeue(self, job_id):
+        """Put an unfinished job, or the unfinished shards of a parent, back in the queue"""
+        with self.lock:
+            job = self.job_store.get_job(job_id)
+            shards = self.job_store.get_shards(job_id)
+            if shards:
+                for shard in shards:
+                    if shard['status'] in REQUEUE_STATUSES and shard['id'] not in self.running:
+                        self.job_store.set_status(shard['id'], 'pending')
+                self.job_store.set_status(job_id, 'sharded')
+            elif job['status'] in REQUEUE_STATUSES and job_id not in self.running:
+                self.job_store.set_status(job_id, 'pending')
+        self.channel(job_id)
+        if shards:
+            # Every shard may already be complete
+            self.check_parent(job_id)
+        self.wakeup.set()
+
+    def retry_failed(self, job_id):
+        """Queue a finished job again to rescrape its dead-lettered pages.
+
+        The job (or each shard holding dead letters) runs again; every URL
+        that already has a record is skipped, and records of pages that now
+        succeed join the job's results. Returns how many pages are retried.
+        """
+        job = self.job_store.get_job(job_id)
+        if job['status'] in ACTIVE_STATUSES:
+            raise ValueError('Job is still queued or running')
+        letters = self.job_store.get_dead_letters(job_id)
+        if not letters:
+            return 0
+        with self.lock:
+            for letter_job_id in {letter['job_id'] for letter in letters}:
+                self.job_store.set_status(letter_job_id, 'pending')
+            if any(letter['job_id'] != job_id for letter in letters):
+                self.job_store.set_status(job_id, 'sharded')
+        self.channel(job_id)
+        self.wakeup.set()
+        return len(letters)
+
+    def cancel(self, job_id):
+        """Cancel a job: queued shards are dropped, running ones are asked to stop"""
+        job = self.job_store.get_job(job_id)
+        if not job:
+            return False
+        shards = self.job_store.get_shards(job_id)
+        dequeued = False
+        with self.lock:
+            for target in shards or [job]:
+                runtime = self.running.get(target['id'])
+                if runtime:
+                    runtime['cancelled'] = True
+                    if runtime['scraper']:
+                        runtime['scraper'].stop()
+                elif target['status'] == 'pending':
+                    self.job_store.set_status(target['id'], 'cancelled')
+                    dequeued = True
+        if shards:
+            self.check_parent(job_id)
+        elif dequeued:
+            self.complete(job, 'cancelled')
+        return True
+
+    def channel(self, job_id):
+        """Progress channel of a top-level job"""
+        with self.lock:
+            if job_id not in self.channels:
+                self.channels[job_id] = EventHub()
+            return self.channels[job_id]
+
+    def follow(self, job_id, last_event_id=None):
+        """(channel, read position) to follow a queued or running job, or None once it has finished.
+
+        A finished job publishes nothing more, so no channel is created for
+        it. Its status is set before 'complete' is published, so checking it
+        and taking the position under the lock never misses that event.
+        """
+        with self.lock:
+            if self.job_store.get_job(job_id)['status'] not in ACTIVE_STATUSES:
+                return None
+            if job_id not in self.channels:
+                self.channels[job_id] = EventHub()
+            channel = self.channels[job_id]
+            return channel, channel.cursor(last_event_id)
+
+    def publish(self, job, event):
+        """Tag an event with its top-level job and send it to the channel and listener"""
+        top_id = job['parent_id'] or job['id']
+        event = dict(event, job_id=top_id)
+        if job['parent_id']:
+            event['shard_id'] = job['id']
+            if event.get('type') == 'progress':
+                event = self.parent_progress(job, event)
+        self.channel(top_id).publish(event)
+        if self.listener:
+            self.listener(event)
+
+    def parent_progress(self, shard, event):
+        """Turn a shard's progress event into progress of the whole parent job"""
+        parent_id = shard['parent_id']
+        with self.lock:
+            progress = self.shard_progress.get(parent_id)
+            if progress is None:
+                # Shards finished before a restart count as done
+                progress = self.shard_progress[parent_id] = {
+                    s['id']: (s['params']['end'] - s['params']['start'] + 1, 0)
+                    for s in self.job_store.get_shards(parent_id) if s['status'] == 'completed'
+                }
+            progress[shard['id']] = (event['current'], event.get('pages_per_second') or 0)
+            current = sum(done for done, _ in progress.values())
+            rate = sum(rate for _, rate in progress.values())
+        params = self.job_store.get_job(parent_id)['params']
+        total = params['end'] - params['start'] + 1
+        return dict(
+            event,
+            current=current,
+            total=total,
+            status=f'Scraped {current}/{total} clinics',
+            pages_per_second=round(rate, 2) if rate else None,
+            eta_seconds=round(max(0, total - current) / rate) if rate else None
+        )
+
+    def run_job(self, job, runtime):
+        """Run one leaf job (a whole job or a shard) to completion"""
+        job_id = job['id']
+        params = job['params']
+        scraper = self.scraper_factory(lambda event: self.publish(job, event))
+        with self.lock:
+            runtime['scraper'] = scraper
+            cancelled = runtime['cancelled']
+
+        status = 'cancelled'
+        if not cancelled:
+            try:
+                scraper.scrape(
+                    sitemap_url=params['sitemap_url'],
+                    start_range=params['start'],
+                    end_range=params['end'],
+                    fields=params['fields'],
+                    workers=job['workers'],
+                    job_store=self.job_store,
+                    job_id=job_id,
+                    delta=params.get('delta', False),
+                    dedupe=params.get('dedupe', False)
+                )
+                status = self.job_store.get_job(job_id)['status']
+                if status == 'running':
+                    # scrape() returned before starting, e.g. the sitemap was unreachable
+                    status = 'failed'
+            except Exception as e:
+                self.publish(job, {'type': 'log', 'level': 'error', 'message': f'Fatal error: {str(e)}'})
+                status = 'failed'
+            if runtime['cancelled']:
+                status = 'cancelled'
+
+        self.job_store.set_status(job_id, status)
+        with self.lock:
+            self.backend_stats[job_id] = scraper.get_backend_stats()
+            del self.running[job_id]
+
+        if job['parent_id']:
+            with self.lock:
+                progress = self.shard_progress.setdefault(job['parent_id'], {})
+                if status == 'completed':
+                    progress[job_id] = (params['end'] - params['start'] + 1, 0)
+                else:
+                    progress.pop(job_id, None)
+            self.publish(job, {'type': 'shard_complete', 'status': status})
+            self.check_parent(job['parent_id'])
+        else:
+            self.complete(job, status)
+        self.wakeup.set()
+
+    def check_parent(self, parent_id):
+        """Merge and complete a sharded job once none of its shards is queued or running"""
+        with self.lock:
+            parent = self.job_store.get_job(parent_id)
+            if parent['status'] != 'sharded':
+                return
+            statuses = [shard['status'] for shard in self.job_store.get_shards(parent_id)]
+            if any(status in ACTIVE_STATUSES for status in statuses):
+                return
+            self.job_store.merge_shards(parent_id)
+            for status in ('failed', 'cancelled', 'stopped'):
+                if status in statuses:
+                    break
+            else:
+                status = 'completed'
+            self.job_store.set_status(parent_id, status)
+            self.shard_progress.pop(parent_id, None)
+        self.complete(parent, status)
+
+    def complete(self, job, status):
+        """Export a finished top-level job and announce it on its channel"""
+        job_id = job['id']
+        total = self.job_store.count(job_id)
+        if total:
+            params = job['params']
+            fields = params['fields'] + ['change'] if params.get('delta') else params['fields']
+            try:
+                path = self.export_csv(job_id, fields)
+                self.publish(job, {'type': 'log', 'level': 'success', 'message': f'Data saved to {path}'})
+            except OSError as e:
+                self.publish(job, {'type': 'log', 'level': 'error', 'message': f'Error saving CSV: {str(e)}'})
+        self.publish(job, {'type': 'complete', 'status': status, 'total_results': total})
+        with self.lock:
+            self.channels.pop(job_id, None)
+
+    def export_path(self, job_id):
+        return os.path.join(self.export_dir, f'{job_id}.csv')
+
+    def export_csv(self, job_id, fields):
+        """Stream a job's records from the store into its CSV export; returns the path"""
+        chunks = export_chunks(self.job_store.iter_records(job_id), 'csv', csv_fieldnames(fields))
+        return write_export(chunks, self.export_path(job_id))
+
+    def get_backend_stats(self, job_id):
+        """Backend counters of a job, summed over its shards"""
+        ids = [job_id] + [shard['id'] for shard in self.job_store.get_shards(job_id)]
+        stats = []
+        with self.lock:
+            for jid in ids:
+                runtime = self.running.get(jid)
+                if runtime and runtime['scraper']:
+                    stats.append(runtime['scraper'].get_backend_stats())
+                elif jid in self.backend_stats:
+                    stats.append(self.backend_stats[jid])
+        return merge_backend_stats(stats)
+
+    def status(self, job_id):
+        """Status of a job for the API, or None"""
+        job = self.job_store.get_job(job_id)
+        if not job:
+            return None
+        shards = self.job_store.get_shards(job_id)
+        return dict(
+            job,
+            is_running=job['status'] in ACTIVE_STATUSES,
+            results_count=self.job_store.count(job_id),
+            backend_stats=self.get_backend_stats(job_id),
+            shards=[
+                {'id': shard['id'], 'status': shard['status'],
+                 'start': shard['params']['start'], 'end': shard['params']['end']}
+                for shard in shards
+            ]
+        )
@@ -1,22 +1,40 @@
 import requests
-import gzip
 import time
-from bs4 import BeautifulSoup
-from xml.etree import ElementTree as ET
-from urllib.parse import urlparse
 import csv
-import re
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+import itertools
+import os
 from selenium.common.exceptions import TimeoutException
+import queue
+import threading
+from backends import create_backends, load_backends
+from driver_pool import create_driver
+from ratelimit import AdaptiveRateLimiter, is_throttled_status, parse_retry_after
+from sitemap import iter_sitemap_entries
+from job_store import StoredResults
+from records import RecordTable, csv_fieldnames
+from dedupe import ClinicResolver, fill_missing
+from extractor import content_hash, parse_clinic_page, missing_fields
+from pipeline import ScrapePipeline
+from retry import ParseMiss, RetryQueue, classify_failure, iter_due
+from metrics import ThroughputMeter, count_page, count_retry, observe_stage, stage_timer
+
+
+# Fields that must be present before a fast backend's result is accepted
+REQUIRED_FIELDS = ('name', 'address', 'phone')
+
+
+def prewarm(backends=None):
+    """Import what a scrape loads lazily: the fetch backends and the sitemap HTTP client"""
+    import httpx  # noqa: F401
+
+    load_backends(backends)
 
 
 class ClinicScraper:
-    def __init__(self, progress_callback=None):
+    def __init__(self, progress_callback=None, backends=None, required_fields=REQUIRED_FIELDS,
+                 rate_limiter=None, sitemap_concurrency=4, sitemap_cache=None, snapshots=None,
+                 driver_pool=None, retry_policy=None, parse_pool=None, archive=None,
+                 resolver=None):
         self.progress_callback = progress_callback
         self.session = requests.Session()
         self.session.headers.update({
@@ -24,36 +42,80 @@ class ClinicScraper:
         })
         self.stop_requested = False
         self.driver = None
+        # Warm browsers shared across jobs; without a pool each scraper starts its own
+        self.driver_pool = driver_pool
+        self.required_fields = required_fields
+        self.backend_names = backends
+        self.backends = create_backends(self, backends)
+        # Rate limiting - be respectful to the server (shared by all workers);
+        # speeds up while the host is healthy and backs off on 429/5xx/timeouts
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter()
+        self.workers = []
+        self.sitemap_concurrency = sitemap_concurrency
+        self.sitemap_cache = sitemap_cache
+        self.snapshots = snapshots
+        self.delta = False
+        # Failed pages are retried after the main pass; what still fails is dead-lettered
+        self.retry_policy = retry_policy
+        self.retry_queue = RetryQueue(retry_policy)
+        self.dead_letters = []
+        # Sub-sitemaps that failed to load in this run; the URL list is incomplete if any did
+        self.sitemap_errors = 0
+        # With a ParsePool, runs are pipelined: fetch threads, parse processes and a writer
+        self.parse_pool = parse_pool
+        # Accepted pages' raw HTML is kept in a PageArchive for offline re-extraction
+        self.archive = archive
+        # Clinic entities shared across runs; dedupe runs resolve every record against them
+        self.resolver = resolver
+        self.dedupe = None
+        self.entities_seen = {}
+        self.status_counts = {}
+        self.status_lock = threading.Lock()
+        self.throughput = ThroughputMeter()
+        self.backend_stats = {
+            backend.name: {
+                'hits': 0, 'fallbacks': 0, 'errors': 0,
+                'seconds': 0.0, 'fetch_seconds': 0.0, 'parse_seconds': 0.0
+            }
+            for backend in self.backends
+        }
 
     def setup_driver(self):
-        """Initialize Selenium WebDriver"""
+        """Initialize Selenium WebDriver, reusing a warm one from the driver pool if there is one"""
+        if self.driver is not None and self.driver_pool and self.driver_pool.is_worn(self.driver):
+            self.log('Recycling browser')
+            self.driver_pool.retire(self.driver)
+            self.driver = None
+
         if self.driver is None:
             self.log('Setting up headless browser...')
 
             try:
-                from scraper_config import get_chrome_options
-                chrome_options = get_chrome_options()
-            except ImportError:
-                # Fallback to default options if config not available
-                chrome_options = Options()
-                chrome_options.add_argument('--headless=new')
-                chrome_options.add_argument('--no-sandbox')
-                chrome_options.add_argument('--disable-dev-shm-usage')
-                chrome_options.add_argument('--disable-gpu')
-                chrome_options.add_argument('--window-size=1920,1080')
-                chrome_options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
-
-            try:
-                self.driver = webdriver.Chrome(options=chrome_options)
+                self.driver = self.driver_pool.acquire() if self.driver_pool else create_driver()
                 self.log('Browser ready')
             except Exception as e:
                 self.log(f'Error setting up browser: {str(e)}', 'error')
                 raise
 
     def close_driver(self):
-        """Close Selenium WebDriver"""
+        """Close Selenium WebDriver, or hand it back to the driver pool"""
         if self.driver:
-            self.driver.quit()
+            if self.driver_pool:
+                self.driver_pool.release(self.driver)
+            else:
+                self.driver.quit()
+            self.driver = None
+
+    def reset_driver(self):
+        """Throw away a crashed browser so the next page starts a fresh one"""
+        if self.driver is not None:
+            if self.driver_pool:
+                self.driver_pool.discard(self.driver)
+            else:
+                try:
+                    self.driver.quit()
+                except Exception:
+                    pass
             self.driver = None
 
     def log(self, message, level='info'):
@@ -66,77 +128,80 @@ class ClinicScraper:
             })
 
     def update_progress(self, current, total, status=''):
-        """Send progress update via callback"""
+        """Send progress update via callback, with the live pages/sec and ETA"""
+        rate, eta = self.throughput.update(current, total)
         if self.progress_callback:
             self.progress_callback({
                 'type': 'progress',
                 'current': current,
                 'total': total,
-                'status': status
+                'status': status,
+                'pages_per_second': None if rate is None else round(rate, 2),
+                'eta_seconds': None if eta is None else round(eta)
             })
 
     def stop(self):
         """Request scraper to stop"""
         self.stop_requested = True
 
-    def get_sitemap_urls(self, sitemap_url):
-        """Download and parse sitemap to get clinic URLs"""
-        self.log('Downloading sitemap index...')
-
+    def iter_sitemap(self, sitemap_url):
+        """Yield (url, lastmod) in sitemap order while sub-sitemaps are still downloading"""
+        for entry in iter_sitemap_entries(
+            sitemap_url,
+            should_stop=lambda: self.stop_requested,
+            headers=dict(self.session.headers),
+            concurrency=self.sitemap_concurrency,
+            log=self.log,
+            on_error=self.sitemap_failed
+        ):
+            yield entry.loc, entry.lastmod
+
+    def sitemap_failed(self, url, error):
+        self.sitemap_errors += 1
+
+    def iter_sitemap_urls(self, sitemap_url):
+        """Yield clinic URLs in sitemap order while sub-sitemaps are still downloading"""
+        for url, _ in self.iter_sitemap(sitemap_url):
+            yield url
+
+    def refresh_sitemap_cache(self, sitemap_url):
+        """Revalidate the sitemap cache and report hit/miss stats via the callback"""
         try:
-            response = self.session.get(sitemap_url, timeout=30)
-            response.raise_for_status()
-
-            # Decompress gzip content
-            decompressed = gzip.decompress(response.content)
-
-            # Parse XML
-            root = ET.fromstring(decompressed)
-
-            # Extract URLs (handle XML namespace)
-            namespace = {'ns': 'http://www.sitemaps.org/schemas/sitemap/0.9'}
-
-            # Check if this is a sitemap index
-            sub_sitemaps = root.findall('.//ns:sitemap/ns:loc', namespace)
-
-            all_urls = []
+            stats = self.sitemap_cache.refresh(
+                sitemap_url,
+                headers=dict(self.session.headers),
+                log=self.log,
+                should_stop=lambda: self.stop_requested
+            )
+        except Exception as e:
+            # A stale index is better than none when the sitemap is unreachable
+            if not self.sitemap_cache.count(sitemap_url):
+                raise
+            self.log(f'Sitemap revalidation failed, using cached index: {str(e)}', 'warning')
+            stats = {'hits': 0, 'misses': 0, 'errors': 1, 'fresh': False}
+        self.sitemap_errors += stats['errors']
 
-            if sub_sitemaps:
-                # This is a sitemap index - download each sub-sitemap
-                self.log(f'Found sitemap index with {len(sub_sitemaps)} sub-sitemaps')
+        if self.progress_callback:
+            self.progress_callback({'type': 'sitemap_cache', **stats})
+        return stats
 
-                for i, sitemap_elem in enumerate(sub_sitemaps, 1):
-                    if self.stop_requested:
-                        break
+    def get_cached_urls(self, sitemap_url, start=1, end=None):
+        """Return clinic URLs for positions start..end from the on-disk index"""
+        self.refresh_sitemap_cache(sitemap_url)
+        return self.sitemap_cache.get_urls(sitemap_url, start, end)
 
-                    sub_sitemap_url = sitemap_elem.text
-                    self.log(f'Downloading sub-sitemap {i}/{len(sub_sitemaps)}...')
+    def get_cached_entries(self, sitemap_url, start=1, end=None):
+        """Return (url, lastmod) for positions start..end from the on-disk index"""
+        self.refresh_sitemap_cache(sitemap_url)
+        return self.sitemap_cache.get_entries(sitemap_url, start, end)
 
-                    try:
-                        sub_response = self.session.get(sub_sitemap_url, timeout=30)
-                        sub_response.raise_for_status()
-                        sub_decompressed = gzip.decompress(sub_response.content)
-                        sub_root = ET.fromstring(sub_decompressed)
-
-                        # Extract URLs from sub-sitemap
-                        for url_elem in sub_root.findall('.//ns:url/ns:loc', namespace):
-                            url = url_elem.text
-                            # Filter for clinic pages only (main clinic page, not individual doctor pages)
-                            if '/medical-centres/' in url and '/doctors' in url and url.endswith('/doctors'):
-                                all_urls.append(url)
-
-                        self.log(f'Sub-sitemap {i}: Found {len(all_urls)} total clinic URLs so far')
-
-                    except Exception as e:
-                        self.log(f'Error fetching sub-sitemap {i}: {str(e)}', 'warning')
-                        continue
+    def get_sitemap_urls(self, sitemap_url):
+        """Download and parse sitemap to get clinic URLs"""
+        try:
+            if self.sitemap_cache:
+                all_urls = self.get_cached_urls(sitemap_url)
             else:
-                # Single sitemap - extract URLs directly
-                for url_elem in root.findall('.//ns:url/ns:loc', namespace):
-                    url = url_elem.text
-                    if '/medical-centres/' in url and '/doctors' in url and url.endswith('/doctors'):
-                        all_urls.append(url)
-
+                all_urls = list(self.iter_sitemap_urls(sitemap_url))
             self.log(f'Found {len(all_urls)} total clinic URLs')
             return all_urls
 
@@ -145,207 +210,620 @@ class ClinicScraper:
             return []
 
     def extract_clinic_data(self, url, fields):
-        """Extract clinic information from a single page using Selenium"""
+        """Extract clinic information from a single page"""
+        data, _ = self.fetch_and_extract(url, fields)
+        return data
+
+    def fetch_and_extract(self, url, fields, known_hash=None):
+        """Fetch a page and extract clinic information, returning (data, page_hash).
+
+        Failures are logged and come back as (None, None); see fetch_page.
+        """
         try:
-            # Load page with Selenium
-            self.driver.get(url)
-
-            # Wait for page to load - wait for practice name to appear
-            wait = WebDriverWait(self.driver, 10)
-            wait.until(EC.presence_of_element_located((By.TAG_NAME, "h1")))
-
-            # Give extra time for dynamic content
-            time.sleep(2)
-
-            # Get page source and parse with BeautifulSoup
-            soup = BeautifulSoup(self.driver.page_source, 'lxml')
-
-            data = {'url': url}
-
-            # Extract name
-            if 'name' in fields:
-                name = None
-                # Try h1 first, then fall back to other selectors
-                h1 = soup.find('h1')
-                if h1:
-                    name = h1.get_text(strip=True)
-                    # If it's the generic HotDoc title, try other methods
-                    if 'Find a Doctor' in name or 'HotDoc' in name:
-                        # Try getting from URL slug as fallback
-                        url_parts = url.split('/')
-                        if len(url_parts) >= 5:
-                            slug = url_parts[-2] if url_parts[-1] == 'doctors' else url_parts[-1]
-                            name = slug.replace('_', ' ').replace('-', ' ').title()
-                data['name'] = name or 'N/A'
-
-            # Extract address
-            if 'address' in fields:
-                address = None
-                # Look for address in various places
-                address_elem = (
-                    soup.find(attrs={'itemprop': 'address'}) or
-                    soup.find('address') or
-                    soup.find(class_=re.compile(r'address', re.I)) or
-                    soup.find(attrs={'data-test-id': re.compile(r'address', re.I)})
-                )
-                if address_elem:
-                    address = address_elem.get_text(strip=True)
-                    address = ' '.join(address.split())
-                data['address'] = address or 'N/A'
-
-            # Extract phone
-            if 'phone' in fields:
-                phone = None
-                # Try multiple selectors
-                phone_elem = (
-                    soup.find(attrs={'itemprop': 'telephone'}) or
-                    soup.find('a', href=re.compile(r'tel:')) or
-                    soup.find(class_=re.compile(r'phone', re.I)) or
-                    soup.find(attrs={'data-test-id': re.compile(r'phone', re.I)})
-                )
-                if phone_elem:
-                    if phone_elem.name == 'a' and phone_elem.get('href', '').startswith('tel:'):
-                        phone = phone_elem.get('href').replace('tel:', '').strip()
-                    else:
-                        phone = phone_elem.get_text(strip=True)
-                    # Clean phone number
-                    phone = re.sub(r'[^\d\s\+\(\)-]', '', phone).strip()
-                data['phone'] = phone or 'N/A'
-
-            # Extract website
-            if 'website' in fields:
-                website = None
-
-                # First try: Look for ClinicContactDetails-contact-link (most reliable)
-                contact_links = soup.find_all('a', class_='ClinicContactDetails-contact-link')
-                for link in contact_links:
-                    href = link.get('href', '')
-                    # Filter out maps, social media, and HotDoc links
-                    if href and href.startswith('http') and \
-                       'hotdoc.com' not in href and \
-                       'google.com/maps' not in href and \
-                       'facebook.com' not in href and \
-                       'instagram.com' not in href and \
-                       'linkedin.com' not in href and \
-                       'twitter.com' not in href:
-                        website = href
-                        break
+            return self.fetch_page(url, fields, known_hash)
+        except Exception as e:
+            self.handle_failure(url, e)
+            return None, None
+
+    def fetch_page(self, url, fields, known_hash=None):
+        """Fetch a page and extract clinic information, returning (data, page_hash).
+
+        Backends are tried in order; a backend whose result is missing
+        required fields hands the URL to the next one (usually Selenium).
+        page_hash is the hash of the first page fetched. If it equals
+        known_hash the page is unchanged, parsing is skipped and data is None.
+        Raises the last backend's error, or ParseMiss when the final page has
+        none of the requested required fields.
+        """
+        page_hash = None
+        for position, backend in enumerate(self.backends):
+            is_last = position == len(self.backends) - 1
+            try:
+                html = self.fetch_html(backend, url, fields)
+            except Exception as e:
+                if is_last:
+                    raise
+                self.fall_back(backend, url, e)
+                continue
+
+            if page_hash is None:
+                page_hash = content_hash(html)
+                if page_hash == known_hash:
+                    self.count_unchanged(backend)
+                    return None, page_hash
+
+            started = time.perf_counter()
+            data = parse_clinic_page(html, url, fields, slug_fallback=backend.slug_fallback)
+            self.record_parse(backend, time.perf_counter() - started)
+
+            if self.accept_parsed(backend, is_last, html, data, fields):
+                self.archive_page(backend, url, html)
+                return data, page_hash
+
+    def fetch_html(self, backend, url, fields):
+        """Fetch a page's HTML with one backend once the rate limiter allows it"""
+        stats = self.backend_stats[backend.name]
+        with stage_timer('rate_limit'):
+            self.rate_limiter.wait(url)
+        started = time.time()
+        try:
+            html = backend.fetch(url, fields)
+        except Exception as e:
+            self.rate_feedback(url, e)
+            stats['errors'] += 1
+            raise
+        else:
+            self.rate_limiter.success(url)
+            return html
+        finally:
+            elapsed = time.time() - started
+            stats['seconds'] += elapsed
+            stats['fetch_seconds'] += elapsed
+            observe_stage('fetch', backend.name, elapsed)
+
+    def fall_back(self, backend, url=None, error=None):
+        """Count a page handed from backend to the next one in the chain"""
+        self.backend_stats[backend.name]['fallbacks'] += 1
+        count_retry(backend.name)
+        if error is not None:
+            self.log(f'{backend.name} fetch failed for {url} ({str(error)}), falling back', 'warning')
+
+    def count_unchanged(self, backend):
+        """Count a page whose content hash matched the previous run"""
+        self.backend_stats[backend.name]['hits'] += 1
+        count_page('unchanged')
+
+    def record_parse(self, backend, seconds):
+        stats = self.backend_stats[backend.name]
+        stats['parse_seconds'] += seconds
+        stats['seconds'] += seconds
+        observe_stage('parse', backend.name, seconds)
+
+    def accept_parsed(self, backend, is_last, html, data, fields):
+        """True if a backend's parsed page is final, False to try the next backend.
+
+        Raises ParseMiss when the last backend found none of the requested
+        required fields.
+        """
+        stats = self.backend_stats[backend.name]
+        missing = missing_fields(data, fields)
+        if is_last:
+            required = [field for field in fields if field in self.required_fields]
+            if required and all(field in missing for field in required):
+                stats['errors'] += 1
+                raise ParseMiss(f"No {', '.join(required)} found on the page")
+
+        if is_last or backend.accepts(html, data, missing):
+            stats['hits'] += 1
+            count_page('success')
+            return True
+
+        self.fall_back(backend)
+        return False
+
+    def archive_page(self, backend, url, html):
+        """Keep an accepted page's HTML in the archive; never fails the page"""
+        if self.archive is None:
+            return
+        try:
+            self.archive.add(url, html, backend.name)
+        except Exception as e:
+            self.log(f'Could not archive {url}: {str(e)}', 'warning')
 
-                # Second try: Look for any external links if first method failed
-                if not website:
-                    all_links = soup.find_all('a', href=True)
-                    for link in all_links:
-                        href = link.get('href', '')
-                        # Check if it's a clinic website
-                        if href and href.startswith('http') and \
-                           'hotdoc.com' not in href and \
-                           'google.com' not in href and \
-                           'facebook.com' not in href and \
-                           'instagram.com' not in href and \
-                           'linkedin.com' not in href and \
-                           'twitter.com' not in href:
-                            # Additional check: likely to be clinic website
-                            text = link.get_text(strip=True).lower()
-                            if any(keyword in text for keyword in ['visit', 'website', 'clinic', '.com', '.au']):
-                                website = href
-                                break
-
-                data['website'] = website or 'N/A'
-
-            return data
-
-        except TimeoutException:
+    def handle_failure(self, url, error):
+        """Count and log a failed page, restarting a crashed browser; returns its Failure"""
+        failure = classify_failure(error)
+        if failure.kind == 'timeout':
+            count_page('timeout')
             self.log(f'Timeout loading {url}', 'warning')
-            return None
+        else:
+            count_page('failure')
+            self.log(f'Error scraping {url} ({failure.kind}): {failure.message}', 'warning')
+        if failure.kind == 'driver_crash':
+            self.log('Browser crashed, restarting it for the next page', 'warning')
+            self.reset_driver()
+        return failure
+
+    def rate_feedback(self, url, error):
+        """Slow the shared rate limiter down when a fetch error means the host is struggling"""
+        if isinstance(error, (TimeoutException, requests.Timeout)):
+            self.rate_limiter.backoff(url)
+            return
+        response = getattr(error, 'response', None)
+        if response is not None and is_throttled_status(response.status_code):
+            self.rate_limiter.backoff(url, parse_retry_after(response.headers.get('Retry-After')))
+
+    def get_backend_stats(self):
+        """Return per-backend hit/fallback/error counters, including parallel workers"""
+        totals = {name: dict(stats) for name, stats in self.backend_stats.items()}
+        for worker in list(self.workers):
+            for name, stats in worker.backend_stats.items():
+                for key, value in stats.items():
+                    totals[name][key] += value
+        return totals
+
+    def log_backend_stats(self):
+        """Log a summary of how pages were fetched"""
+        summary = ', '.join(
+            f"{name}: {stats['hits']} hits, {stats['fallbacks']} fallbacks, "
+            f"{stats['errors']} errors, {stats['seconds']:.1f}s"
+            for name, stats in self.get_backend_stats().items()
+        )
+        self.log(f'Fetch backends - {summary}')
+        if self.progress_callback:
+            self.progress_callback({
+                'type': 'backend_stats',
+                'stats': self.get_backend_stats()
+            })
+
+    def create_worker(self):
+        """Create a worker scraper with its own browser and session.
+
+        Workers share this scraper's callback, rate limiter and backend chain.
+        """
+        worker = ClinicScraper(
+            progress_callback=self.progress_callback,
+            backends=self.backend_names,
+            required_fields=self.required_fields,
+            rate_limiter=self.rate_limiter,
+            driver_pool=self.driver_pool,
+            archive=self.archive
+        )
+        self.workers.append(worker)
+        return worker
+
+    def record_result(self, index, url, data):
+        """Keep a successful record, appending it to the job store when one is attached"""
+        if self.job_store:
+            self.job_store.add_record(self.job_id, index, url, data)
+        else:
+            self.collected.append(index, data)
+
+    def collect_results(self):
+        """Return the run's records in sitemap order"""
+        if self.job_store:
+            return StoredResults(self.job_store, self.job_id)
+        return self.collected
+
+    def scrape_url(self, worker, index, url, lastmod, fields):
+        """Scrape one URL with worker, apply delta checks and record the result.
+
+        Returns (data, status). status is 'scraped' or 'failed' in a full
+        run; in delta mode it is 'new', 'changed' or 'unchanged', and only new
+        and changed records are kept, tagged with a 'change' column. A failed
+        page is 'deferred' while the retry policy allows another attempt.
+        """
+        snapshot, result = self.check_snapshot(url, lastmod, fields)
+        if result:
+            return result
+
+        known_hash = snapshot[1] if self.delta and snapshot else None
+        try:
+            data, page_hash = worker.fetch_page(url, fields, known_hash)
         except Exception as e:
-            self.log(f'Error scraping {url}: {str(e)}', 'warning')
+            return None, self.count_status(self.defer_failure(index, url, lastmod, worker.handle_failure(url, e)))
+        return self.finish_url(index, url, lastmod, fields, snapshot, data, page_hash)
+
+    def check_snapshot(self, url, lastmod, fields):
+        """Return (snapshot, result); result is set when the page need not be fetched.
+
+        result is (data, 'duplicate') for a known duplicate of a clinic this
+        run has recorded already, or (data, 'unchanged') when delta mode can
+        skip the page.
+        """
+        if self.dedupe is not None:
+            result = self.check_duplicate(url)
+            if result:
+                return None, result
+
+        snapshot = self.snapshots.get(url) if self.snapshots else None
+        if snapshot and not all(field in snapshot[2] for field in fields):
+            # The previous run did not extract every requested field
+            snapshot = None
+
+        if self.delta and snapshot and lastmod and snapshot[0] == lastmod:
+            self.snapshots.touch(url, lastmod)
+            if self.dedupe is not None:
+                self.claim_entity(url, snapshot[2])
+            return snapshot, (snapshot[2], self.count_status('unchanged'))
+        return snapshot, None
+
+    def check_duplicate(self, url):
+        """(data, 'duplicate') when url was resolved to a clinic this run already recorded, else None"""
+        resolution = self.dedupe.lookup(url)
+        if resolution is None:
+            return None
+        with self.status_lock:
+            first_url = self.entities_seen.get(resolution.entity_id)
+        if first_url is None or first_url == url:
             return None
+        return resolution.data, self.count_status('duplicate')
+
+    def claim_entity(self, url, data):
+        """Resolve a record to its clinic; returns (URL this run recorded it under first, Resolution)"""
+        resolution = self.dedupe.resolve(url, data)
+        with self.status_lock:
+            first_url = self.entities_seen.setdefault(resolution.entity_id, url)
+        return first_url, resolution
+
+    def finish_url(self, index, url, lastmod, fields, snapshot, data, page_hash):
+        """Classify a fetched page against its snapshot and record it; returns (data, status).
+
+        data is None when the page hash matched the snapshot.
+        """
+        if data is None:
+            self.snapshots.touch(url, lastmod)
+            if self.dedupe is not None:
+                self.claim_entity(url, snapshot[2])
+            return snapshot[2], self.count_status('unchanged')
+
+        status = 'scraped'
+        if self.delta:
+            if snapshot is None:
+                status = 'new'
+            elif any(snapshot[2].get(field) != data.get(field) for field in fields):
+                status = 'changed'
+            else:
+                status = 'unchanged'
+
+        if self.snapshots:
+            self.snapshots.save(url, lastmod, page_hash, data)
+        if self.dedupe is not None:
+            first_url, resolution = self.claim_entity(url, data)
+            if first_url != url:
+                return data, self.count_status('duplicate')
+            # Fields this listing lacks may be known from other listings of the clinic
+            data = fill_missing(data, resolution.data)
+        if status != 'unchanged':
+            self.record_result(index, url, dict(data, change=status) if self.delta else data)
+        return data, self.count_status(status)
+
+    def defer_failure(self, index, url, lastmod, failure):
+        """Queue a failed page for the retry pass, or dead-letter it; returns its status"""
+        if self.retry_queue.defer(index, url, lastmod, failure):
+            # Counted as a retry of the whole chain; the next pass tries it again
+            count_retry('deferred')
+            return 'deferred'
+        attempts = self.retry_queue.attempts_for(url)
+        self.dead_letters.append({'index': index, 'url': url, 'kind': failure.kind, 'error': failure.message,
+                                  'attempts': attempts})
+        if self.job_store:
+            self.job_store.add_dead_letter(self.job_id, index, url, lastmod, failure, attempts)
+        return 'failed'
+
+    def retry_deferred(self, fields, workers=1):
+        """Retry deferred pages round by round until they succeed or are dead-lettered"""
+        while len(self.retry_queue) and not self.stop_requested:
+            entries = self.retry_queue.take()
+            self.log(f'Retrying {len(entries)} failed clinics')
+            items = iter_due(entries, lambda: self.stop_requested)
+            self.scrape_items(items, fields, len(entries), workers, report_progress=False)
+
+    def count_status(self, status):
+        with self.status_lock:
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+        return status
+
+    def log_result(self, url, data, status, position=''):
+        """Log the outcome of scrape_url"""
+        if status == 'failed':
+            self.log(f'✗ Failed to scrape {url}', 'error')
+        elif status == 'duplicate':
+            self.log(f'≡ Duplicate listing of a clinic already scraped: {url}')
+        elif status == 'deferred':
+            self.log(f'↻ Will retry {url} after the main pass', 'warning')
+        elif status in ('scraped', 'new', 'changed'):
+            label = '' if status == 'scraped' else f'{status.capitalize()} '
+            self.log(f"✓ {label}Success{position}: {data.get('name', 'Unknown')}", 'success')
+
+    def scrape_items(self, items, fields, total, workers, done=frozenset(), report_progress=True):
+        """Scrape (index, url, lastmod) items through the pipeline, a worker pool or one by one"""
+        if self.parse_pool:
+            pipeline = ScrapePipeline(self, self.parse_pool, fields, workers, report_progress=report_progress)
+            pipeline.run(items, total, done)
+            if self.stop_requested:
+                self.log('Scraping stopped by user', 'warning')
+        elif workers > 1:
+            self.scrape_parallel(items, fields, total, workers, done, report_progress)
+        else:
+            self.scrape_sequential(items, fields, total, done, report_progress)
+
+    def scrape_sequential(self, items, fields, total, done=frozenset(), report_progress=True):
+        """Scrape (index, url, lastmod) items one at a time on this scraper's own browser"""
+        # Scrape each URL
+        for i, (index, url, lastmod) in enumerate(items, 1):
+            if self.stop_requested:
+                self.log('Scraping stopped by user', 'warning')
+                break
+
+            if url in done:
+                continue
+
+            self.log(f'Scraping {i}/{total}: {url}')
+            if report_progress:
+                self.update_progress(i, total, f'Scraping clinic {i}/{total}')
+
+            data, status = self.scrape_url(self, index, url, lastmod, fields)
+            self.log_result(url, data, status)
+
+    def scrape_parallel(self, items, fields, total, workers, done=frozenset(), report_progress=True):
+        """Scrape (index, url, lastmod) items with a bounded pool of workers pulling from a shared queue.
+
+        URLs are fed into the queue as the sitemap streams in and every
+        record keeps its sitemap index, so results come back in sitemap order.
+        """
+        workers = max(1, min(workers, total))
+        work_queue = queue.Queue(maxsize=workers * 2)
+
+        completed = [0]
+        lock = threading.Lock()
+
+        self.log(f'Starting {workers} parallel workers')
+
+        def feed():
+            try:
+                for index, url, lastmod in items:
+                    if self.stop_requested:
+                        break
+                    if url in done:
+                        with lock:
+                            completed[0] += 1
+                        continue
+                    work_queue.put((index, url, lastmod))
+            finally:
+                for _ in range(workers):
+                    work_queue.put(None)
+
+        def run_worker(worker):
+            try:
+                while True:
+                    item = work_queue.get()
+                    if item is None or self.stop_requested:
+                        break
+                    index, url, lastmod = item
+
+                    data, status = self.scrape_url(worker, index, url, lastmod, fields)
+
+                    with lock:
+                        completed[0] += 1
+                        count = completed[0]
+                    if report_progress:
+                        self.update_progress(count, total, f'Scraped {count}/{total} clinics')
+                    self.log_result(url, data, status, f' ({index + 1})')
+            finally:
+                for backend in worker.backends:
+                    backend.close()
+                worker.close_driver()
+                # Keep the feeder from blocking on a full queue after a stop
+                while self.stop_requested:
+                    try:
+                        work_queue.get_nowait()
+                    except queue.Empty:
+                        break
 
-    def scrape(self, sitemap_url, start_range=1, end_range=10, fields=None, limit=None):
-        """Main scraping function"""
+        feeder = threading.Thread(target=feed, daemon=True)
+        threads = [
+            threading.Thread(target=run_worker, args=(self.create_worker(),), daemon=True)
+            for _ in range(workers)
+        ]
+        feeder.start()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if self.stop_requested:
+            self.log('Scraping stopped by user', 'warning')
+
+    @staticmethod
+    def peek_urls(urls):
+        """Wait for the first URL so sitemap errors surface before scraping starts"""
+        urls = iter(urls)
+        first = next(urls)
+        return itertools.chain([first], urls)
+
+    def scrape(self, sitemap_url, start_range=1, end_range=10, fields=None, limit=None, workers=1,
+               job_store=None, job_id=None, delta=False, dedupe=False):
+        """Main scraping function.
+
+        With a job_store, every record is appended to the store as soon as it
+        is extracted, URLs already stored for job_id are skipped, and the
+        returned results are a StoredResults view instead of an in-memory list.
+
+        With delta=True (requires snapshots), pages whose sitemap lastmod or
+        content hash match the previous run are skipped, and only new,
+        changed and removed clinics are returned, tagged with 'change'.
+
+        With dedupe=True, every record is resolved to a clinic entity (see
+        dedupe.ClinicResolver) and only the first listing of each clinic is
+        kept; listings already known to be duplicates are not fetched.
+        """
         if fields is None:
             fields = ['name', 'address', 'phone', 'website']
+        if delta and not self.snapshots:
+            raise ValueError('Delta mode requires page snapshots')
 
         self.stop_requested = False
+        self.workers = []
+        # Without a job store, records are kept in memory column by column
+        self.collected = RecordTable(csv_fieldnames(fields + ['change'] if delta else fields))
+        self.job_store = job_store
+        self.job_id = job_id
+        self.delta = delta
+        self.dedupe = (ClinicResolver() if self.resolver is None else self.resolver) if dedupe else None
+        self.entities_seen = {}
+        self.status_counts = {}
+        self.retry_queue = RetryQueue(self.retry_policy)
+        self.dead_letters = []
+        self.sitemap_errors = 0
+        self.throughput.reset(job_id)
         results = []
 
-        try:
-            # Get URLs from sitemap
-            urls = self.get_sitemap_urls(sitemap_url)
+        # Apply range (convert to 0-indexed)
+        # If limit is provided (for backward compatibility), use it
+        if limit and limit > 0:
+            start_idx, end_idx = 0, limit
+        else:
+            start_idx, end_idx = max(0, start_range - 1), end_range
 
-            if not urls:
+        try:
+            all_urls = None
+            try:
+                if self.sitemap_cache:
+                    # Seek straight to the requested rows of the cached URL index
+                    entries = self.get_cached_entries(sitemap_url, start_idx + 1, end_idx)
+                    total = len(entries)
+                    if delta:
+                        all_urls = self.sitemap_cache.get_urls(sitemap_url)
+                elif delta:
+                    # Removed clinics can only be detected against the full sitemap
+                    all_entries = list(self.iter_sitemap(sitemap_url))
+                    all_urls = [url for url, _ in all_entries]
+                    entries = all_entries[start_idx:end_idx]
+                    total = len(entries)
+                else:
+                    # Stream URLs from the sitemap; scraping starts before enumeration finishes
+                    entries = itertools.islice(self.iter_sitemap(sitemap_url), start_idx, end_idx)
+                    total = max(0, end_idx - start_idx)
+                entries = self.peek_urls(entries)
+            except StopIteration:
                 self.log('No clinic URLs found in sitemap', 'error')
                 return results
+            except Exception as e:
+                self.log(f'Error fetching sitemap: {str(e)}', 'error')
+                return results
 
-            # Apply range (convert to 0-indexed)
-            # If limit is provided (for backward compatibility), use it
             if limit and limit > 0:
-                urls = urls[:limit]
                 self.log(f'Limited to {limit} clinics')
             else:
-                # Use range
-                start_idx = max(0, start_range - 1)  # Convert to 0-indexed
-                end_idx = min(len(urls), end_range)
-                urls = urls[start_idx:end_idx]
-                self.log(f'Scraping range {start_range}-{end_range} ({len(urls)} clinics)')
-
-            total = len(urls)
-
-            # Setup Selenium driver
-            self.setup_driver()
-
-            # Scrape each URL
-            for i, url in enumerate(urls, 1):
-                if self.stop_requested:
-                    self.log('Scraping stopped by user', 'warning')
-                    break
-
-                self.log(f'Scraping {i}/{total}: {url}')
-                self.update_progress(i, total, f'Scraping clinic {i}/{total}')
-
-                data = self.extract_clinic_data(url, fields)
-
-                if data:
-                    results.append(data)
-                    self.log(f"✓ Success: {data.get('name', 'Unknown')}", 'success')
-                else:
-                    self.log(f'✗ Failed to scrape {url}', 'error')
+                self.log(f'Scraping range {start_range}-{end_range} (up to {total} clinics)')
+
+            done = frozenset()
+            if job_store:
+                job_store.set_status(job_id, 'running')
+                done = job_store.done_urls(job_id)
+                if done:
+                    self.log(f'Resuming job {job_id}: {len(done)} clinics already scraped')
+
+            # Keep each URL's sitemap position so records sort in sitemap order
+            items = ((index, url, lastmod) for index, (url, lastmod) in enumerate(entries, start_idx))
+            self.scrape_items(items, fields, total, workers, done)
+
+            # Retries run last so slow or flaky pages never hold up the rest of the range
+            self.retry_deferred(fields, workers)
+            if self.dead_letters:
+                self.log(f'{len(self.dead_letters)} clinics still failed after retries '
+                         'and were added to the dead-letter list', 'error')
+
+            if delta and not self.stop_requested:
+                self.record_removed(all_urls, end_idx)
+
+            results = self.collect_results()
+            if job_store:
+                job_store.set_status(job_id, 'stopped' if self.stop_requested else 'completed')
+
+            if delta:
+                counts = self.status_counts
+                self.log(
+                    f"Delta: {counts.get('new', 0)} new, {counts.get('changed', 0)} changed, "
+                    f"{counts.get('removed', 0)} removed, {counts.get('unchanged', 0)} unchanged"
+                )
+                if self.progress_callback:
+                    self.progress_callback({'type': 'delta', **counts})
 
-                # Rate limiting - be respectful to the server
-                if i < total:
-                    time.sleep(1)  # 1 second between requests
+            if dedupe:
+                self.log(f"Dedupe: skipped {self.status_counts.get('duplicate', 0)} duplicate listings")
 
             self.log(f'Scraping complete! Collected {len(results)} clinics', 'success')
+            self.log_backend_stats()
+
+        except Exception:
+            if job_store:
+                job_store.set_status(job_id, 'failed')
+            raise
 
         finally:
             # Always close the driver
+            for backend in self.backends:
+                backend.close()
             self.close_driver()
+            self.throughput.close()
 
         return results
 
-    def save_to_csv(self, data, filename='clinics.csv'):
-        """Save scraped data to CSV file"""
-        if not data:
-            self.log('No data to save', 'warning')
-            return False
-
+    def record_removed(self, current_urls, next_index):
+        """Record snapshot clinics that are no longer listed in the sitemap"""
+        if self.sitemap_errors:
+            # Clinics of a sub-sitemap that failed to load are missing, not removed
+            self.log(f'{self.sitemap_errors} sub-sitemap(s) failed to load, '
+                     'skipping removed clinic detection', 'warning')
+            return
+        for offset, (url, data) in enumerate(self.snapshots.pop_removed(current_urls)):
+            self.record_result(next_index + offset, url, dict(data, change='removed'))
+            self.count_status('removed')
+
+    def save_to_csv(self, data, filename='clinics.csv', fieldnames=None):
+        """Save scraped data to CSV file.
+
+        data can be any iterable of records, e.g. a StoredResults view or the
+        RecordTable of a run. When fieldnames are given, or data is a
+        RecordTable with its own schema, the rows are streamed straight to
+        disk in one pass; the file is written to a temporary path and swapped
+        in at the end.
+        """
         try:
-            # Get all unique fields from data
-            fieldnames = set()
-            for row in data:
-                fieldnames.update(row.keys())
-            fieldnames = sorted(list(fieldnames))
-
-            # Move 'url' to the end if present
-            if 'url' in fieldnames:
-                fieldnames.remove('url')
-                fieldnames.append('url')
-
-            with open(filename, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(data)
-
+            if fieldnames is None and isinstance(data, RecordTable):
+                fieldnames = csv_fieldnames(data.fieldnames)
+            if fieldnames is None:
+                # Get all unique fields from data
+                data = list(data)
+                fieldnames = set()
+                for row in data:
+                    fieldnames.update(row.keys())
+                fieldnames = csv_fieldnames(fieldnames)
+
+            rows = 0
+            tmp_filename = f'{filename}.tmp'
+            with open(tmp_filename, 'w', newline='', encoding='utf-8') as f:
+                if isinstance(data, RecordTable) and data.fieldnames == fieldnames:
+                    # Rows are already tuples in column order
+                    writer = csv.writer(f)
+                    writer.writerow(fieldnames)
+                    writer.writerows(data.rows())
+                    rows = len(data)
+                else:
+                    writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+                    writer.writeheader()
+                    for row in data:
+                        writer.writerow(row)
+                        rows += 1
+
+            if not rows:
+                os.remove(tmp_filename)
+                self.log('No data to save', 'warning')
+                return False
+
+            os.replace(tmp_filename, filename)
             self.log(f'Data saved to {filename}', 'success')
             return True
 
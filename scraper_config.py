@@ -1,6 +1,9 @@
 """Configuration for scraper to work in different environments"""
 import os
 
+# Block images, CSS, fonts and third-party requests in the browser (SCRAPER_BLOCK_RESOURCES=0 to disable)
+BLOCK_RESOURCES = os.getenv('SCRAPER_BLOCK_RESOURCES', '1') != '0'
+
 def get_chrome_options():
     """Get Chrome options based on environment"""
     from selenium.webdriver.chrome.options import Options
@@ -12,9 +15,45 @@ def get_chrome_options():
     chrome_options.add_argument('--disable-gpu')
     chrome_options.add_argument('--window-size=1920,1080')
     chrome_options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
+    if BLOCK_RESOURCES:
+        # Images are never parsed; CDP blocking in block_resources covers the rest
+        chrome_options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
 
     # For Render/production environments
     if os.getenv('RENDER') or os.path.exists('/usr/bin/chromium'):
         chrome_options.binary_location = '/usr/bin/chromium'
 
     return chrome_options
+
+
+# Never parsed, so never downloaded: images, stylesheets, fonts and media
+BLOCKED_EXTENSIONS = (
+    'png', 'jpg', 'jpeg', 'gif', 'webp', 'avif', 'svg', 'ico', 'bmp',
+    'css', 'woff', 'woff2', 'ttf', 'otf', 'eot', 'mp4', 'webm', 'mp3',
+)
+
+# Third-party analytics, ads, chat widgets and map tiles
+BLOCKED_DOMAINS = (
+    'google-analytics.com', 'googletagmanager.com', 'doubleclick.net', 'googlesyndication.com',
+    'googleadservices.com', 'maps.googleapis.com', 'maps.gstatic.com', 'fonts.googleapis.com',
+    'fonts.gstatic.com', 'facebook.net', 'connect.facebook.com', 'hotjar.com', 'segment.io',
+    'segment.com', 'intercom.io', 'intercomcdn.com', 'nr-data.net', 'newrelic.com',
+    'sentry.io', 'bugsnag.com', 'clarity.ms', 'bing.com', 'tiktok.com', 'linkedin.com',
+)
+
+
+def get_blocked_url_patterns():
+    """URL patterns for CDP Network.setBlockedURLs ('*' is a wildcard)"""
+    patterns = [f'*.{ext}' for ext in BLOCKED_EXTENSIONS]
+    patterns += [f'*.{ext}?*' for ext in BLOCKED_EXTENSIONS]
+    patterns += [f'*{domain}/*' for domain in BLOCKED_DOMAINS]
+    return patterns
+
+
+def block_resources(driver):
+    """Stop the browser from requesting images, CSS, fonts and third-party domains"""
+    if not BLOCK_RESOURCES:
+        return False
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': get_blocked_url_patterns()})
+    return True
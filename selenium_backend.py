@@ -0,0 +1,77 @@
+"""Headless Chrome fetch backend; imported only once a scraper uses it"""
+import time
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+from backends import SLUG_FALLBACK, FetchBackend
+from extractor import RENDERED_SELECTOR, ready_selectors
+from metrics import stage_timer
+
+
+# Reports which selectors currently match, plus whether the page has rendered at all
+READY_SCRIPT = """
+const selectors = arguments[0];
+const present = selectors.map(s => document.querySelector(s) !== null);
+present.push(document.querySelector(arguments[1]) !== null);
+return present;
+"""
+
+
+class SeleniumBackend(FetchBackend):
+    """Headless Chrome fetch for pages that need JavaScript rendering.
+
+    Instead of a fixed sleep, the page is polled until the elements of the
+    requested fields are present. Once the page has rendered, fields that
+    are still missing get at most ``grace`` seconds before the page is
+    returned as is; fields that were not requested are never waited for.
+    """
+    name = 'selenium'
+    slug_fallback = SLUG_FALLBACK[name]
+
+    def __init__(self, scraper, timeout=10, grace=2.0, poll_frequency=0.1):
+        super().__init__(scraper)
+        self.timeout = timeout
+        self.grace = grace
+        self.poll_frequency = poll_frequency
+
+    def fetch(self, url, fields=None):
+        self.scraper.setup_driver()
+        driver = self.scraper.driver
+
+        # Load page with Selenium
+        with stage_timer('driver_get', self.name):
+            driver.get(url)
+        if self.scraper.driver_pool:
+            self.scraper.driver_pool.record_page(driver)
+
+        # Wait for the elements the requested fields are read from
+        with stage_timer('wait', self.name):
+            self.wait_for_fields(driver, fields)
+
+        return driver.page_source
+
+    def wait_for_fields(self, driver, fields):
+        """Block until every requested field has rendered, or the grace period ends"""
+        selectors = ready_selectors(fields or (), self.scraper.required_fields)
+        rendered_at = [None]
+
+        def ready(driver):
+            present = driver.execute_script(READY_SCRIPT, selectors, RENDERED_SELECTOR)
+            if all(present[:-1]):
+                return True
+            if present[-1]:
+                now = time.monotonic()
+                if rendered_at[0] is None:
+                    rendered_at[0] = now
+                elif now - rendered_at[0] >= self.grace:
+                    return True
+            return False
+
+        try:
+            WebDriverWait(driver, self.timeout, poll_frequency=self.poll_frequency).until(ready)
+        except TimeoutException:
+            # Nothing rendered at all - report the page as not loaded
+            if rendered_at[0] is None:
+                raise
+
+    def close(self):
+        self.scraper.close_driver()
@@ -0,0 +1,221 @@
+"""Streaming, concurrent sitemap crawler"""
+import asyncio
+import queue
+import threading
+import zlib
+from collections import namedtuple
+from xml.etree import ElementTree as ET
+
+
+SITEMAP_NS = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+
+# A <url> or <sitemap> entry; kind is 'url' or 'sitemap'
+SitemapEntry = namedtuple('SitemapEntry', ['loc', 'lastmod', 'kind'])
+
+# Entries buffered ahead of the consumer, per sub-sitemap and between the crawler thread and the
+# consumer; downloads pause when they are full, so memory stays flat while scraping is slower
+BUFFER_SIZE = 1000
+
+_DONE = object()
+
+
+def is_clinic_url(url):
+    """Filter for clinic pages only (main clinic page, not individual doctor pages)"""
+    return '/medical-centres/' in url and '/doctors' in url and url.endswith('/doctors')
+
+
+class SitemapStreamParser:
+    """Incremental gzip + XML parser fed with raw response chunks.
+
+    Only the current <url>/<sitemap> element is kept in memory; everything
+    already parsed is cleared from the tree as soon as it has been yielded.
+    """
+
+    def __init__(self):
+        self.decompressor = None
+        self.is_gzip = None
+        self.parser = ET.XMLPullParser(events=('start', 'end'))
+        self.root = None
+
+    def feed(self, chunk):
+        """Feed a chunk of the response body and return completed entries"""
+        if self.is_gzip is None:
+            # Sitemaps are normally .gz files, but plain XML is accepted too
+            self.is_gzip = chunk[:2] == b'\x1f\x8b'
+            if self.is_gzip:
+                self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if self.is_gzip:
+            chunk = self.decompressor.decompress(chunk)
+        self.parser.feed(chunk)
+        return self._drain()
+
+    def close(self):
+        """Flush remaining data and return the last entries"""
+        if self.is_gzip:
+            self.parser.feed(self.decompressor.flush())
+        self.parser.close()
+        return self._drain()
+
+    def _drain(self):
+        entries = []
+        for event, elem in self.parser.read_events():
+            if event == 'start':
+                if self.root is None:
+                    self.root = elem
+                continue
+            if elem.tag in (SITEMAP_NS + 'url', SITEMAP_NS + 'sitemap'):
+                loc = elem.findtext(SITEMAP_NS + 'loc')
+                if loc:
+                    entries.append(SitemapEntry(
+                        loc.strip(),
+                        (elem.findtext(SITEMAP_NS + 'lastmod') or '').strip() or None,
+                        'url' if elem.tag == SITEMAP_NS + 'url' else 'sitemap'
+                    ))
+                # Drop everything parsed so far to keep memory flat
+                self.root.clear()
+        return entries
+
+
+class AsyncSitemapCrawler:
+    """Fetches sub-sitemaps concurrently and yields clinic entries in sitemap order.
+
+    Sub-sitemaps are downloaded in parallel (bounded by concurrency) and
+    parsed as bytes arrive. Entries from sub-sitemap N are yielded as soon
+    as they are parsed, even while N+1.. are still downloading, which pause
+    once BUFFER_SIZE entries are waiting for the consumer. A
+    sub-sitemap that fails is skipped with a warning and reported to
+    on_error(url, error), so callers know the URL list is incomplete.
+    """
+
+    def __init__(self, headers=None, concurrency=4, timeout=30, log=None, should_stop=None, on_error=None):
+        self.headers = headers or {}
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.log = log or (lambda message, level='info': None)
+        self.should_stop = should_stop or (lambda: False)
+        self.on_error = on_error or (lambda url, error: None)
+
+    async def stream_entries(self, client, url):
+        """Yield every entry of a single sitemap document as it streams in"""
+        parser = SitemapStreamParser()
+        async with client.stream('GET', url) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                for entry in parser.feed(chunk):
+                    yield entry
+        for entry in parser.close():
+            yield entry
+
+    async def crawl(self, index_url, url_filter=is_clinic_url):
+        """Async generator of matching url entries from a sitemap or sitemap index"""
+        # httpx is imported on the first crawl; it pulls in a large async stack at startup
+        import httpx
+
+        async with httpx.AsyncClient(headers=self.headers, timeout=self.timeout,
+                                     follow_redirects=True) as client:
+            self.log('Downloading sitemap index...')
+            sub_sitemaps = []
+            async for entry in self.stream_entries(client, index_url):
+                if entry.kind == 'sitemap':
+                    sub_sitemaps.append(entry.loc)
+                elif url_filter(entry.loc):
+                    # Single sitemap - yield URLs directly
+                    yield entry
+
+            if not sub_sitemaps:
+                return
+
+            self.log(f'Found sitemap index with {len(sub_sitemaps)} sub-sitemaps')
+
+            semaphore = asyncio.Semaphore(self.concurrency)
+            buffers = [asyncio.Queue(BUFFER_SIZE) for _ in sub_sitemaps]
+
+            async def fetch_sub_sitemap(i, sub_sitemap_url):
+                buffer = buffers[i]
+                found = 0
+                try:
+                    async with semaphore:
+                        if not self.should_stop():
+                            self.log(f'Downloading sub-sitemap {i + 1}/{len(sub_sitemaps)}...')
+                            async for entry in self.stream_entries(client, sub_sitemap_url):
+                                if entry.kind == 'url' and url_filter(entry.loc):
+                                    found += 1
+                                    await buffer.put(entry)
+                            self.log(f'Sub-sitemap {i + 1}: Found {found} clinic URLs')
+                except Exception as e:
+                    self.log(f'Error fetching sub-sitemap {i + 1}: {str(e)}', 'warning')
+                    self.on_error(sub_sitemap_url, e)
+                # Skipped when the task is cancelled: nobody drains its buffer any more
+                await buffer.put(_DONE)
+
+            tasks = [
+                asyncio.create_task(fetch_sub_sitemap(i, sub_url))
+                for i, sub_url in enumerate(sub_sitemaps)
+            ]
+            try:
+                # Drain buffers in sitemap order so URL positions are stable
+                for buffer in buffers:
+                    while True:
+                        entry = await buffer.get()
+                        if entry is _DONE:
+                            break
+                        yield entry
+                        if self.should_stop():
+                            return
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def iter_sitemap_entries(index_url, url_filter=is_clinic_url, should_stop=None, **crawler_options):
+    """Run an AsyncSitemapCrawler on a background event loop and yield its entries.
+
+    Closing the generator early (e.g. after islice reaches the end of the
+    requested range) stops the remaining downloads.
+    """
+    results = queue.Queue(BUFFER_SIZE)
+    closed = threading.Event()
+    should_stop = should_stop or (lambda: False)
+    crawler = AsyncSitemapCrawler(
+        should_stop=lambda: closed.is_set() or should_stop(),
+        **crawler_options
+    )
+
+    def put(item):
+        """Block until the consumer has room for item, or has gone away"""
+        while not closed.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    async def produce():
+        loop = asyncio.get_running_loop()
+        try:
+            async for entry in crawler.crawl(index_url, url_filter):
+                try:
+                    results.put_nowait(entry)
+                except queue.Full:
+                    # Wait off the event loop so sub-sitemap downloads keep filling their buffers
+                    await loop.run_in_executor(None, put, entry)
+                if closed.is_set():
+                    break
+        except Exception as e:
+            put(e)
+        finally:
+            put(_DONE)
+
+    thread = threading.Thread(target=lambda: asyncio.run(produce()), daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = results.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        closed.set()
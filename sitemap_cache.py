@@ -0,0 +1,268 @@
+"""Persistent sitemap cache with conditional revalidation and an on-disk URL index"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from sitemap import SitemapStreamParser, is_clinic_url
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sitemaps (
+    url TEXT PRIMARY KEY,
+    index_url TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL
+);
+CREATE TABLE IF NOT EXISTS sitemap_urls (
+    sitemap_url TEXT NOT NULL,
+    pos INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    lastmod TEXT,
+    PRIMARY KEY (sitemap_url, pos)
+);
+CREATE TABLE IF NOT EXISTS clinic_index (
+    index_url TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    lastmod TEXT,
+    PRIMARY KEY (index_url, seq)
+);
+'''
+
+
+class SitemapCache:
+    """Caches sub-sitemaps by ETag/Last-Modified and keeps a numbered clinic URL index.
+
+    After refresh() the clinic URLs of an index live in SQLite ordered by
+    their sitemap position, so a start/end range is a primary key range
+    lookup and unchanged sub-sitemaps are never downloaded or parsed again.
+    """
+
+    def __init__(self, path='cache/sitemap.db', max_age=600, concurrency=4, timeout=30):
+        self.path = path
+        self.max_age = max_age
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def connect(self):
+        """Open a short-lived connection, committing on success"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def refresh(self, index_url, headers=None, log=None, should_stop=None):
+        """Revalidate the index and its sub-sitemaps; return hit/miss stats"""
+        log = log or (lambda message, level='info': None)
+        # One refresh per process at a time, concurrent jobs reuse its result
+        with self.lock:
+            with self.connect() as conn:
+                row = conn.execute(
+                    'SELECT fetched_at FROM sitemaps WHERE url = ?', (index_url,)
+                ).fetchone()
+            if row and row[0] and time.time() - row[0] < self.max_age:
+                log('Sitemap cache is fresh, skipping revalidation')
+                return {'hits': 1, 'misses': 0, 'errors': 0, 'fresh': True}
+            return asyncio.run(self._refresh(index_url, headers or {}, log,
+                                             should_stop or (lambda: False)))
+
+    def _validators(self, conn, url):
+        row = conn.execute(
+            'SELECT etag, last_modified FROM sitemaps WHERE url = ?', (url,)
+        ).fetchone()
+        headers = {}
+        if row:
+            if row[0]:
+                headers['If-None-Match'] = row[0]
+            if row[1]:
+                headers['If-Modified-Since'] = row[1]
+        return headers
+
+    async def _fetch(self, client, url, conditional_headers, url_filter):
+        """Conditional GET; returns (status, response headers, entries or None)"""
+        async with client.stream('GET', url, headers=conditional_headers) as response:
+            if response.status_code == 304:
+                return 304, response.headers, None
+            response.raise_for_status()
+            parser = SitemapStreamParser()
+            entries = []
+            async for chunk in response.aiter_bytes():
+                entries.extend(e for e in parser.feed(chunk) if url_filter(e))
+            entries.extend(e for e in parser.close() if url_filter(e))
+            return response.status_code, response.headers, entries
+
+    def _store_validators(self, conn, url, index_url, position, response_headers, fresh=True):
+        conn.execute(
+            'INSERT OR REPLACE INTO sitemaps (url, index_url, position, etag, last_modified, fetched_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (url, index_url, position, response_headers.get('etag'),
+             response_headers.get('last-modified'), time.time() if fresh else None)
+        )
+
+    def _store_listing(self, conn, index_url, sub_sitemaps):
+        """Record every listed sub-sitemap and its position, keeping validators of known ones.
+
+        A sub-sitemap whose first fetch fails still gets a row, so a later
+        refresh that finds the index unchanged (304) retries it.
+        """
+        conn.executemany(
+            'INSERT INTO sitemaps (url, index_url, position) VALUES (?, ?, ?) '
+            'ON CONFLICT(url) DO UPDATE SET index_url = excluded.index_url, position = excluded.position',
+            ((url, index_url, position) for position, url in enumerate(sub_sitemaps))
+        )
+
+    def _store_entries(self, conn, sitemap_url, entries):
+        conn.execute('DELETE FROM sitemap_urls WHERE sitemap_url = ?', (sitemap_url,))
+        conn.executemany(
+            'INSERT INTO sitemap_urls (sitemap_url, pos, url, lastmod) VALUES (?, ?, ?, ?)',
+            ((sitemap_url, pos, entry.loc, entry.lastmod) for pos, entry in enumerate(entries))
+        )
+
+    async def _refresh(self, index_url, headers, log, should_stop):
+        import httpx
+
+        stats = {'hits': 0, 'misses': 0, 'errors': 0, 'fresh': False}
+        changed = False
+        complete = True
+
+        async with httpx.AsyncClient(headers=headers, timeout=self.timeout,
+                                     follow_redirects=True) as client:
+            log('Revalidating sitemap index...')
+            with self.connect() as conn:
+                conditional = self._validators(conn, index_url)
+            status, response_headers, entries = await self._fetch(
+                client, index_url, conditional,
+                lambda e: e.kind == 'sitemap' or is_clinic_url(e.loc)
+            )
+
+            with self.connect() as conn:
+                if status == 304:
+                    stats['hits'] += 1
+                    sub_sitemaps = [row[0] for row in conn.execute(
+                        'SELECT url FROM sitemaps WHERE index_url = ? AND url != ? ORDER BY position',
+                        (index_url, index_url)
+                    )]
+                    direct_urls = None
+                else:
+                    stats['misses'] += 1
+                    changed = True
+                    sub_sitemaps = [e.loc for e in entries if e.kind == 'sitemap']
+                    direct_urls = [e for e in entries if e.kind == 'url']
+                    # Forget sub-sitemaps that are no longer listed
+                    listed = ','.join('?' * len(sub_sitemaps))
+                    conn.execute(
+                        'DELETE FROM sitemap_urls WHERE sitemap_url IN '
+                        '(SELECT url FROM sitemaps WHERE index_url = ? AND url != ? AND url NOT IN (%s))'
+                        % listed,
+                        (index_url, index_url, *sub_sitemaps)
+                    )
+                    conn.execute(
+                        'DELETE FROM sitemaps WHERE index_url = ? AND url != ? AND url NOT IN (%s)'
+                        % listed,
+                        (index_url, index_url, *sub_sitemaps)
+                    )
+                    self._store_listing(conn, index_url, sub_sitemaps)
+                    # Single sitemap - the index itself holds the clinic URLs
+                    self._store_entries(conn, index_url, direct_urls)
+            index_headers = response_headers
+
+            if sub_sitemaps:
+                log(f'Found sitemap index with {len(sub_sitemaps)} sub-sitemaps')
+
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def revalidate(position, url):
+                nonlocal changed, complete
+                async with semaphore:
+                    if should_stop():
+                        complete = False
+                        return
+                    # Validators are only stored together with the sub-sitemap's rows
+                    with self.connect() as conn:
+                        conditional = self._validators(conn, url)
+                    try:
+                        status, response_headers, entries = await self._fetch(
+                            client, url, conditional,
+                            lambda e: e.kind == 'url' and is_clinic_url(e.loc)
+                        )
+                    except Exception as e:
+                        stats['errors'] += 1
+                        log(f'Error fetching sub-sitemap {position + 1}: {str(e)}', 'warning')
+                        return
+                    with self.connect() as conn:
+                        if status == 304:
+                            stats['hits'] += 1
+                        else:
+                            stats['misses'] += 1
+                            changed = True
+                            self._store_entries(conn, url, entries)
+                            log(f'Sub-sitemap {position + 1}: Found {len(entries)} clinic URLs')
+                        self._store_validators(conn, url, index_url, position, response_headers)
+
+            await asyncio.gather(*(revalidate(i, url) for i, url in enumerate(sub_sitemaps)))
+
+        with self.connect() as conn:
+            # Stored last: an index with failed or skipped sub-sitemaps is never treated as fresh
+            self._store_validators(conn, index_url, index_url, -1, index_headers,
+                                   fresh=complete and not stats['errors'])
+            has_index = conn.execute(
+                'SELECT 1 FROM clinic_index WHERE index_url = ? LIMIT 1', (index_url,)
+            ).fetchone()
+            if changed or not has_index:
+                self._rebuild_index(conn, index_url)
+
+        log(f"Sitemap cache: {stats['hits']} hits, {stats['misses']} misses, {stats['errors']} errors")
+        return stats
+
+    def _rebuild_index(self, conn, index_url):
+        """Renumber clinic URLs in sitemap order so ranges map to seq values"""
+        conn.execute('DELETE FROM clinic_index WHERE index_url = ?', (index_url,))
+        conn.execute(
+            'INSERT INTO clinic_index (index_url, seq, url, lastmod) '
+            'SELECT ?, ROW_NUMBER() OVER (ORDER BY s.position, u.pos), u.url, u.lastmod '
+            'FROM sitemap_urls u JOIN sitemaps s ON s.url = u.sitemap_url '
+            'WHERE s.index_url = ?',
+            (index_url, index_url)
+        )
+
+    def count(self, index_url):
+        """Number of clinic URLs in the index"""
+        with self.connect() as conn:
+            return conn.execute(
+                'SELECT COUNT(*) FROM clinic_index WHERE index_url = ?', (index_url,)
+            ).fetchone()[0]
+
+    def get_entries(self, index_url, start=1, end=None):
+        """Return (url, lastmod) rows for 1-based positions start..end inclusive"""
+        with self.connect() as conn:
+            if end is None:
+                rows = conn.execute(
+                    'SELECT url, lastmod FROM clinic_index WHERE index_url = ? AND seq >= ? ORDER BY seq',
+                    (index_url, start)
+                )
+            else:
+                rows = conn.execute(
+                    'SELECT url, lastmod FROM clinic_index WHERE index_url = ? AND seq BETWEEN ? AND ? '
+                    'ORDER BY seq',
+                    (index_url, start, end)
+                )
+            return rows.fetchall()
+
+    def get_urls(self, index_url, start=1, end=None):
+        """Return clinic URLs for 1-based positions start..end inclusive"""
+        return [url for url, _ in self.get_entries(index_url, start, end)]
@@ -1,9 +1,13 @@
 // State
 let eventSource = null;
+let lastEventId = null;
+let lastResultsFetch = 0;
 let isRunning = false;
-let allResults = [];
+let pageResults = [];
+let totalResults = 0;
 let currentPage = 1;
 const resultsPerPage = 10;
+const maxLogEntries = 500;
 
 // DOM Elements
 const startBtn = document.getElementById('startBtn');
@@ -11,6 +15,9 @@ const stopBtn = document.getElementById('stopBtn');
 const downloadBtn = document.getElementById('downloadBtn');
 const startRangeInput = document.getElementById('startRange');
 const endRangeInput = document.getElementById('endRange');
+const workersInput = document.getElementById('workers');
+const deltaModeCheckbox = document.getElementById('deltaMode');
+const dedupeModeCheckbox = document.getElementById('dedupeMode');
 const fieldCheckboxes = document.querySelectorAll('input[name="field"]');
 const progressBar = document.getElementById('progressBar');
 const progressText = document.getElementById('progressText');
@@ -37,7 +44,7 @@ document.addEventListener('DOMContentLoaded', () => {
     nextPageBtn.addEventListener('click', () => changePage(1));
     filterNoWebsiteCheckbox.addEventListener('change', () => {
         currentPage = 1;
-        displayCurrentPage();
+        fetchResults();
     });
 });
 
@@ -47,9 +54,14 @@ function connectSSE() {
         eventSource.close();
     }
 
-    eventSource = new EventSource('/api/stream');
+    // Resume after the last event we saw so nothing is missed across reconnects
+    const url = lastEventId ? `/api/stream?last_event_id=${lastEventId}` : '/api/stream';
+    eventSource = new EventSource(url);
 
     eventSource.onmessage = (event) => {
+        if (event.lastEventId) {
+            lastEventId = event.lastEventId;
+        }
         const data = JSON.parse(event.data);
         handleSSEMessage(data);
     };
@@ -72,8 +84,12 @@ function handleSSEMessage(data) {
             addLogEntry(data.message, data.level);
             break;
 
+        case 'logs':
+            addLogEntries(data.entries);
+            break;
+
         case 'progress':
-            updateProgress(data.current, data.total, data.status);
+            updateProgress(data.current, data.total, data.status, data.pages_per_second, data.eta_seconds);
             break;
 
         case 'complete':
@@ -97,6 +113,7 @@ async function startScraping() {
     // Get range values
     const startRange = parseInt(startRangeInput.value) || 1;
     const endRange = parseInt(endRangeInput.value) || 10;
+    const workers = parseInt(workersInput.value) || 1;
 
     // Validate range
     if (startRange < 1) {
@@ -110,7 +127,8 @@ async function startScraping() {
 
     // Clear logs and results
     logContainer.innerHTML = '';
-    allResults = [];
+    pageResults = [];
+    totalResults = 0;
     currentPage = 1;
 
     // Reset progress
@@ -126,14 +144,23 @@ async function startScraping() {
             body: JSON.stringify({
                 start: startRange,
                 end: endRange,
-                fields: selectedFields
+                fields: selectedFields,
+                workers: workers,
+                delta: deltaModeCheckbox.checked,
+                dedupe: dedupeModeCheckbox.checked
             })
         });
 
         if (response.ok) {
+            const result = await response.json();
             isRunning = true;
             updateButtons();
-            addLogEntry('Scraping started...', 'info');
+            addLogEntry(result.resumed
+                ? `Resuming interrupted job ${result.job_id}...`
+                : `Job ${result.job_id} queued...`, 'info');
+            if (result.shards) {
+                addLogEntry(`Range split into ${result.shards} shards running in parallel`, 'info');
+            }
         } else {
             const error = await response.json();
             alert('Error: ' + error.error);
@@ -166,16 +193,35 @@ function downloadCSV() {
     window.location.href = '/api/download';
 }
 
+// Format seconds as e.g. 1h 05m, 4m 12s or 9s
+function formatDuration(seconds) {
+    seconds = Math.max(0, Math.round(seconds || 0));
+    const h = Math.floor(seconds / 3600);
+    const m = Math.floor((seconds % 3600) / 60);
+    const s = seconds % 60;
+    if (h > 0) return `${h}h ${String(m).padStart(2, '0')}m`;
+    if (m > 0) return `${m}m ${String(s).padStart(2, '0')}s`;
+    return `${s}s`;
+}
+
 // Update progress bar
-function updateProgress(current, total, status) {
+function updateProgress(current, total, status, pagesPerSecond, etaSeconds) {
     const percentage = total > 0 ? Math.round((current / total) * 100) : 0;
 
     progressBar.style.width = percentage + '%';
-    progressText.textContent = `${current}/${total} (${percentage}%)`;
+    let text = `${current}/${total} (${percentage}%)`;
+    if (pagesPerSecond) {
+        text += ` · ${pagesPerSecond.toFixed(2)} pages/s · ETA ${formatDuration(etaSeconds)}`;
+    }
+    progressText.textContent = text;
     currentAction.textContent = status || 'Processing...';
 
-    // Update results periodically
-    if (current > 0 && current % 5 === 0) {
+    // Update results periodically; progress events are coalesced, so counts can skip
+    if (current < lastResultsFetch) {
+        lastResultsFetch = 0;
+    }
+    if (current - lastResultsFetch >= 5) {
+        lastResultsFetch = current;
         fetchResults();
     }
 }
@@ -188,14 +234,25 @@ function updateStatus(status) {
 
 // Add log entry
 function addLogEntry(message, level = 'info') {
-    const entry = document.createElement('div');
-    entry.className = `log-entry log-${level}`;
+    addLogEntries([{message, level}]);
+}
 
+// Add a batch of log entries with a single layout, keeping the newest maxLogEntries
+function addLogEntries(entries) {
     const timestamp = new Date().toLocaleTimeString();
-    const icon = getLogIcon(level);
-    entry.textContent = `[${timestamp}] ${icon} ${message}`;
+    const fragment = document.createDocumentFragment();
+
+    entries.slice(-maxLogEntries).forEach(({message, level = 'info'}) => {
+        const entry = document.createElement('div');
+        entry.className = `log-entry log-${level}`;
+        entry.textContent = `[${timestamp}] ${getLogIcon(level)} ${message}`;
+        fragment.appendChild(entry);
+    });
 
-    logContainer.appendChild(entry);
+    logContainer.appendChild(fragment);
+    while (logContainer.childElementCount > maxLogEntries) {
+        logContainer.firstElementChild.remove();
+    }
     logContainer.scrollTop = logContainer.scrollHeight;
 }
 
@@ -250,17 +307,33 @@ async function checkStatus() {
     }
 }
 
-// Fetch and display results
+// Fetch and display the current page of results; the server filters and paginates
 async function fetchResults() {
+    const params = new URLSearchParams({
+        offset: (currentPage - 1) * resultsPerPage,
+        limit: resultsPerPage
+    });
+    if (filterNoWebsiteCheckbox.checked) {
+        params.set('has_website', 'false');
+    }
+
     try {
-        const response = await fetch('/api/results?all=true');
+        // The browser revalidates with the ETag, so unchanged pages come back as 304
+        const response = await fetch(`/api/results?${params}`);
         const data = await response.json();
 
-        allResults = data.results || [];
-        resultCount.textContent = `(${data.total} clinics)`;
+        pageResults = data.results || [];
+        totalResults = data.total || 0;
+        if (!filterNoWebsiteCheckbox.checked) {
+            resultCount.textContent = `(${totalResults} clinics)`;
+        }
 
-        // Reset to page 1 and display
-        currentPage = 1;
+        // Step back if the page no longer exists
+        const totalPages = Math.ceil(totalResults / resultsPerPage);
+        if (currentPage > 1 && currentPage > totalPages) {
+            currentPage = Math.max(1, totalPages);
+            return fetchResults();
+        }
         displayCurrentPage();
 
     } catch (error) {
@@ -268,40 +341,15 @@ async function fetchResults() {
     }
 }
 
-// Get filtered results based on checkbox state
-function getFilteredResults() {
-    if (!filterNoWebsiteCheckbox.checked) {
-        return allResults;
-    }
-
-    // Filter to show only clinics without website
-    return allResults.filter(clinic => {
-        return !clinic.website || clinic.website === 'N/A' || clinic.website.trim() === '';
-    });
-}
-
 // Display current page of results
 function displayCurrentPage() {
-    const filteredResults = getFilteredResults();
-
-    if (!allResults || allResults.length === 0) {
-        resultsBody.innerHTML = '<tr><td colspan="5" class="empty-state">No results yet</td></tr>';
-        updatePaginationControls();
-        return;
-    }
-
-    if (filteredResults.length === 0) {
-        resultsBody.innerHTML = '<tr><td colspan="5" class="empty-state">No clinics without websites found</td></tr>';
+    if (pageResults.length === 0) {
+        const message = filterNoWebsiteCheckbox.checked ? 'No clinics without websites found' : 'No results yet';
+        resultsBody.innerHTML = `<tr><td colspan="5" class="empty-state">${message}</td></tr>`;
         updatePaginationControls();
         return;
     }
 
-    // Calculate pagination based on filtered results
-    const totalPages = Math.ceil(filteredResults.length / resultsPerPage);
-    const startIdx = (currentPage - 1) * resultsPerPage;
-    const endIdx = Math.min(startIdx + resultsPerPage, filteredResults.length);
-    const pageResults = filteredResults.slice(startIdx, endIdx);
-
     // Display results for current page
     resultsBody.innerHTML = '';
 
@@ -326,14 +374,13 @@ function displayCurrentPage() {
 
 // Update pagination controls
 function updatePaginationControls() {
-    const filteredResults = getFilteredResults();
-    const totalPages = Math.ceil(filteredResults.length / resultsPerPage);
+    const totalPages = Math.ceil(totalResults / resultsPerPage);
 
     prevPageBtn.disabled = currentPage <= 1;
     nextPageBtn.disabled = currentPage >= totalPages || totalPages === 0;
 
     if (totalPages > 0) {
-        paginationInfo.textContent = `Page ${currentPage} of ${totalPages} (Showing ${(currentPage - 1) * resultsPerPage + 1}-${Math.min(currentPage * resultsPerPage, filteredResults.length)} of ${filteredResults.length})`;
+        paginationInfo.textContent = `Page ${currentPage} of ${totalPages} (Showing ${(currentPage - 1) * resultsPerPage + 1}-${Math.min(currentPage * resultsPerPage, totalResults)} of ${totalResults})`;
     } else {
         paginationInfo.textContent = 'Page 1 of 1';
     }
@@ -341,19 +388,19 @@ function updatePaginationControls() {
 
 // Change page
 function changePage(delta) {
-    const filteredResults = getFilteredResults();
-    const totalPages = Math.ceil(filteredResults.length / resultsPerPage);
+    const totalPages = Math.ceil(totalResults / resultsPerPage);
     const newPage = currentPage + delta;
 
     if (newPage >= 1 && newPage <= totalPages) {
         currentPage = newPage;
-        displayCurrentPage();
+        fetchResults();
     }
 }
 
 // Legacy displayResults for compatibility
 function displayResults(results) {
-    allResults = results || [];
+    pageResults = results || [];
+    totalResults = pageResults.length;
     currentPage = 1;
     displayCurrentPage();
 }